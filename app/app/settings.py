@@ -48,7 +48,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'commons.health.HealthCheckMiddleware',
+    'commons.middleware.MetricsMiddleware',
+    'commons.slow_queries.SlowQueryMiddleware',
+    'commons.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'commons.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -134,7 +139,8 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = '/static/static/'
-MEDIA_URL = '/static/media/'
+# Media is only served to the authors of entries, by journal.views.
+MEDIA_URL = '/api/journal/media/'
 
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
@@ -148,4 +154,256 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
   'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+  # Reverse proxies in front of the app whose X-Forwarded-For entries are
+  # trusted when throttling by client IP. With 0 the peer address is used
+  # and the header, which any client can set, is ignored.
+  'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+  'DEFAULT_THROTTLE_RATES': {
+    'login_ip': os.environ.get('THROTTLE_LOGIN_IP', '30/min'),
+    'login_account': os.environ.get('THROTTLE_LOGIN_ACCOUNT', '10/min'),
+    'register_ip': os.environ.get('THROTTLE_REGISTER_IP', '20/hour'),
+    'register_account': os.environ.get('THROTTLE_REGISTER_ACCOUNT', '5/hour'),
+    'journal_user': os.environ.get('THROTTLE_JOURNAL_USER', '600/min'),
+  },
 }
+
+
+# Caches
+# A shared Redis cache is used when REDIS_URL is set; otherwise every
+# process falls back to its own local memory cache. The default and
+# throttle caches hold token revocations and rate limit buckets, so that
+# Redis must never evict them: run it with maxmemory-policy noeviction (or
+# a volatile-* policy). Fragments churn and are evicted instead, so they
+# go to a Redis instance of their own, FRAGMENT_REDIS_URL.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+FRAGMENT_REDIS_URL = os.environ.get('FRAGMENT_REDIS_URL')
+
+
+def cache_config(name, max_entries=300, location=REDIS_URL,
+                 local_backend='django.core.cache.backends.locmem.LocMemCache'):
+    if location:
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': location,
+            'KEY_PREFIX': name,
+        }
+    return {
+        'BACKEND': local_backend,
+        'LOCATION': name,
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    }
+
+
+CACHES = {
+    'default': cache_config('default'),
+    'throttle': cache_config('throttle'),
+    'tokens': cache_config(
+        'tokens', local_backend='commons.cache.ExpiringLocMemCache'
+    ),
+    'fragments': cache_config('fragments', int(
+        os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 10000)
+    ), location=FRAGMENT_REDIS_URL),
+}
+
+
+# Tokens
+# Signed access tokens are checked without the DB; revocations live in the
+# `tokens` cache, which must be shared (REDIS_URL) across worker processes.
+# `manage.py check --deploy` warns when it is not. Locally it never culls
+# a revocation before it expires, however many there are.
+
+ACCESS_TOKEN_LIFETIME = int(os.environ.get('ACCESS_TOKEN_LIFETIME', 5 * 60))
+REFRESH_TOKEN_LIFETIME = int(
+    os.environ.get('REFRESH_TOKEN_LIFETIME', 14 * 24 * 60 * 60)
+)
+TOKEN_CACHE = 'tokens'
+
+
+# Throttling
+# Token buckets kept in the `throttle` cache, see commons.throttling.
+
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', '1') == '1'
+THROTTLE_CACHE = 'throttle'
+
+
+# Response compression
+# Responses smaller than COMPRESSION_MIN_SIZE bytes go out as they are, and
+# so do media types that are already compressed.
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 512))
+
+COMPRESSION_LEVELS = {
+    'br': int(os.environ.get('COMPRESSION_BROTLI_LEVEL', 5)),
+    'zstd': int(os.environ.get('COMPRESSION_ZSTD_LEVEL', 3)),
+    'gzip': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+}
+
+COMPRESSION_EXCLUDED_TYPES = (
+    'image/',
+    'video/',
+    'audio/',
+    'application/zip',
+    'application/gzip',
+)
+
+
+# Metrics
+# Set PROMETHEUS_MULTIPROC_DIR to an empty writable directory when running
+# several worker processes so that /metrics/ aggregates all of them.
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+
+# Slow query capture
+# Opt-in; summarize the log with `python manage.py slow_query_report`.
+
+SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED') == '1'
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_REPEAT_THRESHOLD = int(
+    os.environ.get('SLOW_QUERY_REPEAT_THRESHOLD', 5)
+)
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN') == '1'
+SLOW_QUERY_LOG_PATH = os.environ.get(
+    'SLOW_QUERY_LOG_PATH', BASE_DIR / 'logs' / 'slow_queries.log'
+)
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUP_COUNT = 5
+
+
+# Request profiling
+# Opt-in; the middleware is left out of the stack unless enabled.
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+PROFILING_HEADER = 'X-Profile'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', BASE_DIR / 'logs' / 'profiles')
+
+
+# Account purge
+# Purges left running without progress for PURGE_LEASE seconds are taken
+# over by another worker, and failed ones retried after PURGE_RETRY_DELAY
+# seconds, until claimed PURGE_MAX_ATTEMPTS times; see core.purge. The
+# lease must be longer than purging one batch takes.
+
+PURGE_LEASE = int(os.environ.get('PURGE_LEASE', 10 * 60))
+PURGE_RETRY_DELAY = int(os.environ.get('PURGE_RETRY_DELAY', 5 * 60))
+PURGE_MAX_ATTEMPTS = int(os.environ.get('PURGE_MAX_ATTEMPTS', 5))
+
+
+# Entry revisions
+# Every REVISION_SNAPSHOT_INTERVAL-th revision is stored in full, the rest as
+# deltas, so rebuilding a version applies at most that many deltas.
+
+REVISION_SNAPSHOT_INTERVAL = int(
+    os.environ.get('REVISION_SNAPSHOT_INTERVAL', 20)
+)
+
+
+# Entry content compression
+# Opt-in; content of at least CONTENT_COMPRESSION_MIN_SIZE bytes is stored
+# compressed, see core.fields. Run `python manage.py compress_content` after
+# enabling it to compress existing rows.
+
+CONTENT_COMPRESSION_ENABLED = (
+    os.environ.get('CONTENT_COMPRESSION_ENABLED') == '1'
+)
+CONTENT_COMPRESSION_MIN_SIZE = int(
+    os.environ.get('CONTENT_COMPRESSION_MIN_SIZE', 4096)
+)
+
+
+# Delta sync
+# Sync tokens never move past SYNC_COMMIT_WINDOW seconds ago, which must be
+# longer than any transaction writing entries, see core.sync.
+
+SYNC_COMMIT_WINDOW = int(os.environ.get('SYNC_COMMIT_WINDOW', 30))
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 2000
+
+
+# OpenAPI schema
+# Served from the artifact written by `python manage.py build_schema`.
+
+SCHEMA_ARTIFACT = BASE_DIR / 'openapi.json'
+SCHEMA_MAX_AGE = 60 * 60
+
+
+# Health checks
+# Answered by commons.health.HealthCheckMiddleware ahead of the rest of the
+# middleware stack.
+
+HEALTH_CHECK_LIVENESS_PATH = '/healthz'
+HEALTH_CHECK_READINESS_PATH = '/readyz'
+HEALTH_CHECK_CACHE_SECONDS = float(
+    os.environ.get('HEALTH_CHECK_CACHE_SECONDS', 5)
+)
+
+
+# Media delivery
+# Set MEDIA_OFFLOAD to 'x-accel-redirect' behind nginx, with an `internal`
+# location at MEDIA_OFFLOAD_PREFIX aliased to MEDIA_ROOT, or to 'x-sendfile'
+# behind Apache or lighttpd. Left empty, Django streams media itself; see
+# commons.media.
+
+MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD', '')
+MEDIA_OFFLOAD_PREFIX = os.environ.get('MEDIA_OFFLOAD_PREFIX',
+                                      '/protected-media/')
+
+
+# Media storage
+# MEDIA_STORAGE is 'local' to keep uploads below MEDIA_ROOT, or 's3' to keep
+# them in an S3-compatible bucket shared by every app node. Both issue
+# direct upload URLs valid for DIRECT_UPLOAD_EXPIRES seconds; see
+# commons.storage.
+
+MEDIA_STORAGE = os.environ.get('MEDIA_STORAGE', 'local')
+STORAGES = {
+    'default': {
+        'BACKEND': {
+            'local': 'commons.storage.LocalStorage',
+            's3': 'commons.storage.S3Storage',
+        }[MEDIA_STORAGE],
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL',
+                                 'https://s3.amazonaws.com')
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID', '')
+S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY', '')
+S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+S3_TIMEOUT = 10
+DIRECT_UPLOAD_EXPIRES = 15 * 60
+DIRECT_UPLOAD_MAX_SIZE = int(
+    os.environ.get('DIRECT_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+)
+DIRECT_UPLOAD_CONTENT_TYPES = ['image/jpeg', 'image/png', 'image/gif',
+                               'image/webp']
+MEDIA_REDIRECT_EXPIRES = 5 * 60
+
+
+# Fragment cache
+# The list endpoint renders each entry once per version (its updated_at) and
+# keeps the result in the `fragments` cache, see commons.fragments. Locally
+# it holds at most FRAGMENT_CACHE_MAX_ENTRIES entries, culling the least
+# recently used third when full. With FRAGMENT_REDIS_URL set they are
+# shared through a Redis instance that holds nothing else, bounded by
+# maxmemory with maxmemory-policy allkeys-lru. Never point it at REDIS_URL:
+# that policy would evict token revocations and throttle buckets too.
+
+FRAGMENT_CACHE = 'fragments'
+FRAGMENT_CACHE_TIMEOUT = int(
+    os.environ.get('FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)
+)
+
+
+# Related entries
+# Entries related to an entry are ranked by the tags they share, using the
+# per-author tag co-occurrence counts kept by core.related.
+
+RELATED_ENTRIES_LIMIT = 10
+RELATED_ENTRIES_MAX_LIMIT = 50
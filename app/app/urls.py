@@ -16,24 +16,20 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
-from django.conf import settings
 
-from drf_spectacular.views import (
-  SpectacularAPIView,
-  SpectacularSwaggerView,
-)
+from commons.metrics import metrics_view
+from commons.schema import schema_view
+from commons.storage import direct_upload_view
+
+from drf_spectacular.views import SpectacularSwaggerView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('api/schema/', schema_view, name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(), name='docs'),
     path('api/user/', include('user.urls')),
     path('api/journal/', include('journal.urls')),
+    path('api/uploads/<str:token>', direct_upload_view,
+         name='direct-upload'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        prefix=settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT
-    )
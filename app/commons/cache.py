@@ -0,0 +1,19 @@
+"""
+Cache backends of the project.
+"""
+from django.core.cache.backends.locmem import LocMemCache
+
+
+class ExpiringLocMemCache(LocMemCache):
+    """Local memory cache that never culls keys before they expire.
+
+    LocMemCache drops a share of its keys, live or not, once it holds
+    MAX_ENTRIES. Here only expired keys are dropped, so a key stays until
+    its timeout however many others are set; keys must therefore be set
+    with a timeout for the memory to stay bounded.
+    """
+
+    def _cull(self) -> None:
+        for key in list(self._cache):
+            if self._has_expired(key):
+                self._delete(key)
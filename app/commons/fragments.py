@@ -0,0 +1,50 @@
+"""
+Cache of rendered fragments, such as the representation of one entry.
+
+A fragment is keyed by the id of the row it renders and by a version that
+changes whenever the row does, its `updated_at`. Fragments are therefore
+never invalidated in place: a changed row is looked up under a new key and
+its stale fragment is left for the cache to evict. Anything changing what
+a row renders to, tag links included, must bump its `updated_at`, and a
+change of the representation itself must change the kind, which carries
+its version.
+
+Fragments live in the FRAGMENT_CACHE cache, whose memory is bounded by its
+MAX_ENTRIES when local and by the maxmemory policy of a Redis of their own
+(FRAGMENT_REDIS_URL) when shared, so evicting them never evicts anything
+else.
+"""
+from datetime import datetime
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache() -> Any:
+    return caches[getattr(settings, 'FRAGMENT_CACHE', 'default')]
+
+
+def fragment_key(kind: str, pk: Any, version: datetime) -> str:
+    return f'fragment:{kind}:{pk}:{version.timestamp():.6f}'
+
+
+def get_fragments(kind: str, versions: dict) -> dict:
+    """Returns the cached fragments of the given {pk: version}, by pk"""
+    if not versions:
+        return {}
+    keys = {fragment_key(kind, pk, version): pk
+            for pk, version in versions.items()}
+    found = _cache().get_many(list(keys))
+    return {keys[key]: fragment for key, fragment in found.items()}
+
+
+def set_fragments(kind: str, fragments: list) -> None:
+    """Caches (pk, version, fragment) triples"""
+    if not fragments:
+        return
+    _cache().set_many(
+        {fragment_key(kind, pk, version): fragment
+         for pk, version, fragment in fragments},
+        settings.FRAGMENT_CACHE_TIMEOUT,
+    )
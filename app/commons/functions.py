@@ -0,0 +1,31 @@
+"""
+Database functions shared by the apps.
+"""
+from typing import Any
+
+from django.db import models
+
+
+class WordCount(models.Func):
+    """Counts the whitespace separated words of a text expression.
+
+    PostgreSQL counts runs of non-whitespace characters. SQLite has no
+    regular expressions, so there the spaces between words are counted,
+    which is exact for single spaced text.
+    """
+    output_field = models.IntegerField()
+    template = (
+        "(SELECT count(*) FROM regexp_matches(%(expressions)s, '\\S+', 'g'))"
+    )
+
+    def as_sqlite(self, compiler: Any, connection: Any,
+                  **extra_context: Any) -> Any:
+        return self.as_sql(
+            compiler, connection,
+            template=(
+                "(length(trim(%(expressions)s)) - "
+                "length(replace(trim(%(expressions)s), ' ', '')) + "
+                "(trim(%(expressions)s) != ''))"
+            ),
+            **extra_context,
+        )
@@ -0,0 +1,171 @@
+"""
+Delivery of stored media files.
+
+Views check who may read a file and then call serve_file(), which hands the
+transfer to the front proxy when MEDIA_OFFLOAD is set:
+
+- 'x-accel-redirect': nginx serves MEDIA_OFFLOAD_PREFIX + name, which must
+  be an `internal` location aliased to MEDIA_ROOT.
+- 'x-sendfile': Apache (mod_xsendfile) or lighttpd serve the absolute path.
+
+The proxy then handles ranges and conditional requests itself. Without an
+offload, Django streams the file, answering single byte ranges with 206.
+Stored files are named by uuid and never rewritten, so responses may be
+cached privately for a year. Files in remote storages (see commons.storage)
+are not proxied; the client is redirected to a short-lived presigned URL.
+"""
+import mimetypes
+import os
+from typing import Any, Iterator
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.http.response import HttpResponseBase
+from django.utils.cache import patch_cache_control
+
+from rest_framework.negotiation import DefaultContentNegotiation
+
+CHUNK_SIZE = 64 * 1024
+MAX_AGE = 60 * 60 * 24 * 365
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when no byte of a requested range is inside the file"""
+
+
+class MediaContentNegotiation(DefaultContentNegotiation):
+    """Picks the first renderer whatever the client accepts.
+
+    Files are returned as plain responses, so renderers only format errors,
+    and clients asking for `Accept: image/*` must not get a 406 instead.
+    """
+
+    def select_renderer(self, request: Any, renderers: list,
+                        format_suffix: str | None = None) -> tuple:
+        return renderers[0], renderers[0].media_type
+
+
+def parse_range(header: str, size: int) -> tuple | None:
+    """Returns the first and last byte of a single byte range.
+
+    Headers this server does not handle (several ranges, other units or bad
+    syntax) are ignored by returning None, so the whole file is sent.
+    """
+    unit, _, ranges = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, _, last = ranges.strip().partition('-')
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0 or size == 0:
+                raise RangeNotSatisfiable
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    """Yields length bytes of a file from start on, chunk by chunk"""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def offload(name: str, path: str,
+            content_type: str) -> HttpResponse | None:
+    """Returns an empty response telling the proxy to send the file"""
+    mode = settings.MEDIA_OFFLOAD
+    if not mode:
+        return None
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_OFFLOAD_PREFIX + name
+        )
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ValueError(f'Unknown MEDIA_OFFLOAD mode {mode!r}')
+    return response
+
+
+def stream(request: Any, path: str, stat: Any, etag: str,
+           content_type: str) -> HttpResponseBase:
+    """Streams the file, or the single byte range asked for"""
+    header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    byte_range = None
+    if header and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(header, stat.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    start, end = byte_range or (0, stat.st_size - 1)
+    length = max(end - start + 1, 0)
+    response = StreamingHttpResponse(iter_file(path, start, length),
+                                     status=206 if byte_range else 200,
+                                     content_type=content_type)
+    response['Content-Length'] = str(length)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    return response
+
+
+def redirect(name: str, storage: Any) -> HttpResponseBase:
+    """Sends the client to a presigned URL of a remote storage"""
+    expires = settings.MEDIA_REDIRECT_EXPIRES
+    response = HttpResponseRedirect(storage.presign(name, 'GET', expires))
+    patch_cache_control(response, private=True, max_age=expires // 2)
+    return response
+
+
+def serve_file(request: Any, name: str, storage: Any) -> HttpResponseBase:
+    """Answers a request for a stored file the caller may read"""
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        return redirect(name, storage)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    content_type = mimetypes.guess_type(name)[0] or \
+        'application/octet-stream'
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response: HttpResponseBase = HttpResponseNotModified()
+    else:
+        response = offload(name, path, content_type) or \
+            stream(request, path, stat, etag, content_type)
+        response['Accept-Ranges'] = 'bytes'
+        if response.status_code == 416:
+            return response
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=MAX_AGE,
+                        immutable=True)
+    return response
@@ -0,0 +1,134 @@
+"""
+Per-endpoint request metrics exposed in the Prometheus text format.
+
+When the PROMETHEUS_MULTIPROC_DIR environment variable points to a writable
+directory before the app starts, every worker process writes its samples
+there and the metrics endpoint aggregates all of them.
+"""
+import os
+import time
+from typing import Any
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+REQUESTS = Counter(
+    'http_requests_total',
+    'Requests served, by route, method and status code.',
+    ['route', 'method', 'status'],
+)
+LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time spent producing a response.',
+    ['route', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Size of non-streaming response bodies.',
+    ['route', 'method'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'DB queries executed while producing a response.',
+    ['route', 'method'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+DB_TIME = Histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in the DB while producing a response.',
+    ['route', 'method'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+
+class QueryStats:
+    """DB execute wrapper counting and timing the queries of a request"""
+    __slots__ = ('count', 'duration')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute: Any, sql: str, params: Any, many: bool,
+                 context: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def route_of(request: Any) -> str:
+    """Returns a low-cardinality label for the route a request matched"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.view_name or match.route or UNMATCHED_ROUTE
+
+
+_series: dict = {}
+
+
+def series(route: str, method: str, status: int) -> tuple:
+    """Returns the labelled children of every metric for a request kind,
+    resolving the labels only once per process."""
+    key = (route, method, status)
+    children = _series.get(key)
+    if children is None:
+        children = _series[key] = (
+            REQUESTS.labels(route, method, str(status)),
+            LATENCY.labels(route, method),
+            DB_QUERIES.labels(route, method),
+            DB_TIME.labels(route, method),
+            RESPONSE_SIZE.labels(route, method),
+        )
+    return children
+
+
+def observe(request: Any, response: Any, duration: float,
+            queries: QueryStats) -> None:
+    """Records the metrics of a finished request"""
+    requests, latency, db_queries, db_time, size = series(
+        route_of(request), request.method, response.status_code
+    )
+    requests.inc()
+    latency.observe(duration)
+    db_queries.observe(queries.count)
+    db_time.observe(queries.duration)
+    if not response.streaming:
+        size.observe(len(response.content))
+
+
+def collect() -> bytes:
+    """Renders the metrics of every worker in the Prometheus text format"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def metrics_view(request: Any) -> HttpResponse:
+    """Serves the collected metrics, guarded by METRICS_TOKEN when set"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        supplied = request.META.get('HTTP_AUTHORIZATION', '')
+        if not constant_time_compare(supplied, f'Bearer {token}'):
+            return HttpResponseForbidden()
+    return HttpResponse(collect(), content_type=CONTENT_TYPE_LATEST)
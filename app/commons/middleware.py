@@ -0,0 +1,229 @@
+"""
+Middleware shared by every app in the project.
+"""
+import time
+import zlib
+from typing import Any, Iterator, AsyncIterator
+
+from django.conf import settings
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+
+from commons import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+
+DEFAULT_COMPRESSION_LEVELS = {'br': 5, 'zstd': 3, 'gzip': 6}
+
+
+class GzipCodec:
+    """gzip encoder built on zlib so that streams can be flushed per chunk"""
+    name = 'gzip'
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+
+    def _compressobj(self) -> Any:
+        return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = self._compressobj()
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self) -> Any:
+        compressor = self._compressobj()
+        return (compressor.compress,
+                lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+                compressor.flush)
+
+
+class BrotliCodec:
+    """Brotli encoder, only available when `brotli` is installed"""
+    name = 'br'
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self) -> Any:
+        compressor = brotli.Compressor(quality=self.level)
+        return compressor.process, compressor.flush, compressor.finish
+
+
+class ZstdCodec:
+    """Zstandard encoder, only available when `zstandard` is installed"""
+    name = 'zstd'
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self) -> Any:
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        return (compressor.compress,
+                lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                compressor.flush)
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Returns a mapping of encoding -> quality from an Accept-Encoding
+    header."""
+    accepted = {}
+    for item in header.split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+class CompressionMiddleware:
+    """Compress responses with the best encoding the client accepts.
+
+    Brotli and zstd are preferred over gzip when their packages are
+    installed. Short responses, ranged responses, responses that already
+    carry an encoding and already-compressed media types are passed through
+    untouched. Streaming responses are compressed chunk by chunk and flushed
+    after every chunk so that clients keep receiving data as it is produced.
+    """
+
+    def __init__(self, get_response: Any) -> None:
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 200)
+        self.excluded_types = tuple(
+            getattr(settings, 'COMPRESSION_EXCLUDED_TYPES', ('image/',))
+        )
+        levels = {**DEFAULT_COMPRESSION_LEVELS,
+                  **getattr(settings, 'COMPRESSION_LEVELS', {})}
+
+        self.codecs: list = []
+        if brotli is not None:
+            self.codecs.append(BrotliCodec(levels['br']))
+        if zstandard is not None:
+            self.codecs.append(ZstdCodec(levels['zstd']))
+        self.codecs.append(GzipCodec(levels['gzip']))
+
+    def __call__(self, request: Any) -> Any:
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def select_codec(self, request: Any) -> Any:
+        """Returns the preferred codec accepted by the client, if any"""
+        accepted = parse_accept_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        wildcard = accepted.get('*', 0.0)
+        for codec in self.codecs:
+            if accepted.get(codec.name, wildcard) > 0:
+                return codec
+        return None
+
+    def should_compress(self, response: Any) -> bool:
+        """Decides whether a response is worth compressing at all"""
+        if not response.streaming and len(response.content) < self.min_size:
+            return False
+        if response.has_header('Content-Encoding') or \
+                response.has_header('Content-Range'):
+            return False
+        content_type = response.get('Content-Type', '').lower()
+        return not content_type.startswith(self.excluded_types)
+
+    def process_response(self, request: Any, response: Any) -> Any:
+        if not self.should_compress(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        codec = self.select_codec(request)
+        if codec is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async(
+                    codec, response.streaming_content
+                )
+            else:
+                response.streaming_content = self._compress_sequence(
+                    codec, response.streaming_content
+                )
+            # The compressed size is unknown until the stream is exhausted.
+            del response.headers['Content-Length']
+        else:
+            compressed_content = codec.compress(response.content)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # A strong ETag no longer matches the transferred bytes.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codec.name
+
+        return response
+
+    @staticmethod
+    def _compress_sequence(codec: Any, sequence: Any) -> Iterator[bytes]:
+        """Compresses a sync iterator, flushing after each chunk"""
+        compress, flush, finish = codec.stream()
+        for chunk in sequence:
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+
+    @staticmethod
+    async def _compress_async(codec: Any,
+                              sequence: Any) -> AsyncIterator[bytes]:
+        """Compresses an async iterator, flushing after each chunk"""
+        compress, flush, finish = codec.stream()
+        async for chunk in sequence:
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+
+
+class MetricsMiddleware:
+    """Record per-route request counts, latency, response size, DB query
+    count and DB time.
+
+    Keep it first in MIDDLEWARE so that the time spent in every other
+    middleware and the final (compressed) response size are included.
+    """
+
+    def __init__(self, get_response: Any) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: Any) -> Any:
+        queries = metrics.QueryStats()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        metrics.observe(request, response, time.perf_counter() - started,
+                        queries)
+        return response
@@ -0,0 +1,118 @@
+"""
+On-demand profiling of individual requests.
+
+A request is profiled when it carries the PROFILING_HEADER set to
+PROFILING_TOKEN, or when it is picked by PROFILING_SAMPLE_RATE. Each profile
+is written to PROFILING_DIR as a `.prof` file (open it with snakeviz,
+gprof2dot or `python -m pstats`) next to a `.json` summary of the time spent
+in the DB, in serializers and in renderers.
+"""
+import cProfile
+import json
+import pstats
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.crypto import constant_time_compare
+
+from commons.metrics import QueryStats, route_of
+
+# (file suffix, function name) pairs whose cumulative time makes up each
+# part of the breakdown. Nested calls are not double counted because the
+# largest cumulative time of a part is used.
+BREAKDOWN = {
+    'serialization_ms': (
+        ('rest_framework/serializers.py', 'data'),
+        ('rest_framework/serializers.py', 'to_representation'),
+        ('journal/serializers.py', 'data'),
+    ),
+    'render_ms': (
+        ('rest_framework/response.py', 'rendered_content'),
+        ('rest_framework/renderers.py', 'render'),
+    ),
+}
+
+
+def breakdown(profile: cProfile.Profile) -> dict:
+    """Returns the cumulative time of every breakdown part in ms"""
+    stats = pstats.Stats(profile).stats  # type: ignore[attr-defined]
+    parts = dict.fromkeys(BREAKDOWN, 0.0)
+    for (filename, _, function), (_, _, _, cumtime, _) in stats.items():
+        for part, targets in BREAKDOWN.items():
+            for suffix, name in targets:
+                if function == name and filename.endswith(suffix):
+                    parts[part] = max(parts[part], cumtime * 1000)
+    return parts
+
+
+class ProfilingMiddleware:
+    """Profile requests asked for by a privileged header or picked by the
+    sampling rate. Removed from the stack unless PROFILING_ENABLED is set.
+    """
+
+    def __init__(self, get_response: Any) -> None:
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.token = settings.PROFILING_TOKEN
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace(
+            '-', '_'
+        )
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.directory = Path(settings.PROFILING_DIR)
+
+    def should_profile(self, request: Any) -> bool:
+        """Checks the privileged header first, then the sampling rate"""
+        supplied = request.META.get(self.header)
+        if supplied and self.token:
+            return constant_time_compare(supplied, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request: Any) -> Any:
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        queries = QueryStats()
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+        total = time.perf_counter() - started
+
+        profile_id = uuid.uuid4().hex[:12]
+        summary = {
+            'id': profile_id,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'route': route_of(request),
+            'status': response.status_code,
+            'total_ms': total * 1000,
+            'db_ms': queries.duration * 1000,
+            'db_queries': queries.count,
+            **breakdown(profile),
+        }
+        self.save(profile, summary)
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def save(self, profile: cProfile.Profile, summary: dict) -> None:
+        """Writes the profile and its summary next to each other"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        route = summary['route'].replace(':', '-').replace('/', '_')
+        stem = (f'{summary["timestamp"][:19].replace(":", "")}-'
+                f'{summary["method"]}-{route}-{summary["id"]}')
+        profile.dump_stats(self.directory / f'{stem}.prof')
+        with open(self.directory / f'{stem}.json', 'w') as output:
+            json.dump(summary, output, indent=2)
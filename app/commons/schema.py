@@ -0,0 +1,141 @@
+"""
+Precomputed OpenAPI schema.
+
+Generating the schema introspects every view and serializer, so it is done
+once by `python manage.py build_schema` into SCHEMA_ARTIFACT, which is kept
+in version control and rebuilt in the Docker image. The artifact records a
+fingerprint of the source it was generated from. A process serving a
+schema whose fingerprint no longer matches the code regenerates it once in
+memory instead of serving it stale, and `build_schema --check` fails when
+the artifact differs from what the code generates or was generated from
+other code.
+"""
+import hashlib
+import json
+import logging
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+from drf_spectacular.generators import SchemaGenerator
+
+logger = logging.getLogger(__name__)
+
+# Modules the schema is generated from: the routes, the views and their
+# serializers, the models and fields those introspect, the authentication
+# schemes and the settings. Other modules, such as management commands,
+# can not change it.
+SCHEMA_SOURCES = {'urls.py', 'views.py', 'serializers.py', 'models.py',
+                  'fields.py', 'authentication.py', 'settings.py'}
+# Settings that end up in the schema and may be set from the environment,
+# so the source alone does not determine their values.
+SCHEMA_SETTINGS = ('DIRECT_UPLOAD_CONTENT_TYPES', 'DIRECT_UPLOAD_MAX_SIZE')
+IGNORED_DIRECTORIES = {'tests', 'migrations', 'logs', '__pycache__'}
+PACKAGES = ('django', 'djangorestframework', 'drf-spectacular')
+
+
+def source_fingerprint() -> str:
+    """Hashes the modules and settings the schema is generated from and
+    the versions of the packages it is generated with."""
+    digest = hashlib.sha256()
+    for package in PACKAGES:
+        digest.update(f'{package}=={version(package)}\n'.encode())
+    for name in SCHEMA_SETTINGS:
+        digest.update(f'{name}={getattr(settings, name)!r}\n'.encode())
+    base_dir = Path(settings.BASE_DIR)
+    for path in sorted(base_dir.rglob('*.py')):
+        relative = path.relative_to(base_dir)
+        if path.name not in SCHEMA_SOURCES or \
+                IGNORED_DIRECTORIES & set(relative.parts):
+            continue
+        digest.update(str(relative).encode() + b'\0')
+        digest.update(path.read_bytes() + b'\0')
+    return digest.hexdigest()
+
+
+def generate_schema() -> dict:
+    """Introspects the API and returns its schema"""
+    return SchemaGenerator().get_schema(request=None, public=True)
+
+
+def render(schema: dict) -> bytes:
+    """Serializes a schema deterministically"""
+    return json.dumps(schema, sort_keys=True, indent=2,
+                      ensure_ascii=False).encode() + b'\n'
+
+
+def write_artifact(schema: dict, fingerprint: str) -> None:
+    """Stores a schema with the fingerprint of its source"""
+    path = Path(settings.SCHEMA_ARTIFACT)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(render({'fingerprint': fingerprint, 'schema': schema}))
+
+
+def read_artifact() -> dict | None:
+    """Returns the stored fingerprint and schema, if there are any"""
+    try:
+        return json.loads(Path(settings.SCHEMA_ARTIFACT).read_bytes())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class ServedSchema:
+    """The rendered schema of this process and its ETag"""
+
+    def __init__(self) -> None:
+        self.body: bytes | None = None
+        self.etag: str | None = None
+
+    def load(self) -> None:
+        """Loads the artifact, regenerating it when the code changed"""
+        artifact = read_artifact()
+        if artifact is None or \
+                artifact.get('fingerprint') != source_fingerprint():
+            logger.warning('The OpenAPI schema artifact is missing or '
+                           'stale; run `python manage.py build_schema`.')
+            schema = generate_schema()
+        else:
+            schema = artifact['schema']
+        self.body = render(schema)
+        self.etag = '"%s"' % hashlib.sha256(self.body).hexdigest()[:32]
+
+    def clear(self) -> None:
+        """Forgets the schema so the next request loads it again"""
+        self.body = self.etag = None
+
+
+served_schema = ServedSchema()
+
+
+def etag_matches(etag: str | None, if_none_match: str) -> bool:
+    """Whether an If-None-Match header matches the ETag, comparing the
+    listed entity tags weakly as RFC 9110 requires"""
+    etags = parse_etags(if_none_match)
+    if etags == ['*']:
+        return True
+    return etag in {tag.removeprefix('W/') for tag in etags}
+
+
+@require_safe
+def schema_view(request: Any) -> HttpResponse:
+    """Serves the precomputed schema with a strong ETag"""
+    if served_schema.body is None:
+        served_schema.load()
+
+    if etag_matches(served_schema.etag,
+                    request.headers.get('If-None-Match', '')):
+        response: HttpResponse = HttpResponseNotModified()
+    else:
+        response = HttpResponse(served_schema.body,
+                                content_type='application/vnd.oai.openapi'
+                                             '+json; charset=utf-8')
+    response['ETag'] = served_schema.etag
+    patch_cache_control(response, public=True,
+                        max_age=settings.SCHEMA_MAX_AGE)
+    return response
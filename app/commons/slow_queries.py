@@ -0,0 +1,212 @@
+"""
+Opt-in capture of slow and repeated SQL queries with call-site attribution.
+
+Every query slower than SLOW_QUERY_THRESHOLD_MS is written to a rotating
+JSON-lines log together with the route that ran it and the project frames
+(view, serializer or model method) that issued it. Queries that run
+SLOW_QUERY_REPEAT_THRESHOLD times or more from the same call site within
+one request are logged as well, which is how N+1 loops show up.
+"""
+import hashlib
+import json
+import logging
+import re
+import sys
+import time
+from collections import defaultdict
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger('slow_queries')
+
+IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)', re.IGNORECASE)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+WHITESPACE = re.compile(r'\s+')
+
+# Wrappers around every query and request; never the issuer of a query.
+INSTRUMENTATION_MODULES = (
+    'commons/metrics.py',
+    'commons/middleware.py',
+    'commons/slow_queries.py',
+)
+
+
+def normalize(sql: str) -> str:
+    """Reduces a statement to a shape shared by all its parameter values"""
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql: str) -> str:
+    """Returns a short stable id of a normalized statement"""
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:12]
+
+
+def project_frames(limit: int = 8) -> list:
+    """Returns the innermost frames of project code on the current stack as
+    'path:line Class.method' strings, innermost first."""
+    base_dir = str(settings.BASE_DIR)
+    frames: list = []
+    frame: Any = sys._getframe(1)
+    while frame is not None and len(frames) < limit:
+        filename = frame.f_code.co_filename
+        path = filename[len(base_dir):].lstrip('/')
+        if filename.startswith(base_dir) and \
+                'site-packages' not in filename and \
+                path not in INSTRUMENTATION_MODULES:
+            name = frame.f_code.co_name
+            owner = frame.f_locals.get('self')
+            if owner is not None:
+                name = f'{type(owner).__name__}.{name}'
+            frames.append(f'{path}:{frame.f_lineno} {name}')
+        frame = frame.f_back
+    return frames
+
+
+def json_params(params: Any) -> Any:
+    """Makes query parameters JSON serializable"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: json_params(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [json_params(value) for value in params]
+    if isinstance(params, (str, int, float, bool)):
+        return params
+    return str(params)
+
+
+def explain(sql: str, params: Any) -> str | None:
+    """Returns the query plan of a SELECT statement"""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' \
+        else 'EXPLAIN'
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        return '\n'.join(' '.join(str(col) for col in row)
+                         for row in cursor.fetchall())
+
+
+def configure_logger() -> None:
+    """Attaches the rotating file handler to the slow query logger"""
+    path = Path(settings.SLOW_QUERY_LOG_PATH).resolve()
+    for handler in list(logger.handlers):
+        if handler.baseFilename == str(path):  # type: ignore[attr-defined]
+            return
+        logger.removeHandler(handler)
+        handler.close()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT,
+        delay=True,
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class QueryRecorder:
+    """DB execute wrapper recording the slow queries of one request"""
+
+    def __init__(self, threshold: float, with_plan: bool) -> None:
+        self.threshold = threshold
+        self.with_plan = with_plan
+        self.explaining = False
+        self.repeats: dict = defaultdict(lambda: [0, 0.0])
+        self.records: list = []
+
+    def __call__(self, execute: Any, sql: str, params: Any, many: bool,
+                 context: Any) -> Any:
+        if self.explaining:
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.record(sql, params, many, duration)
+
+    def record(self, sql: str, params: Any, many: bool,
+               duration: float) -> None:
+        """Remembers a finished query"""
+        normalized = normalize(sql)
+        frames = project_frames()
+        callsite = frames[0] if frames else None
+        counter = self.repeats[(normalized, callsite)]
+        counter[0] += 1
+        counter[1] += duration
+
+        if duration < self.threshold:
+            return
+        record = {
+            'type': 'slow',
+            'fingerprint': fingerprint(normalized),
+            'sql': normalized,
+            'raw_sql': sql,
+            'params': None if many else json_params(params),
+            'duration_ms': round(duration * 1000, 3),
+            'callsite': callsite,
+            'stack': frames,
+        }
+        if self.with_plan and not many:
+            self.explaining = True
+            try:
+                record['plan'] = explain(sql, params)
+            finally:
+                self.explaining = False
+        self.records.append(record)
+
+    def flush(self, route: str, repeat_threshold: int) -> None:
+        """Writes the records of the request to the log"""
+        for (normalized, callsite), (count, total) in self.repeats.items():
+            if count < repeat_threshold:
+                continue
+            self.records.append({
+                'type': 'repeated',
+                'fingerprint': fingerprint(normalized),
+                'sql': normalized,
+                'count': count,
+                'duration_ms': round(total * 1000, 3),
+                'callsite': callsite,
+            })
+        for record in self.records:
+            record['route'] = route
+            logger.info(json.dumps(record))
+
+
+class SlowQueryMiddleware:
+    """Capture slow and repeated queries of every request when
+    SLOW_QUERY_LOG_ENABLED is set; removes itself from the stack otherwise.
+    """
+
+    def __init__(self, get_response: Any) -> None:
+        if not getattr(settings, 'SLOW_QUERY_LOG_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+        self.repeat_threshold = settings.SLOW_QUERY_REPEAT_THRESHOLD
+        self.with_plan = settings.SLOW_QUERY_EXPLAIN
+        configure_logger()
+
+    def __call__(self, request: Any) -> Any:
+        recorder = QueryRecorder(self.threshold, self.with_plan)
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else request.path
+        recorder.flush(f'{request.method} {view}', self.repeat_threshold)
+        return response
@@ -0,0 +1,258 @@
+"""
+Storage backends for uploaded media.
+
+MEDIA_STORAGE selects the default storage:
+
+- 'local': LocalStorage keeps files below MEDIA_ROOT.
+- 's3': S3Storage keeps objects in an S3-compatible bucket (AWS S3, MinIO,
+  ...) that every app node shares. Requests are authenticated with AWS
+  Signature Version 4 query strings, built with the standard library.
+
+Both hand out direct upload URLs with presign_upload(): the client PUTs the
+file there itself and then confirms the key through the journal API. With
+S3 the upload bytes never pass through an app worker. LocalStorage points
+the URL at direct_upload_view, so clients do not need to know which backend
+is in use.
+"""
+import hashlib
+import hmac
+import mimetypes
+import os
+from datetime import datetime, timezone
+from typing import Any
+from urllib.error import HTTPError
+from urllib.parse import parse_qsl, quote, urljoin, urlsplit, urlunsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage, \
+    default_storage
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.deconstruct import deconstructible
+from django.utils.encoding import filepath_to_uri
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+ALGORITHM = 'AWS4-HMAC-SHA256'
+UPLOAD_SALT = 'commons.storage.upload'
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def _quote(value: str, safe: str = '-_.~') -> str:
+    return quote(value, safe=safe)
+
+
+def signature(secret_key: str, region: str, method: str, path: str,
+              query: dict, headers: dict) -> str:
+    """Computes the Signature Version 4 of a presigned S3 request.
+
+    query holds the X-Amz-* parameters apart from the signature itself and
+    headers the signed headers, including host.
+    """
+    amz_date = query['X-Amz-Date']
+    scope = f'{amz_date[:8]}/{region}/s3/aws4_request'
+    canonical_query = '&'.join(
+        f'{_quote(key)}={_quote(value)}'
+        for key, value in sorted(query.items())
+    )
+    names = sorted(headers)
+    canonical_request = '\n'.join([
+        method,
+        path or '/',
+        canonical_query,
+        ''.join(f'{name}:{headers[name].strip()}\n' for name in names),
+        ';'.join(names),
+        'UNSIGNED-PAYLOAD',
+    ])
+    string_to_sign = '\n'.join([
+        ALGORITHM,
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest(),
+    ])
+    key = f'AWS4{secret_key}'.encode()
+    for part in (amz_date[:8], region, 's3', 'aws4_request'):
+        key = _hmac(key, part)
+    return hmac.new(key, string_to_sign.encode(),
+                    hashlib.sha256).hexdigest()
+
+
+def presign_url(url: str, access_key: str, secret_key: str, region: str,
+                method: str = 'GET', expires: int = 3600,
+                headers: dict | None = None,
+                now: datetime | None = None) -> str:
+    """Returns the url signed for method for expires seconds.
+
+    The client must send the given headers with exactly these values.
+    """
+    parts = urlsplit(url)
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    signed = {name.lower(): value for name, value in (headers or {}).items()}
+    signed['host'] = parts.netloc
+
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    query.update({
+        'X-Amz-Algorithm': ALGORITHM,
+        'X-Amz-Credential':
+            f'{access_key}/{amz_date[:8]}/{region}/s3/aws4_request',
+        'X-Amz-Date': amz_date,
+        'X-Amz-Expires': str(expires),
+        'X-Amz-SignedHeaders': ';'.join(sorted(signed)),
+    })
+    query['X-Amz-Signature'] = signature(secret_key, region, method,
+                                         parts.path, query, signed)
+    return urlunsplit(parts._replace(query='&'.join(
+        f'{_quote(key)}={_quote(value)}' for key, value in query.items()
+    )))
+
+
+def upload_headers(content_type: str, size: int) -> dict:
+    """The headers a direct upload must be sent with"""
+    return {'Content-Type': content_type, 'Content-Length': str(size)}
+
+
+@deconstructible
+class LocalStorage(FileSystemStorage):
+    """Files below MEDIA_ROOT, uploaded directly through the app"""
+
+    def check(self) -> None:
+        """Raises unless files can be stored"""
+        if not os.path.isdir(self.location):
+            raise RuntimeError('MEDIA_ROOT does not exist')
+        if not os.access(self.location, os.W_OK):
+            raise RuntimeError('MEDIA_ROOT is not writable')
+
+    def presign_upload(self, name: str, content_type: str, size: int,
+                       expires: int) -> dict:
+        """Returns where and how to PUT a file of size bytes as name"""
+        token = signing.dumps(
+            {'name': name, 'type': content_type, 'size': size},
+            salt=UPLOAD_SALT,
+        )
+        return {
+            'url': reverse('direct-upload', args=[token]),
+            'method': 'PUT',
+            'headers': upload_headers(content_type, size),
+        }
+
+
+@deconstructible
+class S3Storage(Storage):
+    """Objects in a bucket of an S3-compatible service.
+
+    Objects are addressed path-style (endpoint/bucket/key), which AWS and
+    the self-hosted implementations all accept. url() stays on MEDIA_URL so
+    reads keep going through the authorized media endpoint, which then
+    redirects to a short-lived presigned URL.
+    """
+
+    def __init__(self, endpoint_url: str | None = None,
+                 bucket: str | None = None, access_key: str | None = None,
+                 secret_key: str | None = None, region: str | None = None,
+                 timeout: float | None = None) -> None:
+        self.endpoint_url = (endpoint_url or settings.S3_ENDPOINT_URL) \
+            .rstrip('/')
+        self.bucket = bucket or settings.S3_BUCKET
+        self.access_key = access_key or settings.S3_ACCESS_KEY_ID
+        self.secret_key = secret_key or settings.S3_SECRET_ACCESS_KEY
+        self.region = region or settings.S3_REGION
+        self.timeout = timeout or settings.S3_TIMEOUT
+
+    def object_url(self, name: str = '') -> str:
+        return f'{self.endpoint_url}/{_quote(self.bucket)}/' + \
+            _quote(name, safe='/-_.~')
+
+    def presign(self, name: str, method: str = 'GET', expires: int = 60,
+                headers: dict | None = None) -> str:
+        return presign_url(self.object_url(name), self.access_key,
+                           self.secret_key, self.region, method, expires,
+                           headers)
+
+    def request(self, method: str, name: str, data: bytes | None = None,
+                headers: dict | None = None) -> Any:
+        """Sends a signed request for an object, returning the response"""
+        url = self.presign(name, method)
+        return urlopen(Request(url, data=data, headers=headers or {},
+                               method=method), timeout=self.timeout)
+
+    def head(self, name: str) -> Any | None:
+        """Returns the headers of an object, or None if there is none"""
+        try:
+            with self.request('HEAD', name) as response:
+                return response.headers
+        except HTTPError as error:
+            if error.code == 404:
+                return None
+            raise
+
+    def check(self) -> None:
+        """Raises unless the bucket can be reached"""
+        self.request('HEAD', '').close()
+
+    def presign_upload(self, name: str, content_type: str, size: int,
+                       expires: int) -> dict:
+        """Returns where and how to PUT a file of size bytes as name"""
+        headers = upload_headers(content_type, size)
+        return {
+            'url': self.presign(name, 'PUT', expires, headers),
+            'method': 'PUT',
+            'headers': headers,
+        }
+
+    def _open(self, name: str, mode: str = 'rb') -> File:
+        with self.request('GET', name) as response:
+            return ContentFile(response.read(), name=name)
+
+    def _save(self, name: str, content: Any) -> str:
+        content_type = mimetypes.guess_type(name)[0] or \
+            'application/octet-stream'
+        data = b''.join(content.chunks())
+        self.request('PUT', name, data,
+                     upload_headers(content_type, len(data))).close()
+        return name
+
+    def delete(self, name: str) -> None:
+        self.request('DELETE', name).close()
+
+    def exists(self, name: str) -> bool:
+        return self.head(name) is not None
+
+    def size(self, name: str) -> int:
+        headers = self.head(name)
+        if headers is None:
+            raise FileNotFoundError(name)
+        return int(headers['Content-Length'])
+
+    def url(self, name: str) -> str:
+        return urljoin(settings.MEDIA_URL, filepath_to_uri(name))
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def direct_upload_view(request: Any, token: str) -> HttpResponse:
+    """Stores the body of a PUT to a URL issued by LocalStorage"""
+    try:
+        upload = signing.loads(token, salt=UPLOAD_SALT,
+                               max_age=settings.DIRECT_UPLOAD_EXPIRES)
+    except signing.BadSignature:
+        return HttpResponse('Invalid or expired upload URL.', status=403)
+    if request.content_type != upload['type'] or \
+            request.META.get('CONTENT_LENGTH') != str(upload['size']):
+        return HttpResponse('Headers do not match the upload URL.',
+                            status=403)
+    if default_storage.exists(upload['name']):
+        return HttpResponse('Already uploaded.', status=409)
+
+    name = default_storage.save(upload['name'], File(request))
+    if default_storage.size(name) != upload['size']:
+        default_storage.delete(name)
+        return HttpResponse('Incomplete upload.', status=400)
+    return HttpResponse(status=204)
@@ -0,0 +1,102 @@
+"""
+A local stand-in for an S3-compatible service, for tests.
+
+It keeps objects in memory and, like S3, only accepts requests carrying a
+valid Signature Version 4 query string.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qsl, urlsplit
+
+from commons.storage import signature
+
+ACCESS_KEY = 'test-access-key'
+SECRET_KEY = 'test-secret-key'
+REGION = 'us-east-1'
+BUCKET = 'media'
+
+
+class S3Handler(BaseHTTPRequestHandler):
+    """Answers object requests of path-style URLs"""
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def authorized(self) -> bool:
+        parts = urlsplit(self.path)
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        claimed = query.pop('X-Amz-Signature', None)
+        if claimed is None:
+            return False
+        headers = {
+            name: self.headers.get(name, '')
+            for name in query.get('X-Amz-SignedHeaders', '').split(';')
+        }
+        return claimed == signature(SECRET_KEY, REGION, self.command,
+                                    parts.path, query, headers)
+
+    def respond(self, status: int, body: bytes = b'',
+                headers: dict | None = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def handle_object(self) -> None:
+        if not self.authorized():
+            self.respond(403)
+            return
+        key = urlsplit(self.path).path
+        objects = self.server.objects  # type: ignore
+        if self.command == 'PUT':
+            length = int(self.headers['Content-Length'])
+            objects[key] = (self.rfile.read(length),
+                            self.headers.get('Content-Type', ''))
+            self.respond(200)
+        elif self.command == 'DELETE':
+            objects.pop(key, None)
+            self.respond(204)
+        elif key == f'/{BUCKET}/':
+            self.respond(200)
+        elif key not in objects:
+            self.respond(404)
+        else:
+            body, content_type = objects[key]
+            self.respond(200, body, {'Content-Type': content_type})
+
+    do_GET = do_HEAD = do_PUT = do_DELETE = handle_object
+
+
+class S3StandIn:
+    """Runs the stand-in on a free local port while in use"""
+
+    def __enter__(self) -> 'S3StandIn':
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), S3Handler)
+        self.server.objects = {}  # type: ignore
+        self.objects = self.server.objects  # type: ignore
+        self.endpoint_url = 'http://127.0.0.1:%d' % self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def settings(self) -> dict:
+        """The settings making S3Storage the default, using the stand-in"""
+        return {
+            'STORAGES': {
+                'default': {'BACKEND': 'commons.storage.S3Storage'},
+            },
+            'S3_ENDPOINT_URL': self.endpoint_url,
+            'S3_BUCKET': BUCKET,
+            'S3_ACCESS_KEY_ID': ACCESS_KEY,
+            'S3_SECRET_ACCESS_KEY': SECRET_KEY,
+            'S3_REGION': REGION,
+        }
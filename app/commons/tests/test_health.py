@@ -0,0 +1,69 @@
+"""
+Tests for the liveness and readiness endpoints.
+"""
+import json
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from commons.health import CachedProbe
+
+
+class TestHealthChecks(TestCase):
+    """Tests that probes are answered ahead of the middleware stack"""
+
+    def setUp(self) -> None:
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media.name,
+                                              ALLOWED_HOSTS=['example.com'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_liveness(self) -> None:
+        """Tests that liveness needs neither the DB nor a valid host"""
+        with self.assertNumQueries(0):
+            res = self.client.get('/healthz', HTTP_HOST='10.0.0.7:8000')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.content), {'status': 'ok'})
+        self.assertNotIn('sessionid', res.cookies)
+
+    def test_readiness(self) -> None:
+        """Tests that readiness reports every probe"""
+        res = self.client.get('/readyz', HTTP_HOST='10.0.0.7:8000')
+
+        self.assertEqual(res.status_code, 200)
+        checks = json.loads(res.content)['checks']
+        self.assertEqual(set(checks), {'database', 'migrations', 'media'})
+        self.assertTrue(all(check['ok'] for check in checks.values()))
+
+    def test_readiness_fails_without_media_volume(self) -> None:
+        """Tests that a missing media volume makes the app unready"""
+        with override_settings(MEDIA_ROOT='/nonexistent/media'):
+            res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 503)
+        body = json.loads(res.content)
+        self.assertEqual(body['status'], 'unavailable')
+        self.assertFalse(body['checks']['media']['ok'])
+
+    def test_probe_results_are_cached(self) -> None:
+        """Tests that a probe runs at most once per ttl"""
+        calls = []
+        probe = CachedProbe(lambda: calls.append(1), ttl=5)
+
+        with patch('time.monotonic', side_effect=[100, 102, 106]):
+            probe(), probe(), probe()
+
+        self.assertEqual(len(calls), 2)
+
+    def test_sticky_probe_not_rerun_after_success(self) -> None:
+        """Tests that passed sticky probes are not run again"""
+        calls = []
+        probe = CachedProbe(lambda: calls.append(1), ttl=0, sticky=True)
+
+        probe(), probe()
+
+        self.assertEqual(len(calls), 1)
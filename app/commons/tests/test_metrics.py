@@ -0,0 +1,78 @@
+"""
+Tests for the per-endpoint request metrics.
+"""
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Entry
+
+User = get_user_model()
+METRICS_URL = reverse('metrics')
+JOURNAL_URL = reverse('journal:journal-list')
+ROUTE = {'route': 'journal:journal-list', 'method': 'GET'}
+
+
+def sample(name: str, **labels: Any) -> float:
+    """Returns the current value of a metric sample"""
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics(TestCase):
+    """Tests that requests are measured and exposed"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='test@example.com',
+                                             password='testing123#')
+        self.client.force_authenticate(user=self.user)
+        Entry.objects.create(author=self.user, content='Measured')
+
+    def test_request_recorded_per_route(self) -> None:
+        """Tests that count, latency, size and DB usage are recorded"""
+        requests = sample('http_requests_total', status='200', **ROUTE)
+        latency = sample('http_request_duration_seconds_count', **ROUTE)
+        queries = sample('http_request_db_queries_sum', **ROUTE)
+        size = sample('http_response_size_bytes_sum', **ROUTE)
+
+        res = self.client.get(JOURNAL_URL)
+
+        self.assertEqual(
+            sample('http_requests_total', status='200', **ROUTE),
+            requests + 1,
+        )
+        self.assertEqual(
+            sample('http_request_duration_seconds_count', **ROUTE),
+            latency + 1,
+        )
+        self.assertEqual(sample('http_request_db_queries_sum', **ROUTE),
+                         queries + 3)
+        self.assertEqual(sample('http_response_size_bytes_sum', **ROUTE),
+                         size + len(res.content))
+
+    def test_metrics_endpoint_prometheus_format(self) -> None:
+        """Tests that metrics are served in the Prometheus text format"""
+        self.client.get(JOURNAL_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'http_request_duration_seconds_bucket{', res.content)
+        self.assertIn(b'route="journal:journal-list"', res.content)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_token(self) -> None:
+        """Tests that a configured token guards the metrics endpoint"""
+        self.assertEqual(self.client.get(METRICS_URL).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
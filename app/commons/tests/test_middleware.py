@@ -0,0 +1,107 @@
+"""
+Tests for the middleware shared across the project.
+"""
+import gzip
+from typing import Any
+
+import brotli
+import zstandard
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from commons.middleware import (
+    CompressionMiddleware,
+    parse_accept_encoding,
+)
+
+PAYLOAD = b'{"content": "' + b'Dear diary, today was long. ' * 200 + b'"}'
+
+
+def compress(response: HttpResponse, accept_encoding: str = 'gzip') -> Any:
+    """Runs a response through the compression middleware."""
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+    middleware = CompressionMiddleware(lambda request: response)
+    return middleware(request)
+
+
+class TestCompressionMiddleware(TestCase):
+    """Tests for response compression"""
+
+    def test_parse_accept_encoding(self) -> None:
+        """Tests that quality values are read from Accept-Encoding"""
+        accepted = parse_accept_encoding('gzip;q=0.5, br, zstd;q=0')
+
+        self.assertEqual(accepted, {'gzip': 0.5, 'br': 1.0, 'zstd': 0.0})
+
+    def test_gzip_response(self) -> None:
+        """Tests that gzip is used when it is the only accepted encoding"""
+        res = compress(HttpResponse(PAYLOAD, content_type='application/json'))
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), PAYLOAD)
+        self.assertEqual(res['Content-Length'], str(len(res.content)))
+        self.assertIn('Accept-Encoding', res['Vary'])
+
+    def test_brotli_preferred(self) -> None:
+        """Tests that brotli wins over gzip when both are accepted"""
+        res = compress(HttpResponse(PAYLOAD), 'gzip, deflate, br, zstd')
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(res.content), PAYLOAD)
+
+    def test_zstd_response(self) -> None:
+        """Tests that zstd is used when brotli is refused"""
+        res = compress(HttpResponse(PAYLOAD), 'zstd, br;q=0')
+
+        self.assertEqual(res['Content-Encoding'], 'zstd')
+        decompressor = zstandard.ZstdDecompressor()
+        self.assertEqual(decompressor.decompress(res.content), PAYLOAD)
+
+    def test_no_accepted_encoding(self) -> None:
+        """Tests that nothing happens if the client accepts no encoding"""
+        res = compress(HttpResponse(PAYLOAD), 'identity')
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res.content, PAYLOAD)
+
+    @override_settings(COMPRESSION_MIN_SIZE=10_000)
+    def test_small_response_untouched(self) -> None:
+        """Tests that responses below the size threshold aren't compressed"""
+        res = compress(HttpResponse(PAYLOAD))
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res.content, PAYLOAD)
+
+    @override_settings(COMPRESSION_LEVELS={'gzip': 1})
+    def test_configurable_level(self) -> None:
+        """Tests that the configured compression level is applied"""
+        middleware = CompressionMiddleware(lambda request: None)
+
+        self.assertEqual(middleware.codecs[-1].level, 1)
+
+    def test_image_response_untouched(self) -> None:
+        """Tests that already compressed media is not compressed again"""
+        res = compress(HttpResponse(PAYLOAD, content_type='image/jpeg'))
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res.content, PAYLOAD)
+
+    def test_streaming_response(self) -> None:
+        """Tests that streaming responses are compressed incrementally"""
+        chunks = [PAYLOAD[i:i + 1000] for i in range(0, len(PAYLOAD), 1000)]
+        res = compress(StreamingHttpResponse(iter(chunks)))
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertFalse(res.has_header('Content-Length'))
+        streamed = list(res.streaming_content)
+        self.assertGreater(len(streamed), 1)
+        self.assertEqual(gzip.decompress(b''.join(streamed)), PAYLOAD)
+
+    def test_strong_etag_weakened(self) -> None:
+        """Tests that a strong ETag is made weak after compression"""
+        response = HttpResponse(PAYLOAD)
+        response['ETag'] = '"abc"'
+        res = compress(response)
+
+        self.assertEqual(res['ETag'], 'W/"abc"')
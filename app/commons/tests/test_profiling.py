@@ -0,0 +1,91 @@
+"""
+Tests for on-demand request profiling.
+"""
+import json
+import os
+import pstats
+import tempfile
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Entry
+
+User = get_user_model()
+JOURNAL_URL = reverse('journal:journal-list')
+
+
+class TestProfiling(TestCase):
+    """Tests that requests are profiled only when asked for"""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.settings = override_settings(
+            PROFILING_ENABLED=True,
+            PROFILING_TOKEN='secret',
+            PROFILING_SAMPLE_RATE=0,
+            PROFILING_DIR=self.directory,
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+        self.user = User.objects.create_user(email='test@example.com',
+                                             password='testing123#')
+        Entry.objects.create(author=self.user, content='Profile me')
+
+    def get(self, **headers: str) -> Any:
+        """Lists the journal with a fresh client"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        return client.get(JOURNAL_URL, **headers)
+
+    def test_profile_with_header(self) -> None:
+        """Tests that the privileged header produces a profile"""
+        res = self.get(HTTP_X_PROFILE='secret')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        profile_id = res['X-Profile-Id']
+        files = sorted(os.listdir(self.directory))
+        self.assertEqual(len(files), 2)
+        self.assertTrue(all(profile_id in name for name in files))
+
+        summary_path, profile_path = [os.path.join(self.directory, name)
+                                      for name in files]
+        self.assertTrue(
+            pstats.Stats(profile_path).get_stats_profile().func_profiles
+        )
+        with open(summary_path) as summary_file:
+            summary = json.load(summary_file)
+        self.assertEqual(summary['route'], 'journal:journal-list')
+        self.assertEqual(summary['db_queries'], 3)
+        for part in ('total_ms', 'db_ms', 'serialization_ms', 'render_ms'):
+            self.assertGreater(summary[part], 0)
+
+    def test_wrong_token_not_profiled(self) -> None:
+        """Tests that an unknown token is ignored"""
+        res = self.get(HTTP_X_PROFILE='guess')
+
+        self.assertFalse(res.has_header('X-Profile-Id'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_profiled(self) -> None:
+        """Tests that sampled requests are profiled without the header"""
+        res = self.get()
+
+        self.assertTrue(res.has_header('X-Profile-Id'))
+
+    @override_settings(PROFILING_ENABLED=False, PROFILING_SAMPLE_RATE=1)
+    def test_disabled(self) -> None:
+        """Tests that nothing is profiled when profiling is disabled"""
+        res = self.get(HTTP_X_PROFILE='secret')
+
+        self.assertFalse(res.has_header('X-Profile-Id'))
+        self.assertEqual(os.listdir(self.directory), [])
@@ -0,0 +1,113 @@
+"""
+Tests for the precomputed OpenAPI schema.
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from commons.schema import (
+    generate_schema,
+    render,
+    served_schema,
+    source_fingerprint,
+    write_artifact,
+)
+
+SCHEMA_URL = reverse('schema')
+
+
+class TestSchema(SimpleTestCase):
+    """Tests that the schema is served from the artifact"""
+
+    def setUp(self) -> None:
+        served_schema.clear()
+        self.addCleanup(served_schema.clear)
+
+    def test_artifact_is_up_to_date(self) -> None:
+        """Tests that the committed artifact matches the code"""
+        call_command('build_schema', check=True, stdout=StringIO())
+
+    def test_schema_served_with_caching_headers(self) -> None:
+        """Tests the ETag, Cache-Control and conditional requests"""
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('paths', json.loads(res.content))
+        self.assertIn('max-age=3600', res['Cache-Control'])
+        etag = res['ETag']
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_etag_compared_exactly(self) -> None:
+        """Tests that only If-None-Match headers listing the ETag, or *,
+        make the response conditional"""
+        etag = self.client.get(SCHEMA_URL)['ETag']
+
+        for header in (f'"other", {etag}', f'W/{etag}', '*'):
+            res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(res.status_code, 304, header)
+        for header in (f'W/{etag}-stale', etag[:-2] + '"', f'x{etag}x'):
+            res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(res.status_code, 200, header)
+
+    def test_stale_artifact_is_regenerated(self) -> None:
+        """Tests that a schema from other code is never served"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'openapi.json')
+            with override_settings(SCHEMA_ARTIFACT=path):
+                write_artifact({'paths': {}}, 'outdated')
+
+                with self.assertLogs('commons.schema', 'WARNING'):
+                    res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.content, render(generate_schema()))
+
+    def test_check_fails_on_stale_artifact(self) -> None:
+        """Tests that the check command catches a stale artifact"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'openapi.json')
+            with override_settings(SCHEMA_ARTIFACT=path):
+                write_artifact({'paths': {}}, 'outdated')
+
+                with self.assertRaises(CommandError):
+                    call_command('build_schema', check=True)
+
+    def test_check_fails_on_stale_fingerprint(self) -> None:
+        """Tests that the check catches an artifact processes would
+        regenerate, even when its schema is current"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'openapi.json')
+            with override_settings(SCHEMA_ARTIFACT=path):
+                write_artifact(generate_schema(), 'outdated')
+
+                with self.assertRaises(CommandError):
+                    call_command('build_schema', check=True)
+
+    def test_fingerprint_ignores_other_modules(self) -> None:
+        """Tests that only the modules shaping the schema are hashed"""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(BASE_DIR=directory):
+                with open(os.path.join(directory, 'views.py'), 'w') as file:
+                    file.write('VIEWS = 1\n')
+                fingerprint = source_fingerprint()
+                with open(os.path.join(directory, 'loadgen.py'), 'w') as file:
+                    file.write('RATE = 1\n')
+                self.assertEqual(source_fingerprint(), fingerprint)
+
+                with open(os.path.join(directory, 'views.py'), 'w') as file:
+                    file.write('VIEWS = 2\n')
+                self.assertNotEqual(source_fingerprint(), fingerprint)
+
+    def test_fingerprint_covers_schema_settings(self) -> None:
+        """Tests that settings shaping the schema change the fingerprint"""
+        fingerprint = source_fingerprint()
+
+        with override_settings(DIRECT_UPLOAD_MAX_SIZE=1):
+            self.assertNotEqual(source_fingerprint(), fingerprint)
@@ -0,0 +1,109 @@
+"""
+Tests for the slow query capture.
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from commons.slow_queries import normalize
+
+User = get_user_model()
+JOURNAL_URL = reverse('journal:journal-list')
+
+
+class TestSlowQueries(TestCase):
+    """Tests that slow and repeated queries are logged and summarized"""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log_path = os.path.join(directory.name, 'slow.log')
+        self.settings = override_settings(
+            SLOW_QUERY_LOG_ENABLED=True,
+            SLOW_QUERY_THRESHOLD_MS=0,
+            SLOW_QUERY_REPEAT_THRESHOLD=3,
+            SLOW_QUERY_LOG_PATH=self.log_path,
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='test@example.com',
+                                             password='testing123#')
+        self.client.force_authenticate(user=self.user)
+
+    def create_entry_with_tags(self) -> None:
+        """Creates an entry with enough tags to trigger the N+1 loop"""
+        payload = {
+            'title': 'Tagged',
+            'content': 'Content',
+            'tags': [{'name': f'tag {i}'} for i in range(4)],
+        }
+        self.client.post(JOURNAL_URL, data=payload, format='json')
+
+    def read_log(self) -> list:
+        """Returns the records written to the slow query log"""
+        with open(self.log_path) as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_normalize(self) -> None:
+        """Tests that literals and IN lists are normalized away"""
+        sql = "SELECT * FROM t WHERE a IN (%s, %s, %s) AND b = 'x' LIMIT 21"
+
+        self.assertEqual(normalize(sql),
+                         'SELECT * FROM t WHERE a IN (...) AND b = ? LIMIT ?')
+
+    def test_slow_queries_attributed(self) -> None:
+        """Tests that slow queries carry their route and call site"""
+        self.create_entry_with_tags()
+
+        slow = [r for r in self.read_log() if r['type'] == 'slow']
+        self.assertTrue(slow)
+        self.assertTrue(all(r['route'] == 'POST journal:journal-list'
+                            for r in slow))
+        callsites = {r["callsite"] for r in slow}
+        self.assertTrue(any('EntrySerializer._add_tags_to_entry' in c
+                            for c in callsites if c))
+
+    def test_repeated_queries_reported(self) -> None:
+        """Tests that the per-tag get_or_create loop is pointed out"""
+        self.create_entry_with_tags()
+        out = StringIO()
+
+        call_command('slow_query_report', log=self.log_path, stdout=out)
+
+        repeated = [r for r in self.read_log() if r['type'] == 'repeated']
+        self.assertTrue(any(r['count'] >= 4 and
+                            '_add_tags_to_entry' in r['callsite']
+                            for r in repeated))
+        report = out.getvalue()
+        self.assertIn('possible N+1', report)
+        self.assertIn('EntrySerializer._add_tags_to_entry', report)
+
+    def test_explain_on_demand(self) -> None:
+        """Tests that the plan of a logged SELECT can be printed"""
+        self.client.get(JOURNAL_URL)
+        select = next(r for r in self.read_log()
+                      if r['type'] == 'slow' and
+                      r['sql'].startswith('SELECT'))
+        out = StringIO()
+
+        call_command('slow_query_report', log=self.log_path,
+                     explain=select['fingerprint'], stdout=out)
+
+        self.assertIn(select['raw_sql'], out.getvalue())
+
+    @override_settings(SLOW_QUERY_LOG_ENABLED=False)
+    def test_disabled_by_default(self) -> None:
+        """Tests that nothing is recorded when capture is disabled"""
+        APIClient().get(JOURNAL_URL)
+
+        self.assertFalse(os.path.exists(self.log_path))
@@ -0,0 +1,132 @@
+"""
+Tests for the token bucket throttles.
+"""
+from typing import Any
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from commons.throttling import LoginAccountThrottle
+
+User = get_user_model()
+LOGIN_URL = reverse('user:login')
+CREATE_URL = reverse('user:create')
+JOURNAL_URL = reverse('journal:journal-list')
+RATES = {
+    'login_ip': '5/min',
+    'login_account': '2/min',
+    'register_ip': '2/hour',
+    'register_account': '1/hour',
+    'journal_user': '3/min',
+}
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                                   'DEFAULT_THROTTLE_RATES': RATES})
+class TestThrottling(TestCase):
+    """Tests that bursts are rejected cheaply"""
+
+    def setUp(self) -> None:
+        caches['throttle'].clear()
+        self.client = APIClient()
+        self.credentials = {'email': 'test@example.com',
+                            'password': 'testing123#'}
+        self.user = User.objects.create_user(**self.credentials)
+
+    def login(self, **params: Any) -> Any:
+        """Posts credentials to the login endpoint; HTTP_ params are sent
+        as headers"""
+        headers = {key: params.pop(key) for key in list(params)
+                   if key.startswith('HTTP_')}
+        payload = {**self.credentials, **params}
+        return self.client.post(LOGIN_URL, data=payload, **headers)
+
+    def test_login_limited_per_account(self) -> None:
+        """Tests that an account is throttled before hashing or DB work"""
+        for _ in range(2):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+        with patch('user.serializers.authenticate') as authenticate, \
+                self.assertNumQueries(0):
+            res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+        authenticate.assert_not_called()
+
+    def test_login_limited_per_ip(self) -> None:
+        """Tests that one IP cannot cycle through many accounts"""
+        for i in range(5):
+            self.login(email=f'user{i}@example.com')
+
+        res = self.login(email='other@example.com')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_cannot_reset_the_ip_bucket(self) -> None:
+        """Tests that a client sending a new X-Forwarded-For on every
+        request still shares one bucket"""
+        for i in range(5):
+            self.login(email=f'user{i}@example.com',
+                       HTTP_X_FORWARDED_FOR=f'10.0.0.{i}')
+
+        res = self.login(email='other@example.com',
+                         HTTP_X_FORWARDED_FOR='10.0.0.99')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_registration_limited(self) -> None:
+        """Tests that registrations are throttled per account and per IP"""
+        payload = {'email': 'new@example.com', 'password': 'testing123#',
+                   'username': 'new'}
+        self.client.post(CREATE_URL, data=payload)
+        res = self.client.post(CREATE_URL, data=payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        self.client.post(CREATE_URL, data={**payload, 'email': 'b@ex.com'})
+        res = self.client.post(CREATE_URL,
+                               data={**payload, 'email': 'c@ex.com'})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_journal_limited_per_user(self) -> None:
+        """Tests that the journal API is throttled per user"""
+        other = User.objects.create_user(email='other@example.com')
+        self.client.force_authenticate(user=self.user)
+        for _ in range(3):
+            self.client.get(JOURNAL_URL)
+
+        self.assertEqual(self.client.get(JOURNAL_URL).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(JOURNAL_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_bucket_refills(self) -> None:
+        """Tests that tokens come back at the configured rate"""
+        throttle = LoginAccountThrottle()
+        request = type('Request', (), {'data': self.credentials})()
+        clock = [1000.0]
+        throttle.timer = lambda: clock[0]  # type: ignore[method-assign]
+
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertFalse(throttle.allow_request(request, None))
+        self.assertAlmostEqual(throttle.wait(), 30.0)
+
+        clock[0] += 30
+        self.assertTrue(throttle.allow_request(request, None))
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_throttling_can_be_disabled(self) -> None:
+        """Tests that THROTTLE_ENABLED switches every throttle off"""
+        for _ in range(4):
+            res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
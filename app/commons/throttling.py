@@ -0,0 +1,118 @@
+"""
+Token bucket throttles backed by the shared `throttle` cache.
+
+Throttles run in the view's `initial()`, before the handler parses
+credentials, hashes passwords or touches the DB, so rejected requests are
+cheap 429 responses.
+"""
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Token bucket variant of DRF's SimpleRateThrottle.
+
+    A rate of 'N/period' is a bucket holding up to N tokens and refilled at
+    N tokens per period, so bursts of N requests are allowed after a quiet
+    period. Only the token count and the time of the last refill are kept
+    in the cache. Concurrent requests for the same key may both read a
+    bucket before either writes it back; this is the same trade-off DRF's
+    own throttles make and only ever lets a request or two too many
+    through.
+    """
+    cache_format = 'bucket:%(scope)s:%(ident)s'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+        self.refill_rate = self.num_requests / self.duration
+        self.retry_after: float | None = None
+
+    def get_rate(self) -> Any:
+        """Reads the rate of the scope from the current DRF settings"""
+        return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+
+    def allow_request(self, request: Any, view: Any) -> bool:
+        if not getattr(settings, 'THROTTLE_ENABLED', True):
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        tokens, updated = self.cache.get(self.key,
+                                         (float(self.num_requests), now))
+        tokens = min(float(self.num_requests),
+                     tokens + (now - updated) * self.refill_rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        else:
+            self.retry_after = (1 - tokens) / self.refill_rate
+        self.cache.set(self.key, (tokens, now), self.duration)
+        return allowed
+
+    def wait(self) -> float | None:
+        return self.retry_after
+
+
+class IPThrottle(TokenBucketThrottle):
+    """Throttles by client IP address"""
+
+    def get_cache_key(self, request: Any, view: Any) -> str | None:
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request),
+        }
+
+
+class AccountThrottle(TokenBucketThrottle):
+    """Throttles by the email address a request is trying to use"""
+
+    def get_cache_key(self, request: Any, view: Any) -> str | None:
+        email = request.data.get('email') if hasattr(request.data, 'get') \
+            else None
+        if not email or not isinstance(email, str):
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': email.strip().lower(),
+        }
+
+
+class UserThrottle(TokenBucketThrottle):
+    """Throttles by authenticated user, falling back to the client IP"""
+
+    def get_cache_key(self, request: Any, view: Any) -> str | None:
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginAccountThrottle(AccountThrottle):
+    scope = 'login_account'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+class RegisterAccountThrottle(AccountThrottle):
+    scope = 'register_account'
+
+
+class JournalUserThrottle(UserThrottle):
+    scope = 'journal_user'
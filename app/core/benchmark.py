@@ -0,0 +1,164 @@
+"""
+Helpers for measuring the speed of the API in-process.
+"""
+import io
+import json
+import math
+import platform
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from PIL import Image
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import (
+    Entry,
+    Tag,
+    User,
+)
+from core.related import update_cooccurrences
+
+PASSWORD = 'benchmark123#'
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Returns the pct-th percentile of already sorted samples using linear
+    interpolation."""
+    if not samples:
+        return 0.0
+    rank = (len(samples) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    if low == high:
+        return samples[low]
+    return samples[low] + (samples[high] - samples[low]) * (rank - low)
+
+
+def summarize(latencies: list, queries: list, wall_time: float,
+              errors: int = 0) -> dict:
+    """Summarizes raw latencies (in seconds) and query counts of a run"""
+    ordered = sorted(latencies)
+    to_ms = 1000
+    return {
+        'iterations': len(ordered),
+        'errors': errors,
+        'throughput': len(ordered) / wall_time if wall_time else 0.0,
+        'mean_ms': sum(ordered) / len(ordered) * to_ms if ordered else 0.0,
+        'min_ms': ordered[0] * to_ms if ordered else 0.0,
+        'p50_ms': percentile(ordered, 50) * to_ms,
+        'p90_ms': percentile(ordered, 90) * to_ms,
+        'p95_ms': percentile(ordered, 95) * to_ms,
+        'p99_ms': percentile(ordered, 99) * to_ms,
+        'max_ms': ordered[-1] * to_ms if ordered else 0.0,
+        'queries_mean': sum(queries) / len(queries) if queries else 0.0,
+        'queries_max': max(queries) if queries else 0,
+    }
+
+
+def measure(operation: Callable[[int], Any], iterations: int,
+            warmup: int = 0) -> dict:
+    """Runs operation(i) repeatedly and returns its summarized timings.
+
+    The operation receives the iteration number so that it can vary its
+    input. Warmup iterations are executed but not recorded. Responses with
+    a 4xx/5xx status code are counted as errors.
+    """
+    for i in range(warmup):
+        operation(i)
+
+    latencies, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for i in range(warmup, warmup + iterations):
+        with CaptureQueriesContext(connection) as captured:
+            before = time.perf_counter()
+            response = operation(i)
+            latencies.append(time.perf_counter() - before)
+        queries.append(len(captured.captured_queries))
+        if getattr(response, 'status_code', 200) >= 400:
+            errors += 1
+    wall_time = time.perf_counter() - started
+
+    return summarize(latencies, queries, wall_time, errors)
+
+
+def environment() -> dict:
+    """Describes the environment a benchmark ran in"""
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def save_results(path: str, results: dict) -> None:
+    """Writes benchmark results to a JSON file"""
+    with open(path, 'w') as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> dict:
+    """Reads benchmark results written by save_results"""
+    with open(path) as source:
+        return json.load(source)
+
+
+def compare(previous: dict, current: dict,
+            metrics: tuple = ('p50_ms', 'p95_ms', 'throughput',
+                              'queries_mean')) -> list:
+    """Returns rows of (scenario, metric, before, after, change %) for every
+    scenario present in both runs."""
+    rows = []
+    for name, stats in current.items():
+        if name not in previous:
+            continue
+        for metric in metrics:
+            before, after = previous[name].get(metric), stats.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            rows.append((name, metric, before, after, change))
+    return rows
+
+
+def seed(users: int, entries: int, tags: int, tags_per_entry: int,
+         rng: random.Random) -> list:
+    """Seeds users x entries x tags and returns the created users"""
+    password = make_password(PASSWORD)
+    created_users = User.objects.bulk_create(
+        User(email=f'bench{i}@example.com', username=f'bench{i}',
+             password=password)
+        for i in range(users)
+    )
+    tag_objects = Tag.objects.bulk_create(
+        Tag(name=f'bench-tag-{i}') for i in range(tags)
+    )
+    created_entries = Entry.objects.bulk_create(
+        Entry(author=user, title=f'Entry {i}',
+              content=' '.join(['Dear diary,'] * rng.randint(20, 200)))
+        for user in created_users
+        for i in range(entries)
+    )
+    links = [
+        Entry.tags.through(entry_id=entry.id, tag_id=tag.id)
+        for entry in created_entries
+        for tag in rng.sample(tag_objects, min(tags_per_entry, tags))
+    ]
+    Entry.tags.through.objects.bulk_create(links)
+    update_cooccurrences(
+        Entry.objects.filter(author__in=created_users).values('id')
+    )
+    return created_users
+
+
+def jpeg_bytes() -> bytes:
+    """Returns a small JPEG image"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(buffer, format='JPEG')
+    return buffer.getvalue()
@@ -0,0 +1,161 @@
+"""
+A text field that transparently compresses large values at rest.
+
+With CONTENT_COMPRESSION_ENABLED set, values of at least
+CONTENT_COMPRESSION_MIN_SIZE bytes are zlib compressed on save and stored
+base64 encoded behind a marker, in the same text column. Values read from
+the DB stay compressed until the attribute is first accessed, so loading a
+model that is only listed or re-saved never pays for decompression.
+Compressed values are always readable, whether compression is enabled or
+not, so it can be turned off at any time.
+
+Lookups such as `content__icontains` only see the stored form and do not
+match inside compressed values.
+"""
+import base64
+import zlib
+from typing import Any
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.query_utils import DeferredAttribute
+
+MARKER = '\x01z:'
+COMPRESSION_LEVEL = 6
+
+
+class Compressed:
+    """A stored compressed value that has not been decompressed yet"""
+    __slots__ = ('stored',)
+
+    def __init__(self, stored: str) -> None:
+        self.stored = stored
+
+    def decompress(self) -> str:
+        data = base64.b64decode(self.stored[len(MARKER):])
+        return zlib.decompress(data).decode()
+
+    def __str__(self) -> str:
+        return self.decompress()
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Compressed):
+            return self.stored == other.stored
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.stored)
+
+
+def compress(value: str) -> str:
+    """Returns the stored form of a compressed value"""
+    data = zlib.compress(value.encode(), COMPRESSION_LEVEL)
+    return MARKER + base64.b64encode(data).decode()
+
+
+def decompressed(value: Any) -> Any:
+    """Returns the plain text of a value read through values() or
+    values_list(), which bypass the lazy attribute."""
+    if isinstance(value, Compressed):
+        return value.decompress()
+    return value
+
+
+def should_compress(value: str) -> bool:
+    """Checks whether a plain value is stored compressed"""
+    if value.startswith(MARKER):
+        # Plain text that looks compressed is compressed to stay readable.
+        return True
+    if not getattr(settings, 'CONTENT_COMPRESSION_ENABLED', False):
+        return False
+    min_size = settings.CONTENT_COMPRESSION_MIN_SIZE
+    return len(value) >= min_size and len(value.encode()) >= min_size
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """Decompresses the value on first access and keeps the result.
+
+    Defining __set__ makes this a data descriptor, so reads go through
+    __get__ even though the value lives in the instance __dict__.
+    """
+
+    def __get__(self, instance: Any, cls: Any = None) -> Any:
+        value = super().__get__(instance, cls)
+        if isinstance(value, Compressed):
+            value = value.decompress()
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance: Any, value: Any) -> None:
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """TextField compressing values at rest above a size threshold"""
+    descriptor_class = CompressedTextDescriptor
+
+    def from_db_value(self, value: Any, expression: Any,
+                      connection: Any) -> Any:
+        if isinstance(value, str) and value.startswith(MARKER):
+            return Compressed(value)
+        return value
+
+    def to_python(self, value: Any) -> Any:
+        return super().to_python(decompressed(value))
+
+    def pre_save(self, model_instance: Any, add: bool) -> Any:
+        # Read past the descriptor so unchanged values are not decompressed
+        # only to be compressed again.
+        if self.attname in model_instance.__dict__:
+            return model_instance.__dict__[self.attname]
+        return super().pre_save(model_instance, add)
+
+    def get_db_prep_save(self, value: Any, connection: Any) -> Any:
+        if isinstance(value, Compressed):
+            return value.stored
+        if isinstance(value, str) and should_compress(value):
+            return compress(value)
+        return super().get_db_prep_save(value, connection)
+
+
+def backfill(model: Any, field_name: str, batch_size: int = 500,
+             reverse: bool = False) -> int:
+    """Rewrites the stored values of a CompressedTextField in batches.
+
+    Compresses every value that should be compressed under the current
+    settings, or decompresses every compressed value when reverse is set.
+    Each batch is its own transaction. A row is only rewritten while it
+    still holds the value read, so rows saved in the meantime, which are
+    stored as the settings want already, keep their new value. Returns the
+    number of rows changed.
+    """
+    changed = 0
+    last_pk = None
+    while True:
+        rows = model.objects.order_by('pk')
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        rows = list(rows.values_list('pk', field_name)[:batch_size])
+        if not rows:
+            return changed
+        last_pk = rows[-1][0]
+
+        updates = {}
+        for pk, value in rows:
+            if reverse and isinstance(value, Compressed):
+                plain = value.decompress()
+                if not plain.startswith(MARKER):
+                    updates[pk] = (value.stored, plain)
+            elif not reverse and isinstance(value, str) and \
+                    should_compress(value):
+                updates[pk] = (value, compress(value))
+        if not updates:
+            continue
+
+        with transaction.atomic():
+            for pk, (read, stored) in updates.items():
+                # Value expressions skip the field's conversions, so the
+                # stored forms are compared and written as given.
+                changed += model.objects.filter(
+                    pk=pk, **{field_name: models.Value(read)}
+                ).update(**{field_name: models.Value(stored)})
@@ -0,0 +1,329 @@
+"""
+Load generation against a running instance of the API.
+
+Virtual users arrive as a Poisson process at a given rate. Each one runs a
+scripted session on its own keep-alive connection: it registers, logs in
+and then performs a number of actions drawn from the workload mix, with
+exponentially distributed think times in between, the way the journal
+clients use the API.
+
+Arrivals are open-loop: a slow server does not slow them down, so queueing
+shows up in the latencies, and a rate the server can not sustain shows up
+as completed requests falling behind the offered load. Sessions beyond
+max_sessions wait for a free worker; that wait is counted from their
+scheduled arrival into the latency of their first request, and reported
+apart as the queue delay. The delta sync feed
+stands in for search, which clients run locally over synced entries.
+"""
+import http.client
+import ipaddress
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import reverse
+
+from core.benchmark import jpeg_bytes, percentile
+
+DEFAULT_MIX = {
+    'create': 3,
+    'list': 4,
+    'retrieve': 4,
+    'update': 2,
+    'upload': 1,
+    'tags': 1,
+    'sync': 2,
+}
+TAGS = ('work', 'family', 'travel', 'health', 'ideas', 'books', 'music',
+        'garden', 'sport', 'food')
+WORDS = ('today', 'morning', 'coffee', 'walked', 'quiet', 'rain', 'friend',
+         'dinner', 'book', 'tired', 'happy', 'garden', 'train', 'dream')
+LOOPBACK_NAMES = ('localhost',)
+
+
+def parse_mix(text: str) -> dict:
+    """Parses a mix like 'create=3,list=5' into weights by action"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f'Unknown action {name!r}; choose from '
+                             f'{", ".join(DEFAULT_MIX)}.')
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError('The mix needs at least one weighted action.')
+    return mix
+
+
+def is_local(url: str) -> bool:
+    """Tells whether a URL points at this machine"""
+    host = urlsplit(url).hostname or ''
+    if host in LOOPBACK_NAMES:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class Recorder:
+    """Collects the outcome of every request of a stage"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: dict = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.finished_at: list = []
+        self.queue_delays: list = []
+
+    def queued(self, delay: float) -> None:
+        with self.lock:
+            self.queue_delays.append(delay)
+
+    def add(self, action: str, latency: float, status: int) -> None:
+        with self.lock:
+            self.latencies[action].append(latency)
+            self.statuses[status] += 1
+            if not 200 <= status < 400:
+                self.errors[action] += 1
+            self.finished_at.append(time.perf_counter())
+
+
+class Session:
+    """One virtual user talking to the API over a keep-alive connection"""
+
+    def __init__(self, url: str, recorder: Recorder, rng: random.Random,
+                 timeout: float, scheduled: float | None = None) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 80
+        self.recorder = recorder
+        self.rng = rng
+        self.timeout = timeout
+        self.connection: http.client.HTTPConnection | None = None
+        self.headers: dict = {}
+        self.entry_ids: list = []
+        self.sync_token: str | None = None
+        # When the session was due to arrive; its first request is timed
+        # from then.
+        self.scheduled = scheduled
+
+    def request(self, action: str, method: str, path: str,
+                body: Any = None, content_type: str = 'application/json'
+                ) -> Any:
+        """Sends a request and records it, returning the decoded JSON body
+        of successful responses"""
+        headers = dict(self.headers)
+        if body is not None:
+            if content_type == 'application/json':
+                body = json.dumps(body).encode()
+            headers['Content-Type'] = content_type
+        started = time.perf_counter()
+        if self.scheduled is not None:
+            started, self.scheduled = self.scheduled, None
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=self.timeout
+                )
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            data, status = b'', 0
+        self.recorder.add(action, time.perf_counter() - started, status)
+
+        if not 200 <= status < 300 or not data:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def sign_up(self) -> bool:
+        """Registers a new account and logs in"""
+        email = f'load-{uuid.uuid4().hex}@example.com'
+        password = 'load-test-123#'
+        self.request('register', 'POST', reverse('user:create'), {
+            'email': email, 'username': email[:20], 'password': password,
+        })
+        tokens = self.request('login', 'POST', reverse('user:login'),
+                              {'email': email, 'password': password})
+        if not tokens:
+            return False
+        self.headers['Authorization'] = f'Bearer {tokens["access"]}'
+        return True
+
+    def entry_id(self) -> int | None:
+        return self.rng.choice(self.entry_ids) if self.entry_ids else None
+
+    def create(self) -> None:
+        words = self.rng.choices(WORDS, k=self.rng.randint(20, 300))
+        payload = {
+            'title': ' '.join(words[:4]).capitalize(),
+            'content': ' '.join(words),
+            'tags': [{'name': name} for name in
+                     self.rng.sample(TAGS, self.rng.randint(0, 3))],
+        }
+        entry = self.request('create', 'POST',
+                             reverse('journal:journal-list'), payload)
+        if entry:
+            self.entry_ids.append(entry['id'])
+
+    def list(self) -> None:
+        self.request('list', 'GET', reverse('journal:journal-list'))
+
+    def retrieve(self) -> None:
+        entry_id = self.entry_id()
+        if entry_id is None:
+            return self.create()
+        self.request('retrieve', 'GET',
+                     reverse('journal:journal-detail', args=[entry_id]))
+
+    def update(self) -> None:
+        entry_id = self.entry_id()
+        if entry_id is None:
+            return self.create()
+        self.request('update', 'PATCH',
+                     reverse('journal:journal-detail', args=[entry_id]),
+                     {'title': ' '.join(self.rng.choices(WORDS, k=4))})
+
+    def upload(self) -> None:
+        entry_id = self.entry_id()
+        if entry_id is None:
+            return self.create()
+        boundary = uuid.uuid4().hex
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="image"; '
+            f'filename="load.jpg"\r\nContent-Type: image/jpeg\r\n\r\n'
+        ).encode() + jpeg_bytes() + f'\r\n--{boundary}--\r\n'.encode()
+        self.request('upload', 'POST',
+                     reverse('journal:journal-upload-image',
+                             args=[entry_id]),
+                     body, f'multipart/form-data; boundary={boundary}')
+
+    def tags(self) -> None:
+        self.request('tags', 'GET', reverse('journal:tags'))
+
+    def sync(self) -> None:
+        query = urlencode({'since': self.sync_token} if self.sync_token
+                          else {})
+        changes = self.request(
+            'sync', 'GET', f'{reverse("journal:journal-changes")}?{query}'
+        )
+        if changes:
+            self.sync_token = changes['next']
+
+    def run(self, mix: dict, actions: int, think_time: float) -> None:
+        """Signs up, then performs actions drawn from the mix"""
+        if self.scheduled is not None:
+            self.recorder.queued(time.perf_counter() - self.scheduled)
+        try:
+            if not self.sign_up():
+                return
+            names, weights = list(mix), list(mix.values())
+            for _ in range(actions):
+                if think_time:
+                    time.sleep(self.rng.expovariate(1 / think_time))
+                getattr(self, self.rng.choices(names, weights)[0])()
+        finally:
+            self.close()
+
+
+def run_stage(url: str, rate: float, duration: float, mix: dict,
+              actions: int, think_time: float, warmup: float,
+              max_sessions: int, timeout: float, seed: int) -> dict:
+    """Offers sessions at rate per second for duration seconds and returns
+    the summarized outcome"""
+    rng = random.Random(seed)
+    recorder = Recorder()
+    arrivals = 0
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_sessions) as executor:
+        next_arrival = started
+        while next_arrival < started + duration:
+            time.sleep(max(next_arrival - time.perf_counter(), 0))
+            session = Session(url, recorder, random.Random(rng.random()),
+                              timeout, next_arrival)
+            executor.submit(session.run, mix, actions, think_time)
+            arrivals += 1
+            next_arrival += rng.expovariate(rate)
+    elapsed = time.perf_counter() - started
+
+    return summarize_stage(recorder, rate, duration, warmup, started,
+                           arrivals, elapsed, actions)
+
+
+def summarize_stage(recorder: Recorder, rate: float, duration: float,
+                    warmup: float, started: float, arrivals: int,
+                    elapsed: float, actions: int) -> dict:
+    """Summarizes a stage. Throughput is counted over the steady window
+    after warmup and before the last arrival, and compared with the
+    request rate the arrivals offer."""
+    window = max(duration - warmup, 1e-9)
+    in_window = sum(1 for finished in recorder.finished_at
+                    if started + warmup <= finished <= started + duration)
+    throughput = in_window / window
+    offered = rate * (actions + 2)
+    requests = sum(len(samples) for samples in recorder.latencies.values())
+    errors = sum(recorder.errors.values())
+
+    per_action = {}
+    for action, samples in sorted(recorder.latencies.items()):
+        ordered = sorted(samples)
+        per_action[action] = {
+            'requests': len(ordered),
+            'errors': recorder.errors[action],
+            'p50_ms': percentile(ordered, 50) * 1000,
+            'p95_ms': percentile(ordered, 95) * 1000,
+            'p99_ms': percentile(ordered, 99) * 1000,
+        }
+    every = sorted(latency for samples in recorder.latencies.values()
+                   for latency in samples)
+    queue_delays = sorted(recorder.queue_delays)
+    return {
+        'rate': rate,
+        'sessions': arrivals,
+        'requests': requests,
+        'elapsed_s': elapsed,
+        'throughput': throughput,
+        'offered': offered,
+        'efficiency': throughput / offered if offered else 0.0,
+        'error_rate': errors / requests if requests else 0.0,
+        'p50_ms': percentile(every, 50) * 1000,
+        'p95_ms': percentile(every, 95) * 1000,
+        'p99_ms': percentile(every, 99) * 1000,
+        'queue_p99_ms': percentile(queue_delays, 99) * 1000,
+        'statuses': {str(status): count
+                     for status, count in sorted(recorder.statuses.items())},
+        'actions': per_action,
+    }
+
+
+def saturation(stage: dict, slo_ms: float, max_error_rate: float,
+               min_efficiency: float) -> str | None:
+    """Returns why a stage saturated the server, if it did"""
+    if stage['error_rate'] > max_error_rate:
+        return f'error rate {stage["error_rate"]:.1%}'
+    if stage['p99_ms'] > slo_ms:
+        return f'p99 {stage["p99_ms"]:.0f} ms over the {slo_ms:.0f} ms SLO'
+    if stage['efficiency'] < min_efficiency:
+        return (f'throughput {stage["throughput"]:.1f}/s behind the '
+                f'offered {stage["offered"]:.1f}/s')
+    return None
@@ -1,33 +1,55 @@
 """
 Custom DB command: Causes app to await DB startup b4 making requests.
 """
+import random
 import time
 from typing import Any
 
 from psycopg import OperationalError as PsycopgError
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import OperationalError
 
 
 class Command(BaseCommand):
     """Wait for DB to start before connecting and making requests to it.
+    Retries with exponential backoff and full jitter until --timeout.
     """
     help = __doc__
 
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--timeout', type=float, default=60.0,
+                            help='Seconds to wait before giving up')
+        parser.add_argument('--initial-delay', type=float, default=0.5,
+                            help='Upper bound of the first retry delay')
+        parser.add_argument('--max-delay', type=float, default=10.0,
+                            help='Upper bound of any retry delay')
+
     def handle(self, *args: Any, **options: Any) -> str | None:
         """Handles the running of the command"""
         self.stdout.write('Checking for DB availability...')
+        deadline = time.monotonic() + options['timeout']
+        attempt = 0
         db_up = False
         while db_up is False:
             try:
                 self.check(databases=['default'])
                 db_up = True
             except (PsycopgError, OperationalError):
-                self.stderr.write(
-                    self.style.WARNING('DB not available, trying again...')
-                )
-                time.sleep(1)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'DB not available after {options["timeout"]}s.'
+                    )
+                delay = random.uniform(0, min(
+                    options['max_delay'],
+                    options['initial_delay'] * 2 ** attempt,
+                ))
+                attempt += 1
+                self.stderr.write(self.style.WARNING(
+                    f'DB not available, trying again in {delay:.1f}s...'
+                ))
+                time.sleep(min(delay, remaining))
         self.stdout.write(
             self.style.SUCCESS('DB is available.')
         )
@@ -0,0 +1,154 @@
+"""
+Custom benchmark command: Measures the API hot paths in-process.
+"""
+import random
+import tempfile
+from typing import Any
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import benchmark
+from core.benchmark import PASSWORD, jpeg_bytes, seed
+from user.tokens import issue_access_token
+
+SCENARIOS = ('login', 'entry_list', 'entry_retrieve', 'entry_related',
+             'entry_create', 'entry_update', 'image_upload', 'tag_list')
+
+
+class Command(BaseCommand):
+    """Seeds a throwaway dataset and measures latency, throughput and query
+    counts of the API hot paths. Nothing is left behind in the DB.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--entries', type=int, default=100,
+                            help='Entries per user')
+        parser.add_argument('--tags', type=int, default=50,
+                            help='Size of the tag pool')
+        parser.add_argument('--tags-per-entry', type=int, default=3)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--scenario', action='append',
+                            choices=SCENARIOS,
+                            help='Only run these scenarios')
+        parser.add_argument('--output', help='Write JSON results here')
+        parser.add_argument('--compare',
+                            help='Compare with a previous JSON result file')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        scenarios = options['scenario'] or SCENARIOS
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root,
+                                  ALLOWED_HOSTS=['testserver'],
+                                  THROTTLE_ENABLED=False), \
+                transaction.atomic():
+            users = seed(options['users'], options['entries'],
+                         options['tags'], options['tags_per_entry'],
+                         random.Random(options['seed']))
+            results = self.run_scenarios(users[0], scenarios, options)
+            transaction.set_rollback(True)
+
+        report = {
+            'environment': benchmark.environment(),
+            'dataset': {key: options[key] for key in
+                        ('users', 'entries', 'tags', 'tags_per_entry')},
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        self.print_results(results)
+
+        if options['compare']:
+            previous = benchmark.load_results(options['compare'])
+            self.print_comparison(previous['results'], results)
+        if options['output']:
+            benchmark.save_results(options['output'], report)
+            self.stdout.write(f'Results written to {options["output"]}')
+        return None
+
+    def run_scenarios(self, user: Any, scenarios: Any,
+                      options: dict) -> dict:
+        """Runs every requested scenario as the given user"""
+        access = issue_access_token(user)
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {access}')
+        entry_ids = list(user.entries.values_list('id', flat=True))
+        image = jpeg_bytes()
+
+        def entry_id(i: int) -> int:
+            return entry_ids[i % len(entry_ids)]
+
+        def upload(i: int) -> Any:
+            upload = SimpleUploadedFile('bench.jpg', image, 'image/jpeg')
+            return client.post(
+                reverse('journal:journal-upload-image', args=[entry_id(i)]),
+                {'image': upload},
+            )
+
+        operations = {
+            'login': lambda i: client.post(
+                reverse('user:login'),
+                {'email': user.email, 'password': PASSWORD},
+            ),
+            'entry_list': lambda i: client.get(
+                reverse('journal:journal-list')
+            ),
+            'entry_retrieve': lambda i: client.get(
+                reverse('journal:journal-detail', args=[entry_id(i)])
+            ),
+            'entry_related': lambda i: client.get(
+                reverse('journal:journal-related', args=[entry_id(i)])
+            ),
+            'entry_create': lambda i: client.post(
+                reverse('journal:journal-list'),
+                {'title': f'New {i}', 'content': 'Benchmark content',
+                 'tags': [{'name': f'bench-new-{i}-a'},
+                          {'name': f'bench-new-{i}-b'}]},
+                content_type='application/json',
+            ),
+            'entry_update': lambda i: client.patch(
+                reverse('journal:journal-detail', args=[entry_id(i)]),
+                {'title': f'Updated {i}'},
+                content_type='application/json',
+            ),
+            'image_upload': upload,
+            'tag_list': lambda i: client.get(reverse('journal:tags')),
+        }
+
+        results = {}
+        for name in scenarios:
+            self.stdout.write(f'Running {name}...')
+            results[name] = benchmark.measure(
+                operations[name], options['iterations'], options['warmup']
+            )
+        return results
+
+    def print_results(self, results: dict) -> None:
+        """Prints a summary table of the results"""
+        self.stdout.write(
+            f'{"scenario":<16}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+            f'{"ops/s":>10}{"queries":>10}{"errors":>8}'
+        )
+        for name, stats in results.items():
+            self.stdout.write(
+                f'{name:<16}{stats["p50_ms"]:>10.2f}{stats["p95_ms"]:>10.2f}'
+                f'{stats["p99_ms"]:>10.2f}{stats["throughput"]:>10.1f}'
+                f'{stats["queries_mean"]:>10.1f}{stats["errors"]:>8}'
+            )
+
+    def print_comparison(self, previous: dict, results: dict) -> None:
+        """Prints the change of every metric against a previous run"""
+        self.stdout.write('Change against previous run:')
+        for name, metric, before, after, change in \
+                benchmark.compare(previous, results):
+            self.stdout.write(
+                f'{name:<16}{metric:<14}{before:>10.2f}{after:>10.2f}'
+                f'{change:>+9.1f}%'
+            )
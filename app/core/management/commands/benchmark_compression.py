@@ -0,0 +1,104 @@
+"""
+Custom benchmark command: Measures storage saved by content compression
+against its CPU cost.
+"""
+import random
+import time
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.fields import Compressed, compress
+from core.management.commands.generate_data import (
+    build_corpus,
+    content_lengths,
+)
+from core.models import Entry
+
+SIZES = (1024, 4096, 16 * 1024, 64 * 1024, 256 * 1024)
+
+
+def mean_time(function: Any, argument: Any, iterations: int) -> float:
+    """Returns the mean time of function(argument) in seconds"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    return (time.perf_counter() - started) / iterations
+
+
+class Command(BaseCommand):
+    """Compress synthetic entry content of increasing sizes, and a sample
+    sized like real entries, reporting the bytes saved and the time spent
+    compressing on save and decompressing on access.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--entries', type=int, default=2000,
+                            help='Entries in the realistic sample')
+        parser.add_argument('--median-length', type=int, default=1200)
+        parser.add_argument('--from-db', action='store_true',
+                            help='Sample the stored entries instead')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        rng = random.Random(options['seed'])
+        corpus = build_corpus(rng)
+        iterations = options['iterations']
+
+        self.stdout.write(f'{"size":>10} {"ratio":>7} {"compress":>12} '
+                          f'{"decompress":>12}')
+        for size in SIZES:
+            text = corpus[:size]
+            stored = compress(text)
+            compress_time = mean_time(compress, text, iterations)
+            decompress_time = mean_time(
+                lambda value: Compressed(value).decompress(), stored,
+                iterations,
+            )
+            self.stdout.write(
+                f'{size:>10} {len(stored) / size:>7.1%} '
+                f'{compress_time * 1e6:>9.1f} us '
+                f'{decompress_time * 1e6:>9.1f} us'
+            )
+
+        if options['from_db']:
+            sample = [str(entry.content) for entry in
+                      Entry.objects.only('content')[:options['entries']]]
+        else:
+            lengths = content_lengths(rng, options['median_length'])
+            sample = []
+            for _ in range(options['entries']):
+                length = next(lengths)
+                start = rng.randrange(len(corpus) - length)
+                sample.append(corpus[start:start + length])
+        self.report_sample(sample)
+        return None
+
+    def report_sample(self, sample: list) -> None:
+        """Reports the effect of the size threshold on a set of entries"""
+        min_size = settings.CONTENT_COMPRESSION_MIN_SIZE
+        plain = stored = compressed = 0
+        started = time.perf_counter()
+        for text in sample:
+            size = len(text.encode())
+            plain += size
+            if size >= min_size:
+                stored += len(compress(text))
+                compressed += 1
+            else:
+                stored += size
+        elapsed = time.perf_counter() - started
+
+        saved = plain - stored
+        self.stdout.write(
+            f'\n{len(sample)} entries, {compressed} at or above '
+            f'{min_size} bytes: {plain} -> {stored} bytes stored, '
+            f'{elapsed * 1e3:.1f} ms spent compressing.'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'saved: {saved} bytes ({saved / plain if plain else 0:.1%})'
+        ))
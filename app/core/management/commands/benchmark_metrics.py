@@ -0,0 +1,67 @@
+"""
+Custom benchmark command: Measures the overhead of the metrics middleware.
+"""
+import time
+from typing import Any, Callable
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from commons.middleware import MetricsMiddleware
+
+
+def time_per_call(handler: Callable[[Any], Any], request: Any,
+                  iterations: int) -> float:
+    """Returns the mean time of handler(request) in seconds"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        handler(request)
+    return (time.perf_counter() - started) / iterations
+
+
+class Command(BaseCommand):
+    """Compare a minimal view with and without MetricsMiddleware to show the
+    per-request cost of recording metrics.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--iterations', type=int, default=20_000)
+        parser.add_argument('--queries', type=int, default=3,
+                            help='DB queries executed by the view')
+        parser.add_argument('--rounds', type=int, default=3,
+                            help='Best of this many rounds is reported')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        queries = options['queries']
+        body = b'{"id": 1}' * 100
+
+        def view(request: Any) -> HttpResponse:
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute('SELECT 1')
+            return HttpResponse(body, content_type='application/json')
+
+        path = reverse('journal:journal-list')
+        request = RequestFactory().get(path)
+        request.resolver_match = resolve(path)
+        instrumented = MetricsMiddleware(view)
+        iterations = options['iterations']
+
+        baseline = min(time_per_call(view, request, iterations)
+                       for _ in range(options['rounds']))
+        measured = min(time_per_call(instrumented, request, iterations)
+                       for _ in range(options['rounds']))
+        overhead = measured - baseline
+
+        self.stdout.write(f'baseline:     {baseline * 1e6:8.2f} us/request')
+        self.stdout.write(f'with metrics: {measured * 1e6:8.2f} us/request')
+        self.stdout.write(self.style.SUCCESS(
+            f'overhead:     {overhead * 1e6:8.2f} us/request '
+            f'({overhead / baseline * 100:.1f}% of a {queries}-query view)'
+        ))
+        return None
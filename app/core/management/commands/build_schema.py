@@ -0,0 +1,44 @@
+"""
+Custom schema command: Generates the OpenAPI schema artifact.
+"""
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from commons.schema import (
+    generate_schema,
+    read_artifact,
+    source_fingerprint,
+    write_artifact,
+)
+
+
+class Command(BaseCommand):
+    """Write the OpenAPI schema served at /api/schema/ to SCHEMA_ARTIFACT,
+    or with --check fail if the stored schema or its fingerprint differs
+    from the code, which would make every process regenerate it.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--check', action='store_true',
+                            help='Fail if the artifact is stale')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        schema = generate_schema()
+        fingerprint = source_fingerprint()
+        if options['check']:
+            artifact = read_artifact()
+            if artifact is None or artifact['schema'] != schema or \
+                    artifact['fingerprint'] != fingerprint:
+                raise CommandError(
+                    'The OpenAPI schema artifact is stale; run '
+                    '`python manage.py build_schema` and commit it.'
+                )
+            self.stdout.write(self.style.SUCCESS('Schema is up to date.'))
+            return None
+
+        write_artifact(schema, fingerprint)
+        self.stdout.write(self.style.SUCCESS('Schema written.'))
+        return None
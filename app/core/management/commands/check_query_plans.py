@@ -0,0 +1,57 @@
+"""
+Custom diagnostics command: Fails when a hot query reads a table in full.
+"""
+import random
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.benchmark import seed
+from core.query_plans import check_plans
+
+
+class Command(BaseCommand):
+    """Seed a dataset, EXPLAIN every hot query of the API and fail if any
+    of them falls back to a sequential scan. The data is rolled back.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--entries', type=int, default=200,
+                            help='Entries per user')
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--plans', action='store_true',
+                            help='Print the plan of every query')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        with transaction.atomic():
+            users = seed(options['users'], options['entries'],
+                         options['tags'], 2, random.Random(0))
+            results = check_plans(users[0])
+            transaction.set_rollback(True)
+
+        failures = []
+        for name, plan, scans in results:
+            if scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{name:<26} full scan of {", ".join(scans)}'
+                ))
+            else:
+                self.stdout.write(f'{name:<26} ok')
+            if options['plans'] or scans:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+
+        if failures:
+            raise CommandError(
+                f'{len(failures)} hot queries read tables in full: '
+                f'{", ".join(failures)}.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'All {len(results)} hot queries use indexes.'
+        ))
+        return None
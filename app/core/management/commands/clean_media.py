@@ -0,0 +1,85 @@
+"""
+Custom media command: Finds and removes images no entry refers to any more.
+"""
+import os
+import shutil
+import time
+from typing import Any
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.media_gc import find_orphans, referenced_images
+
+
+class Command(BaseCommand):
+    """Find media files left behind by replaced images and deleted entries.
+    Only reports them unless --delete or --quarantine is given.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--prefix', default='entries',
+                            help='Directory below MEDIA_ROOT to scan')
+        parser.add_argument('--grace', type=float, default=24.0,
+                            help='Hours a file must be untouched before it '
+                                 'counts as an orphan')
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--delete', action='store_true',
+                            help='Delete the orphans')
+        action.add_argument('--quarantine', metavar='DIRECTORY',
+                            help='Move the orphans below this directory')
+        parser.add_argument('--run-size', type=int, default=100_000,
+                            help='Paths held in memory while sorting')
+        parser.add_argument('--verbose-paths', action='store_true',
+                            help='Print every orphan found')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        if not hasattr(default_storage, 'location'):
+            raise CommandError('Only media stored below MEDIA_ROOT can be '
+                               'scanned.')
+        root = os.path.abspath(settings.MEDIA_ROOT)
+        quarantine = options['quarantine']
+        if quarantine:
+            quarantine = os.path.abspath(quarantine)
+            scanned = os.path.realpath(os.path.join(root, options['prefix']))
+            resolved = os.path.realpath(quarantine)
+            if os.path.commonpath([resolved, scanned]) == scanned:
+                raise CommandError(
+                    'The quarantine must not be inside the scanned directory.'
+                )
+        cutoff = time.time() - options['grace'] * 3600
+
+        found = reclaimed = skipped = 0
+        orphans = find_orphans(root, options['prefix'], referenced_images(),
+                               options['run_size'])
+        for name in orphans:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > cutoff:
+                skipped += 1
+                continue
+
+            found += 1
+            if options['verbose_paths']:
+                self.stdout.write(name)
+            if options['delete']:
+                os.remove(path)
+            elif quarantine:
+                target = os.path.join(quarantine, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            reclaimed += stat.st_size
+
+        verb = 'Reclaimed' if options['delete'] or quarantine \
+            else 'Reclaimable'
+        self.stdout.write(self.style.SUCCESS(
+            f'{found} orphaned files. {verb}: {reclaimed} bytes. '
+            f'{skipped} orphans within the grace period kept.'
+        ))
+        return None
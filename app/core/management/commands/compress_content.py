@@ -0,0 +1,34 @@
+"""
+Custom storage command: Compresses or decompresses stored entry content.
+"""
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fields import backfill
+from core.models import Entry
+
+
+class Command(BaseCommand):
+    """Rewrite existing entry content in batches after turning
+    CONTENT_COMPRESSION_ENABLED on, or store it all uncompressed again with
+    --decompress before turning compression off for good.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--decompress', action='store_true',
+                            help='Store all content uncompressed')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        reverse = options['decompress']
+        if not reverse and not settings.CONTENT_COMPRESSION_ENABLED:
+            raise CommandError('CONTENT_COMPRESSION_ENABLED is not set.')
+
+        changed = backfill(Entry, 'content', options['batch_size'], reverse)
+        verb = 'Decompressed' if reverse else 'Compressed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {changed} entries.'))
+        return None
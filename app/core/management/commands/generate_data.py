@@ -0,0 +1,231 @@
+"""
+Custom data command: Generates large volumes of realistic synthetic data.
+"""
+import math
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Any, Iterable, Iterator
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from core.models import (
+    Entry,
+    Tag,
+    User,
+)
+from core.related import update_cooccurrences
+
+WORDS = (
+    'today', 'morning', 'coffee', 'walked', 'felt', 'quiet', 'rain', 'work',
+    'meeting', 'friend', 'called', 'dinner', 'book', 'read', 'tired',
+    'happy', 'anxious', 'grateful', 'garden', 'city', 'train', 'late',
+    'early', 'slept', 'dream', 'remember', 'family', 'weekend', 'plans',
+    'wrote', 'thought', 'about', 'the', 'a', 'and', 'with', 'again', 'after',
+    'before', 'long', 'short', 'day', 'night', 'music', 'ran', 'park',
+    'sunny', 'cold', 'laughed', 'cooked', 'project', 'finished', 'started',
+    'learned', 'something', 'new', 'old', 'photos', 'letter', 'tea',
+)
+CORPUS_SIZE = 1 << 20
+PASSWORD = 'generated123#'
+
+
+def build_corpus(rng: random.Random, size: int = CORPUS_SIZE) -> str:
+    """Builds a block of sentence-like text that entries are sliced from"""
+    sentences = []
+    length = 0
+    while length < size:
+        words = rng.choices(WORDS, k=rng.randint(5, 18))
+        sentence = ' '.join(words).capitalize() + '. '
+        sentences.append(sentence)
+        length += len(sentence)
+    return ''.join(sentences)
+
+
+def content_lengths(rng: random.Random, median: int) -> Iterator[int]:
+    """Yields log-normally distributed text lengths with a long tail"""
+    mu = math.log(median)
+    while True:
+        yield max(20, min(int(rng.lognormvariate(mu, 0.9)),
+                          CORPUS_SIZE // 2))
+
+
+def write_rows(cursor: Any, table: str, columns: list,
+               rows: Iterable) -> None:
+    """Loads rows with COPY on PostgreSQL and executemany elsewhere"""
+    if connection.vendor == 'postgresql':
+        quoted = ', '.join(connection.ops.quote_name(c) for c in columns)
+        with cursor.copy(f'COPY {table} ({quoted}) FROM STDIN') as copy:
+            for row in rows:
+                copy.write_row(row)
+        return
+
+    placeholders = ', '.join(['%s'] * len(columns))
+    cursor.executemany(
+        f'INSERT INTO {table} ({", ".join(columns)}) '
+        f'VALUES ({placeholders})',
+        list(rows),
+    )
+
+
+class Command(BaseCommand):
+    """Generate users, entries, tags and tag links in bulk for scaling tests.
+    The same seed always produces the same data.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--entries', type=int, default=100_000,
+                            help='Total number of entries')
+        parser.add_argument('--tags', type=int, default=500)
+        parser.add_argument('--max-tags-per-entry', type=int, default=5)
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent of tag and author '
+                                 'popularity')
+        parser.add_argument('--median-length', type=int, default=800,
+                            help='Median entry length in characters')
+        parser.add_argument('--days', type=int, default=3 * 365,
+                            help='Spread entries over this many past days')
+        parser.add_argument('--batch-size', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synthetic',
+                            help='Prefix of generated emails and tag names')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+
+        try:
+            with connection.cursor() as cursor:
+                user_ids = self.generate_users(cursor, options)
+                tag_ids = self.generate_tags(cursor, options)
+                self.generate_entries(cursor, rng, user_ids, tag_ids,
+                                      options)
+        finally:
+            self.reset_sequences()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {options["entries"]} entries in '
+            f'{time.monotonic() - started:.1f}s.'
+        ))
+        return None
+
+    @staticmethod
+    def next_id(model: Any) -> int:
+        """Returns the first free primary key of a model's table"""
+        last = model.objects.order_by('-id').values_list('id', flat=True)
+        return (last.first() or 0) + 1
+
+    @staticmethod
+    def reset_sequences() -> None:
+        """Points the id sequences past the explicitly inserted ids"""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Tag, Entry, Entry.tags.through]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def generate_users(self, cursor: Any, options: dict) -> list:
+        """Inserts users sharing a single precomputed password hash"""
+        first_id = self.next_id(User)
+        password = make_password(PASSWORD)
+        now = datetime.now(timezone.utc)
+        ids = list(range(first_id, first_id + options['users']))
+        prefix = options['prefix']
+
+        with transaction.atomic():
+            write_rows(
+                cursor, User._meta.db_table,
+                ['id', 'password', 'is_superuser', 'created_at',
+                 'updated_at', 'username', 'email', 'is_active',
+                 'is_staff'],
+                ((i, password, False, now, now, f'{prefix}{i}',
+                  f'{prefix}{i}@example.com', True, False) for i in ids),
+            )
+        self.stdout.write(f'{len(ids)} users written.')
+        return ids
+
+    def generate_tags(self, cursor: Any, options: dict) -> list:
+        """Inserts tags, most popular first. Names end with the tag id, like
+        usernames, so runs with the same prefix do not collide."""
+        first_id = self.next_id(Tag)
+        ids = list(range(first_id, first_id + options['tags']))
+
+        with transaction.atomic():
+            write_rows(
+                cursor, Tag._meta.db_table, ['id', 'name'],
+                ((i, f'{options["prefix"]}-{WORDS[n % len(WORDS)]}-{i}')
+                 for n, i in enumerate(ids)),
+            )
+        self.stdout.write(f'{len(ids)} tags written.')
+        return ids
+
+    def generate_entries(self, cursor: Any, rng: random.Random,
+                         user_ids: list, tag_ids: list,
+                         options: dict) -> None:
+        """Inserts entries and their tag links in batches"""
+        corpus = build_corpus(rng)
+        lengths = content_lengths(rng, options['median_length'])
+        skew = options['skew']
+        user_weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(user_ids) + 1)
+        ))
+        tag_weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(tag_ids) + 1)
+        ))
+        max_tags = min(options['max_tags_per_entry'], len(tag_ids))
+        now = datetime.now(timezone.utc)
+        span = options['days'] * 86400
+
+        entry_id = self.next_id(Entry)
+        link_id = self.next_id(Entry.tags.through)
+        remaining = options['entries']
+
+        while remaining > 0:
+            size = min(options['batch_size'], remaining)
+            entries, links = [], []
+            first_id = entry_id
+            authors = rng.choices(user_ids, cum_weights=user_weights,
+                                  k=size)
+            for author in authors:
+                length = next(lengths)
+                offset = rng.randrange(len(corpus) - length)
+                created = now - timedelta(seconds=rng.randrange(span))
+                entries.append((
+                    entry_id, created, created,
+                    created.strftime('%d %B, %Y'),
+                    corpus[offset:offset + length], author, None,
+                ))
+                tags = set(rng.choices(tag_ids, cum_weights=tag_weights,
+                                       k=rng.randint(0, max_tags)))
+                for tag in sorted(tags):
+                    links.append((link_id, entry_id, tag))
+                    link_id += 1
+                entry_id += 1
+
+            with transaction.atomic():
+                write_rows(
+                    cursor, Entry._meta.db_table,
+                    ['id', 'created_at', 'updated_at', 'title', 'content',
+                     'author_id', 'image'],
+                    entries,
+                )
+                write_rows(
+                    cursor, Entry.tags.through._meta.db_table,
+                    ['id', 'entry_id', 'tag_id'],
+                    links,
+                )
+                update_cooccurrences(Entry.objects.filter(
+                    id__gte=first_id, id__lt=entry_id,
+                ).values('id'))
+            remaining -= size
+            self.stdout.write(
+                f'{options["entries"] - remaining} entries written.'
+            )
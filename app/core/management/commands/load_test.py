@@ -0,0 +1,127 @@
+"""
+Custom benchmark command: Drives a running instance with scripted sessions.
+"""
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark, loadgen
+
+
+class Command(BaseCommand):
+    """Offers sessions of virtual users to a running instance at increasing
+    arrival rates and reports throughput, latency percentiles, error rates
+    and the rate at which the instance saturates. Only local instances can
+    be targeted; run them with THROTTLE_ENABLED=0.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument('--rates', default='1,2,4',
+                            help='Session arrivals per second, per stage')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds of arrivals per stage')
+        parser.add_argument('--warmup', type=float, default=5,
+                            help='Seconds left out of the throughput')
+        parser.add_argument('--actions', type=int, default=10,
+                            help='Actions per session after logging in')
+        parser.add_argument('--think-time', type=float, default=1,
+                            help='Mean seconds between actions')
+        parser.add_argument('--mix', help='Action weights, e.g. '
+                            '"create=3,list=5"; defaults to '
+                            + ','.join(f'{name}={weight}' for name, weight
+                                       in loadgen.DEFAULT_MIX.items()))
+        parser.add_argument('--max-sessions', type=int, default=200,
+                            help='Sessions running at once')
+        parser.add_argument('--slo-ms', type=float, default=500,
+                            help='p99 latency a stage must stay under')
+        parser.add_argument('--max-error-rate', type=float, default=0.01)
+        parser.add_argument('--min-efficiency', type=float, default=0.9,
+                            help='Share of the offered requests a stage '
+                            'must complete')
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write JSON results here')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        if not loadgen.is_local(options['url']):
+            raise CommandError('Load tests only run against localhost.')
+        try:
+            mix = loadgen.parse_mix(options['mix']) if options['mix'] \
+                else loadgen.DEFAULT_MIX
+            rates = [float(rate) for rate in options['rates'].split(',')]
+        except ValueError as error:
+            raise CommandError(str(error))
+        if options['warmup'] >= options['duration']:
+            raise CommandError('The warmup must be shorter than a stage.')
+
+        self.stdout.write(f'{"rate/s":>7} {"sessions":>9} {"req/s":>8} '
+                          f'{"offered":>8} {"p50 ms":>8} {"p95 ms":>8} '
+                          f'{"p99 ms":>8} {"errors":>7}')
+        stages = []
+        saturated_at = None
+        for index, rate in enumerate(rates):
+            stage = loadgen.run_stage(
+                options['url'], rate, options['duration'], mix,
+                options['actions'], options['think_time'],
+                options['warmup'], options['max_sessions'],
+                options['timeout'], options['seed'] + index,
+            )
+            reason = loadgen.saturation(stage, options['slo_ms'],
+                                        options['max_error_rate'],
+                                        options['min_efficiency'])
+            stage['saturated'] = reason
+            stages.append(stage)
+            self.print_stage(stage)
+
+            if reason:
+                saturated_at = rate
+                self.stdout.write(self.style.WARNING(
+                    f'Saturated at {rate:g} sessions/s: {reason}'
+                ))
+                break
+
+        if saturated_at is None:
+            self.stdout.write(self.style.SUCCESS(
+                f'Not saturated up to {rates[-1]:g} sessions/s.'
+            ))
+        if options['output']:
+            benchmark.save_results(options['output'], {
+                'environment': benchmark.environment(),
+                'workload': {
+                    'mix': mix,
+                    **{key: options[key] for key in
+                       ('actions', 'think_time', 'duration', 'warmup')},
+                },
+                'stages': stages,
+                'saturated_at': saturated_at,
+            })
+            self.stdout.write(f'Results written to {options["output"]}')
+        return None
+
+    def print_stage(self, stage: dict) -> None:
+        throttled = stage['statuses'].get('429', 0)
+        self.stdout.write(
+            f'{stage["rate"]:>7g} {stage["sessions"]:>9} '
+            f'{stage["throughput"]:>8.1f} {stage["offered"]:>8.1f} '
+            f'{stage["p50_ms"]:>8.1f} {stage["p95_ms"]:>8.1f} '
+            f'{stage["p99_ms"]:>8.1f} {stage["error_rate"]:>7.1%}'
+        )
+        for action, stats in stage['actions'].items():
+            self.stdout.write(
+                f'    {action:<9} {stats["requests"]:>6} requests  '
+                f'p95 {stats["p95_ms"]:>7.1f} ms  '
+                f'{stats["errors"]} errors'
+            )
+        if stage['queue_p99_ms'] >= 1:
+            self.stdout.write(self.style.WARNING(
+                f'    sessions waited {stage["queue_p99_ms"]:.0f} ms (p99) '
+                'for one of --max-sessions; counted in the latencies'
+            ))
+        if throttled:
+            self.stdout.write(self.style.WARNING(
+                f'    {throttled} requests were throttled; run the target '
+                'with THROTTLE_ENABLED=0'
+            ))
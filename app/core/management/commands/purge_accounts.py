@@ -0,0 +1,72 @@
+"""
+Custom purge command: Purges the data of deleted accounts in batches.
+"""
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from core.models import AccountDeletion
+from core.purge import claim_next_deletion, purge_account
+
+
+class Command(BaseCommand):
+    """Purge the entries, tag links and images of deleted accounts in small
+    batches, recording the progress of every account.
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Entries deleted per transaction')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new deletions')
+        parser.add_argument('--interval', type=float, default=10.0,
+                            help='Seconds between polls with --loop')
+        parser.add_argument('--status', action='store_true',
+                            help='Print the progress of unfinished purges')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        if options['status']:
+            self.print_status()
+            return None
+
+        while True:
+            deletion = claim_next_deletion()
+            if deletion is None:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+                continue
+            self.purge(deletion, options['batch_size'])
+        return None
+
+    def purge(self, deletion: AccountDeletion, batch_size: int) -> None:
+        """Purges one account, reporting failures without stopping"""
+        self.stdout.write(f'Purging {deletion.email} '
+                          f'({deletion.entries_total} entries)...')
+        try:
+            purge_account(deletion, batch_size)
+        except Exception as error:
+            self.stderr.write(
+                self.style.ERROR(f'Failed to purge {deletion.email}: {error}')
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {deletion.email}: {deletion.entries_deleted} entries, '
+            f'{deletion.files_deleted} files.'
+        ))
+
+    def print_status(self) -> None:
+        """Prints every purge that has not finished yet"""
+        unfinished = AccountDeletion.objects.exclude(
+            status=AccountDeletion.Status.DONE
+        ).order_by('id')
+        for deletion in unfinished:
+            self.stdout.write(
+                f'{deletion.email}: {deletion.status} '
+                f'{deletion.entries_deleted}/{deletion.entries_total} '
+                f'entries, {deletion.files_deleted} files'
+                + (f' ({deletion.error})' if deletion.error else '')
+            )
@@ -0,0 +1,126 @@
+"""
+Custom diagnostics command: Summarizes the slow query log.
+"""
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterator
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from commons.slow_queries import explain
+
+
+def log_files(path: Path) -> list:
+    """Returns the log file and its rotated backups, oldest first"""
+    backups = sorted(path.parent.glob(f'{path.name}.*'),
+                     key=lambda backup: int(backup.suffix[1:]),
+                     reverse=True)
+    return [*backups, path] if path.exists() else backups
+
+
+def read_records(path: Path) -> Iterator[dict]:
+    """Streams the records of every log file"""
+    for log_file in log_files(path):
+        with open(log_file) as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Group:
+    """Aggregate of every record sharing a normalized statement"""
+
+    def __init__(self, sql: str) -> None:
+        self.sql = sql
+        self.slow_count = 0
+        self.slow_ms = 0.0
+        self.max_ms = 0.0
+        self.repeat_requests = 0
+        self.max_repeats = 0
+        self.callsites: Counter = Counter()
+        self.routes: Counter = Counter()
+        self.sample: dict | None = None
+
+    def add(self, record: dict) -> None:
+        self.callsites[record.get('callsite')] += 1
+        self.routes[record.get('route')] += 1
+        if record['type'] == 'slow':
+            self.slow_count += 1
+            self.slow_ms += record['duration_ms']
+            if record['duration_ms'] >= self.max_ms:
+                self.max_ms = record['duration_ms']
+                self.sample = record
+        else:
+            self.repeat_requests += 1
+            self.max_repeats = max(self.max_repeats, record['count'])
+
+
+class Command(BaseCommand):
+    """Group the slow query log by normalized SQL, worst first, and point out
+    statements repeated within single requests (N+1 patterns).
+    """
+    help = __doc__
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG_PATH)
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--explain', metavar='FINGERPRINT',
+                            help='Print the current plan of the slowest '
+                                 'logged sample of a statement')
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Handles the running of the command"""
+        groups: dict = {}
+        for record in read_records(Path(options['log'])):
+            key = record['fingerprint']
+            if key not in groups:
+                groups[key] = Group(record['sql'])
+            groups[key].add(record)
+
+        if options['explain']:
+            self.explain(groups, options['explain'])
+            return None
+
+        slow = sorted((item for item in groups.items()
+                       if item[1].slow_count),
+                      key=lambda item: item[1].slow_ms, reverse=True)
+        self.stdout.write(self.style.MIGRATE_HEADING('Slowest statements'))
+        for key, group in slow[:options['top']]:
+            self.stdout.write(
+                f'[{key}] {group.slow_count} slow, '
+                f'{group.slow_ms:.1f} ms total, {group.max_ms:.1f} ms max'
+            )
+            self.write_details(group)
+
+        repeated = sorted((item for item in groups.items()
+                           if item[1].repeat_requests),
+                          key=lambda item: item[1].max_repeats, reverse=True)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            'Statements repeated within a request (possible N+1)'
+        ))
+        for key, group in repeated[:options['top']]:
+            self.stdout.write(
+                f'[{key}] up to {group.max_repeats}x per request '
+                f'in {group.repeat_requests} requests'
+            )
+            self.write_details(group)
+        return None
+
+    def write_details(self, group: Group) -> None:
+        """Prints the statement, its top call sites and routes"""
+        self.stdout.write(f'    {group.sql[:300]}')
+        for callsite, count in group.callsites.most_common(3):
+            self.stdout.write(f'    from {callsite} ({count})')
+        for route, count in group.routes.most_common(3):
+            self.stdout.write(f'    in {route} ({count})')
+
+    def explain(self, groups: dict, key: str) -> None:
+        """Prints the plan of the slowest sample of a statement"""
+        group = groups.get(key)
+        if group is None or group.sample is None:
+            raise CommandError(f'No slow sample logged for {key}.')
+        plan = explain(group.sample['raw_sql'], group.sample['params'])
+        self.stdout.write(group.sample['raw_sql'])
+        self.stdout.write(plan or 'Only SELECT statements can be explained.')
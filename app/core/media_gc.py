@@ -0,0 +1,106 @@
+"""
+Helpers for finding media files no entry refers to any more.
+
+Both sides are streamed: the media directory is walked one directory at a
+time and the referenced `Entry.image` names are read with a server-side
+cursor. Each stream is sorted externally (sorted runs spilled to temporary
+files, then merged) so the two can be compared like a merge join, keeping
+memory bounded by the run size whatever the number of files.
+"""
+import heapq
+import os
+import tempfile
+from typing import Any, Iterable, Iterator
+
+from core.models import Entry
+
+
+def walk_files(root: str, prefix: str = '') -> Iterator[str]:
+    """Yields the path of every file below root/prefix relative to root,
+    with '/' separators.
+
+    Only one open directory iterator per level is held, unlike os.walk
+    which lists every directory fully.
+    """
+    start = os.path.join(root, prefix) if prefix else root
+    if not os.path.isdir(start):
+        return
+    stack = [os.scandir(start)]
+    try:
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop().close()
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(os.scandir(entry.path))
+            elif entry.is_file(follow_symlinks=False):
+                yield os.path.relpath(entry.path, root).replace(os.sep, '/')
+    finally:
+        for iterator in stack:
+            iterator.close()
+
+
+def _spill(run: list, directory: str) -> str:
+    """Writes a sorted run to a temporary file and returns its path"""
+    run.sort()
+    handle, path = tempfile.mkstemp(dir=directory, suffix='.run')
+    with os.fdopen(handle, 'w', encoding='utf-8') as output:
+        output.writelines(f'{line}\n' for line in run)
+    return path
+
+
+def _read_run(path: str) -> Iterator[str]:
+    with open(path, encoding='utf-8') as run:
+        for line in run:
+            yield line[:-1]
+
+
+def external_sort(lines: Iterable[str], run_size: int = 100_000
+                  ) -> Iterator[str]:
+    """Yields the unique lines in sorted order, holding at most run_size of
+    them in memory. Lines must not contain newlines."""
+    with tempfile.TemporaryDirectory(prefix='media-gc-') as directory:
+        runs: list = []
+        run: list = []
+        for line in lines:
+            run.append(line)
+            if len(run) >= run_size:
+                runs.append(_spill(run, directory))
+                run = []
+
+        if not runs:
+            merged: Iterator[str] = iter(sorted(run))
+        else:
+            if run:
+                runs.append(_spill(run, directory))
+            merged = heapq.merge(*(_read_run(path) for path in runs))
+
+        previous = None
+        for line in merged:
+            if line != previous:
+                yield line
+            previous = line
+
+
+def referenced_images(chunk_size: int = 2000) -> Iterator[str]:
+    """Yields the image name of every entry that has one"""
+    names = Entry.objects.exclude(image='').exclude(image__isnull=True) \
+        .values_list('image', flat=True).iterator(chunk_size=chunk_size)
+    return (name for name in names if '\n' not in name)
+
+
+def find_orphans(root: str, prefix: str, referenced: Iterable[str],
+                 run_size: int = 100_000) -> Iterator[str]:
+    """Yields the files below root/prefix that are not referenced"""
+    files = external_sort(
+        (path for path in walk_files(root, prefix) if '\n' not in path),
+        run_size,
+    )
+    names = external_sort(referenced, run_size)
+    name: Any = next(names, None)
+    for path in files:
+        while name is not None and name < path:
+            name = next(names, None)
+        if name != path:
+            yield path
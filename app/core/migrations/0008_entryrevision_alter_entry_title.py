@@ -0,0 +1,31 @@
+# Generated by Django 4.2.8 on 2026-10-19 17:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_accountdeletion_alter_entry_title'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('number', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('is_snapshot', models.BooleanField(default=False)),
+                ('data', models.BinaryField()),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='core.entry')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='entryrevision',
+            constraint=models.UniqueConstraint(fields=('entry', 'number'), name='unique_entry_revision_number'),
+        ),
+    ]
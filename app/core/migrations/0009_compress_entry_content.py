@@ -0,0 +1,58 @@
+# Generated by Django 4.2.8 on 2026-10-19 17:37
+
+import base64
+import zlib
+
+import core.fields
+from django.db import migrations, models, transaction
+from django.db.models.functions import Cast
+
+# The stored form of compressed values at this migration, kept here so
+# reversing it does not depend on the code of later versions.
+MARKER = '\x01z:'
+
+
+def decompress_content(apps, schema_editor):
+    """Stores all content uncompressed again, in batches"""
+    Entry = apps.get_model('core', 'Entry')
+    rows = Entry.objects.filter(content__startswith=MARKER).order_by('pk')
+    last_pk = 0
+    while True:
+        # Cast reads the stored text as it is, whatever the field does
+        # with it.
+        batch = list(rows.filter(pk__gt=last_pk).annotate(
+            stored=Cast('content', models.TextField()),
+        ).values_list('pk', 'stored')[:500])
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+        with transaction.atomic():
+            for pk, stored in batch:
+                plain = zlib.decompress(
+                    base64.b64decode(stored[len(MARKER):])
+                ).decode()
+                # Rows saved since they were read are left as saved.
+                if not plain.startswith(MARKER):
+                    Entry.objects.filter(
+                        pk=pk, content=models.Value(stored),
+                    ).update(content=models.Value(plain))
+
+
+class Migration(migrations.Migration):
+    # Every batch commits on its own instead of the whole table being
+    # rewritten in one long transaction. Existing content is compressed by
+    # the compress_content command, once CONTENT_COMPRESSION_ENABLED is set.
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_entryrevision_alter_entry_title'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='entry',
+            name='content',
+            field=core.fields.CompressedTextField(),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, decompress_content),
+    ]
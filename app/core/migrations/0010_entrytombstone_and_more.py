@@ -0,0 +1,37 @@
+# Generated by Django 4.2.8 on 2026-10-19 17:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_compress_entry_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('entry_id', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['author', 'updated_at'], name='entry_author_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='entrytombstone',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entry_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='entrytombstone',
+            index=models.Index(fields=['author', 'updated_at'], name='tombstone_author_updated_idx'),
+        ),
+    ]
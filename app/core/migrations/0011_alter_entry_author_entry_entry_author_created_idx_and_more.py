@@ -0,0 +1,31 @@
+# Generated by Django 4.2.8 on 2026-10-19 18:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_entrytombstone_and_more'),
+    ]
+
+    # The composite index is built before the plain author index it
+    # replaces is dropped, so author lookups are always indexed.
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='entry_author_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='entry',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='tag_name_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.8 on 2026-10-19 18:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_cooccurrences(apps, schema_editor):
+    """Counts the tag pairs of the existing entries"""
+    Entry = apps.get_model('core', 'Entry')
+    TagCooccurrence = apps.get_model('core', 'TagCooccurrence')
+    quote = schema_editor.connection.ops.quote_name
+    link = quote(Entry.tags.through._meta.db_table)
+    schema_editor.execute(
+        f'INSERT INTO {quote(TagCooccurrence._meta.db_table)} '
+        f'({quote("author_id")}, {quote("tag_id")}, {quote("other_id")}, '
+        f'{quote("entries")}) '
+        f'SELECT entry.{quote("author_id")}, a.{quote("tag_id")}, '
+        f'b.{quote("tag_id")}, COUNT(*) '
+        f'FROM {link} a '
+        f'JOIN {link} b ON b.{quote("entry_id")} = a.{quote("entry_id")} '
+        f'JOIN {quote(Entry._meta.db_table)} entry '
+        f'ON entry.{quote("id")} = a.{quote("entry_id")} '
+        f'GROUP BY entry.{quote("author_id")}, a.{quote("tag_id")}, '
+        f'b.{quote("tag_id")}'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_alter_entry_author_entry_entry_author_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entries', models.IntegerField(default=0)),
+                ('author', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.tag')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.tag')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tagcooccurrence',
+            constraint=models.UniqueConstraint(fields=('author', 'tag', 'other'), name='unique_tag_cooccurrence'),
+        ),
+        migrations.RunPython(count_cooccurrences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.8 on 2026-10-19 21:12
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    """Indexes the tag links by tag, then entry"""
+    Link = apps.get_model('core', 'Entry').tags.through
+    quote = schema_editor.connection.ops.quote_name
+    schema_editor.execute(
+        f'CREATE INDEX {quote("entry_tags_tag_entry_idx")} '
+        f'ON {quote(Link._meta.db_table)} '
+        f'({quote("tag_id")}, {quote("entry_id")})'
+    )
+
+
+def drop_index(apps, schema_editor):
+    quote = schema_editor.connection.ops.quote_name
+    schema_editor.execute(f'DROP INDEX {quote("entry_tags_tag_entry_idx")}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_tagcooccurrence'),
+    ]
+
+    # Serves the newest links of a tag, see core.related.candidates. The
+    # links table is created by the tags field, so the index is not part of
+    # any model state.
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
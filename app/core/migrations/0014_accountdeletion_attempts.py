@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-19 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_entry_tags_tag_entry_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accountdeletion',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -13,9 +13,11 @@ from django.contrib.auth.models import (
 )
 from django.conf import settings
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils.translation import gettext_lazy as _
 
 from commons.models import Commons
+from core.fields import CompressedTextField
 
 
 class CustomUserManager(BaseUserManager):
@@ -67,6 +69,12 @@ class Tag(models.Model):
     """Tags to provide more context for each entry"""
     name = models.CharField(max_length=255, unique=True)
 
+    class Meta:
+        indexes = [
+            # Serves case-insensitive lookups, see core.tagging.tags_named.
+            models.Index(Upper('name'), name='tag_name_upper_idx'),
+        ]
+
     def __str__(self) -> str:
         """prints/returns tag_name"""
         return self.name
@@ -75,7 +83,7 @@ class Tag(models.Model):
 def upload_file_location(instance: Any, filename: str) -> str:
     """Returns upload file location"""
     ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}.{ext}'
+    filename = f'{uuid.uuid4()}{ext}'
     return os.path.join('entries', str(instance.id), 'images', filename)
 
 
@@ -83,16 +91,144 @@ class Entry(Commons):
     """Journal entries DB model"""
     title = models.CharField(max_length=255,
                              default=date.today().strftime('%d %B, %Y'))
-    content = models.TextField()
+    content = CompressedTextField()
+    # Indexed as the leading column of the composite indexes below.
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name='entries',
+        db_index=False,
     )
     tags = models.ManyToManyField(Tag, related_name='entries', default=[])
     image = models.ImageField(null=True, blank=True, max_length=300,
                               upload_to=upload_file_location)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', '-created_at', '-id'],
+                         name='entry_author_created_idx'),
+            models.Index(fields=['author', 'updated_at'],
+                         name='entry_author_updated_idx'),
+        ]
+
     def __str__(self) -> str:
         """String representation"""
         return f'{self.created_at}: {self.title}'
+
+
+class RefreshToken(Commons):
+    """Long-lived token used to obtain new signed access tokens. Only a hash
+    of the token is stored."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='refresh_tokens',
+    )
+    token_hash = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        """String representation"""
+        return f'{self.user_id}: {self.token_hash[:8]}'
+
+
+class AccountDeletion(Commons):
+    """Progress of the background purge of a deleted account's data"""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        RUNNING = 'running', _('Running')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='deletions',
+    )
+    email = models.EmailField()
+    status = models.CharField(max_length=16, choices=Status.choices,
+                              default=Status.PENDING)
+    entries_total = models.PositiveIntegerField(default=0)
+    entries_deleted = models.PositiveIntegerField(default=0)
+    files_deleted = models.PositiveIntegerField(default=0)
+    # Times the purge was claimed by a worker, see core.purge.
+    attempts = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self) -> str:
+        """String representation"""
+        return f'{self.email}: {self.status}'
+
+
+class EntryRevision(Commons):
+    """One version of an entry, stored as a compressed full snapshot or as a
+    compressed delta against the version before it."""
+    entry = models.ForeignKey(
+        Entry,
+        on_delete=models.CASCADE,
+        related_name='revisions',
+    )
+    number = models.PositiveIntegerField()
+    title = models.CharField(max_length=255)
+    is_snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entry', 'number'],
+                                    name='unique_entry_revision_number'),
+        ]
+
+    def __str__(self) -> str:
+        """String representation"""
+        return f'{self.entry_id}: #{self.number}'
+
+
+class EntryTombstone(Commons):
+    """Marks a deleted entry so that syncing clients can drop it"""
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='entry_tombstones',
+    )
+    entry_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', 'updated_at'],
+                         name='tombstone_author_updated_idx'),
+        ]
+
+    def __str__(self) -> str:
+        """String representation"""
+        return f'{self.author_id}: -{self.entry_id}'
+
+
+class TagCooccurrence(models.Model):
+    """Number of an author's entries tagged with both tags. Rows with
+    tag == other count the author's entries tagged with that tag. Kept up
+    to date by core.related as tag links change."""
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+    )
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Tag, on_delete=models.CASCADE,
+                              related_name='+')
+    entries = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'tag', 'other'],
+                                    name='unique_tag_cooccurrence'),
+        ]
+
+    def __str__(self) -> str:
+        """String representation"""
+        return f'{self.author_id}: {self.tag_id} & {self.other_id}'
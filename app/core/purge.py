@@ -0,0 +1,126 @@
+"""
+Background purge of deleted accounts in bounded batches.
+
+Deleting a user straight away makes Django collect and delete every entry,
+tag link and image reference in one long transaction. Instead the account is
+deactivated immediately and its data is purged batch by batch, each batch in
+its own short transaction, by the `purge_accounts` command.
+
+A purge records its progress after every batch. One left running without
+progress for PURGE_LEASE seconds, by a worker that crashed or was stopped,
+is claimed again, and so is a failed one after PURGE_RETRY_DELAY seconds,
+until it was claimed PURGE_MAX_ATTEMPTS times. Batches are idempotent, so
+a purge picks up where the last attempt left off.
+"""
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from core.models import (
+    AccountDeletion,
+    Entry,
+    User,
+)
+from user.tokens import revoke_user_tokens
+
+
+def schedule_account_deletion(user: Any) -> AccountDeletion:
+    """Deactivates the user, revokes their tokens and queues the purge"""
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active', 'updated_at'])
+        Token.objects.filter(user=user).delete()
+        revoke_user_tokens(user)
+        return AccountDeletion.objects.create(
+            user=user,
+            email=user.email,
+            entries_total=Entry.objects.filter(author=user).count(),
+        )
+
+
+def claim_next_deletion() -> AccountDeletion | None:
+    """Marks the oldest pending, abandoned or failed deletion as running,
+    skipping any claimed by another worker."""
+    now = timezone.now()
+    Status = AccountDeletion.Status
+    abandoned = Q(
+        status=Status.RUNNING,
+        updated_at__lt=now - timedelta(seconds=settings.PURGE_LEASE),
+    )
+    failed = Q(
+        status=Status.FAILED,
+        updated_at__lt=now - timedelta(seconds=settings.PURGE_RETRY_DELAY),
+    )
+    claimable = Q(status=Status.PENDING) | (
+        Q(attempts__lt=settings.PURGE_MAX_ATTEMPTS) & (abandoned | failed)
+    )
+    with transaction.atomic():
+        deletion = AccountDeletion.objects.select_for_update(
+            skip_locked=True
+        ).filter(claimable).order_by('id').first()
+        if deletion is not None:
+            deletion.status = Status.RUNNING
+            deletion.attempts += 1
+            deletion.save(update_fields=['status', 'attempts', 'updated_at'])
+        return deletion
+
+
+def delete_entry_batch(user_id: int, batch_size: int) -> tuple:
+    """Deletes up to batch_size entries of a user with their tag links.
+
+    Returns the number of deleted entries and the image files they
+    referenced, which are removed from storage once the batch committed.
+    """
+    with transaction.atomic():
+        rows = list(
+            Entry.objects.filter(author_id=user_id)
+            .order_by('id')
+            .values_list('id', 'image')[:batch_size]
+        )
+        if not rows:
+            return 0, []
+        ids = [entry_id for entry_id, _ in rows]
+        # Tag links are fast-deleted by id, no signals or per-row queries.
+        Entry.objects.filter(id__in=ids).delete()
+    return len(ids), [image for _, image in rows if image]
+
+
+def purge_account(deletion: AccountDeletion, batch_size: int = 500) -> None:
+    """Purges the data of a deleted account, recording progress as it goes"""
+    storage = Entry._meta.get_field('image').storage  # type: ignore
+    user_id = deletion.user_id
+
+    try:
+        while user_id is not None:
+            deleted, images = delete_entry_batch(user_id, batch_size)
+            if not deleted:
+                break
+            for name in images:
+                storage.delete(name)
+            AccountDeletion.objects.filter(pk=deletion.pk).update(
+                entries_deleted=deletion.entries_deleted + deleted,
+                files_deleted=deletion.files_deleted + len(images),
+                updated_at=timezone.now(),
+            )
+            deletion.entries_deleted += deleted
+            deletion.files_deleted += len(images)
+
+        if user_id is not None:
+            # Only small per-user rows (tokens, permissions) are left.
+            User.objects.filter(pk=user_id).delete()
+            deletion.user_id = None
+    except Exception as error:
+        deletion.status = AccountDeletion.Status.FAILED
+        deletion.error = repr(error)
+        deletion.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+
+    deletion.status = AccountDeletion.Status.DONE
+    deletion.finished_at = timezone.now()
+    deletion.save(update_fields=['status', 'finished_at', 'updated_at'])
@@ -0,0 +1,151 @@
+"""
+Query plan checks for the hot queries of the API.
+
+HOT_QUERIES builds, for one user, the queries the journal endpoints run on
+every request. check_plans() runs EXPLAIN on each of them and reports the
+tables read in full. On PostgreSQL sequential scans are disabled while
+checking, so the planner only picks one when no index can serve the query,
+however small the seeded tables are.
+"""
+import re
+from datetime import timedelta
+from typing import Any, Callable
+
+from django.db import connection
+from django.utils import timezone
+
+from commons.slow_queries import explain
+from core.models import (
+    Entry,
+    EntryRevision,
+    EntryTombstone,
+    TagCooccurrence,
+)
+from core.related import ranked_links, tag_weights
+from core.tagging import tags_named
+
+Link = Entry.tags.through
+
+
+def _entry_list(user: Any) -> Any:
+    return Entry.objects.filter(author=user) \
+        .order_by('-created_at', '-id').values('id', 'updated_at')[:50]
+
+
+def _entry_detail(user: Any) -> Any:
+    entry = Entry.objects.filter(author=user).first()
+    return Entry.objects.filter(author=user, pk=entry.pk)
+
+
+def _entry_tags(user: Any) -> Any:
+    ids = list(Entry.objects.filter(author=user)
+               .values_list('id', flat=True)[:50])
+    return Link.objects.filter(entry_id__in=ids) \
+        .order_by('entry_id', 'tag_id') \
+        .values_list('entry_id', 'tag_id', 'tag__name')
+
+
+def _entries_created_between(user: Any) -> Any:
+    now = timezone.now()
+    return Entry.objects.filter(author=user,
+                                created_at__gt=now - timedelta(days=7),
+                                created_at__lt=now)
+
+
+def _entries_tagged(user: Any) -> Any:
+    tag = Link.objects.filter(entry__author=user).values_list(
+        'tag__name', flat=True
+    ).first()
+    return Entry.objects.filter(
+        author=user,
+        id__in=Link.objects.filter(
+            tag__in=tags_named([tag.upper()])
+        ).values('entry_id'),
+    )
+
+
+def _sync_entries(user: Any) -> Any:
+    return Entry.objects.filter(
+        author=user, updated_at__gt=timezone.now() - timedelta(days=1),
+    ).order_by('updated_at', 'id')[:500]
+
+
+def _sync_tombstones(user: Any) -> Any:
+    return EntryTombstone.objects.filter(
+        author=user, updated_at__gt=timezone.now() - timedelta(days=1),
+    ).order_by('updated_at', 'id')[:500]
+
+
+def _revisions(user: Any) -> Any:
+    entry = Entry.objects.filter(author=user).first()
+    return EntryRevision.objects.filter(entry=entry) \
+        .order_by('-number').defer('data')
+
+
+def _media(user: Any) -> Any:
+    return Entry.objects.filter(author=user,
+                                image='entries/1/images/photo.jpg')
+
+
+def _tagged_entry(user: Any) -> Any:
+    return Entry.objects.get(
+        id=Link.objects.filter(entry__author=user)
+        .values_list('entry_id', flat=True).first()
+    )
+
+
+def _tag_cooccurrences(user: Any) -> Any:
+    entry = _tagged_entry(user)
+    return TagCooccurrence.objects.filter(
+        author=user, tag__in=entry.tags.values('id'),
+    )
+
+
+def _related_entries(user: Any) -> Any:
+    entry = _tagged_entry(user)
+    return ranked_links(entry, tag_weights(entry))[:10]
+
+
+HOT_QUERIES: dict[str, Callable[[Any], Any]] = {
+    'entry_list': _entry_list,
+    'entry_detail': _entry_detail,
+    'entry_tags': _entry_tags,
+    'entries_created_between': _entries_created_between,
+    'entries_tagged': _entries_tagged,
+    'sync_entries': _sync_entries,
+    'sync_tombstones': _sync_tombstones,
+    'revisions': _revisions,
+    'media': _media,
+    'tag_cooccurrences': _tag_cooccurrences,
+    'related_entries': _related_entries,
+}
+
+
+def full_scans(plan: str) -> list:
+    """Returns the tables a query plan reads from start to end"""
+    if connection.vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    # SQLite reads a table in full with SCAN and by index with SEARCH. It
+    # also SCANs the rows of subqueries it runs as a co-routine or
+    # materializes, which are named after their alias and are no tables.
+    subqueries = set(re.findall(r'\b(?:CO-ROUTINE|MATERIALIZE) (\w+)', plan))
+    return [name for name in re.findall(r'\bSCAN (\w+)', plan)
+            if name not in subqueries]
+
+
+def check_plans(user: Any, queries: dict | None = None) -> list:
+    """Explains every hot query for the user.
+
+    Returns (name, plan, tables scanned in full) for each query. Must run
+    inside a transaction on PostgreSQL.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    results = []
+    for name, build in (queries or HOT_QUERIES).items():
+        sql, params = build(user).query.sql_with_params()
+        plan = explain(sql, params) or ''
+        results.append((name, plan, full_scans(plan)))
+    return results
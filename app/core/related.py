@@ -0,0 +1,165 @@
+"""
+Related entries, ranked by the tags they share.
+
+TagCooccurrence counts, per author, the entries tagged with each pair of
+tags, and with each single tag on the diagonal. It is kept up to date as
+links change: the entries being retagged are locked, and their pairs are
+retracted before and counted again after, in the same transaction, each
+with a single INSERT ... SELECT ... ON CONFLICT whatever the number of
+entries.
+
+Ranking an entry's relatives reads a handful of those rows. A shared tag
+weighs more the fewer of the author's entries carry it, and tags that
+often go with the entry's own tags count for part of their weight, so
+entries with related but not identical tags still come up. The scores are
+summed in the DB over the tag links of the candidates: the author's newest
+RELATED_CANDIDATES entries linked to each weighted tag, each read from the
+(tag, entry) index of the links. Ranking therefore reads a bounded number
+of links however large the journal, at the price of never suggesting
+entries that are older than that for every tag they share. Entry text is
+not compared: content may be stored compressed, out of reach of SQL.
+"""
+import math
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from django.db import connection
+from django.db.models import Case, F, FloatField, Max, Sum, Value, When
+from django.db.models.expressions import RawSQL
+
+from core.models import Entry, TagCooccurrence
+
+Link = Entry.tags.through
+# Tags going with the entry's own tags that are considered, and the share
+# of its weight a tag gets at most for going with them.
+RELATED_TAGS = 10
+RELATED_TAG_WEIGHT = 0.5
+# Newest entries linked to each weighted tag that are ranked.
+RELATED_CANDIDATES = 500
+
+
+def update_cooccurrences(entry_ids: Any, sign: int = 1) -> None:
+    """Counts (sign=1) or retracts (sign=-1) the tag pairs of the entries,
+    given as a list or a queryset of ids"""
+    quote = connection.ops.quote_name
+    table = quote(TagCooccurrence._meta.db_table)
+    link = quote(Link._meta.db_table)
+    selected = Entry.objects.filter(id__in=entry_ids).values('id')
+    sql, params = selected.query.sql_with_params()
+    columns = ', '.join(quote(column) for column in
+                        ('author_id', 'tag_id', 'other_id'))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}, {quote("entries")}) '
+            f'SELECT entry.{quote("author_id")}, a.{quote("tag_id")}, '
+            f'b.{quote("tag_id")}, %s * COUNT(*) '
+            f'FROM {link} a '
+            f'JOIN {link} b ON b.{quote("entry_id")} = a.{quote("entry_id")} '
+            f'JOIN {quote(Entry._meta.db_table)} entry '
+            f'ON entry.{quote("id")} = a.{quote("entry_id")} '
+            f'WHERE a.{quote("entry_id")} IN ({sql}) '
+            f'GROUP BY entry.{quote("author_id")}, a.{quote("tag_id")}, '
+            f'b.{quote("tag_id")} '
+            f'ON CONFLICT ({columns}) DO UPDATE SET {quote("entries")} = '
+            f'{table}.{quote("entries")} + EXCLUDED.{quote("entries")}',
+            (sign, *params),
+        )
+    if sign < 0:
+        TagCooccurrence.objects.filter(
+            author__in=Entry.objects.filter(id__in=entry_ids)
+            .values('author_id'),
+            entries__lte=0,
+        ).delete()
+
+
+def lock_entries(entry_ids: Any) -> None:
+    """Locks the entries until the end of the transaction, so concurrent
+    changes of their tags do not retract the same pairs twice"""
+    list(Entry.objects.select_for_update().filter(id__in=entry_ids)
+         .order_by('id').values_list('id', flat=True))
+
+
+@contextmanager
+def recounting(entry_ids: Any, lock: bool = True) -> Iterator[None]:
+    """Locks the entries, unless the caller has locked them already, and
+    retracts their tag pairs, then counts them again once their tags
+    changed. Use inside a transaction."""
+    if lock:
+        lock_entries(entry_ids)
+    update_cooccurrences(entry_ids, -1)
+    yield
+    update_cooccurrences(entry_ids, 1)
+
+
+def tag_weights(entry: Any) -> dict:
+    """Returns the weight of every tag making an entry related to this one"""
+    tag_ids = set(Link.objects.filter(entry_id=entry.id)
+                  .values_list('tag_id', flat=True))
+    if not tag_ids:
+        return {}
+    rows = list(TagCooccurrence.objects.filter(
+        author_id=entry.author_id, tag_id__in=tag_ids,
+    ).values_list('tag_id', 'other_id', 'entries'))
+    usage = {tag: count for tag, other, count in rows if tag == other}
+
+    # How often a tag goes with one of the entry's tags, as a share of
+    # that tag's entries.
+    affinity: dict = {}
+    for tag, other, count in rows:
+        if other not in tag_ids and usage.get(tag):
+            affinity[other] = max(affinity.get(other, 0),
+                                  count / usage[tag])
+    related = sorted(affinity, key=affinity.__getitem__,
+                     reverse=True)[:RELATED_TAGS]
+    usage.update(TagCooccurrence.objects.filter(
+        author_id=entry.author_id, tag_id__in=related, other_id=F('tag_id'),
+    ).values_list('tag_id', 'entries'))
+
+    weights = {tag: 1 / math.log2(1 + usage.get(tag, 1))
+               for tag in tag_ids}
+    for tag in related:
+        weights[tag] = RELATED_TAG_WEIGHT * affinity[tag] \
+            / math.log2(1 + usage.get(tag, 1))
+    return weights
+
+
+def candidates(entry: Any, weights: dict) -> RawSQL:
+    """Returns a subquery of the ids of the author's newest other entries
+    linked to each of the weighted tags"""
+    quote = connection.ops.quote_name
+    parts, params = [], []
+    for index, tag in enumerate(sorted(weights)):
+        newest = Link.objects.filter(
+            tag_id=tag, entry__author_id=entry.author_id,
+        ).exclude(entry_id=entry.id).order_by('-entry_id') \
+            .values('entry_id')[:RELATED_CANDIDATES]
+        sql, tag_params = newest.query.sql_with_params()
+        parts.append(f'SELECT * FROM ({sql}) {quote(f"newest_{index}")}')
+        params.extend(tag_params)
+    return RawSQL(' UNION ALL '.join(parts), params)
+
+
+def ranked_links(entry: Any, weights: dict) -> Any:
+    """Returns the scored ids of the candidate entries linked to any of the
+    weighted tags, best first"""
+    score = Sum(Case(
+        *[When(tag_id=tag, then=Value(weight))
+          for tag, weight in weights.items()],
+        output_field=FloatField(),
+    ))
+    return Link.objects.filter(
+        tag_id__in=weights, entry__author_id=entry.author_id,
+        entry_id__in=candidates(entry, weights),
+    ).values('entry_id').annotate(
+        score=score, created_at=Max('entry__created_at'),
+    ).order_by('-score', '-created_at', '-entry_id')
+
+
+def related_entries(entry: Any, limit: int) -> list:
+    """Returns (entry id, score) of the author's entries most related to
+    the entry, best first"""
+    weights = tag_weights(entry)
+    if not weights:
+        return []
+    return [(row['entry_id'], row['score'])
+            for row in ranked_links(entry, weights)[:limit]]
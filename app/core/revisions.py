@@ -0,0 +1,185 @@
+"""
+Compact revision history of entries.
+
+A revision is either a full snapshot of the content or a delta against the
+revision before it, both zlib compressed. Deltas compare lines, then the
+words of the lines that changed, so an edit within a long paragraph does
+not store the whole paragraph again. A snapshot is taken
+every REVISION_SNAPSHOT_INTERVAL revisions, and whenever a delta would not
+be smaller, so rebuilding any version reads one snapshot and applies fewer
+than REVISION_SNAPSHOT_INTERVAL deltas.
+
+Entries get a history on their first edit: the version being replaced is
+stored as revision 1, so entries that are never edited cost nothing.
+"""
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from core.models import Entry, EntryRevision
+
+COMPRESSION_LEVEL = 9
+# Words, runs of whitespace and runs of punctuation, which joined together
+# give back the text.
+TOKENS = re.compile(r'\w+|\s+|[^\w\s]+')
+
+
+def _word_delta(line: int, old: str, new: str) -> list:
+    """Returns the operations turning the old text, starting at the given
+    line, into the new text, word by word"""
+    old_words = TOKENS.findall(old)
+    new_words = TOKENS.findall(new)
+    matcher = SequenceMatcher(None, old_words, new_words, autojunk=False)
+    delta: list = []
+    offset = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        kept = ''.join(old_words[i1:i2])
+        if tag == 'equal':
+            start = offset
+            op: Any = [line, start, start + len(kept)]
+            # Short runs cost less inlined than referenced.
+            if len(kept) > len(json.dumps(op)):
+                delta.append(op)
+            else:
+                delta.append(kept)
+        elif j1 != j2:
+            delta.append(''.join(new_words[j1:j2]))
+        offset += len(kept)
+    return delta
+
+
+def make_delta(old: str, new: str) -> list:
+    """Returns the operations turning old into new.
+
+    Lines kept from old are referenced as [start, end] line ranges, and
+    text kept from changed lines as [line, start, end] character ranges
+    counted from the start of that line. New text is inlined as a string.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    delta: list = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif tag == 'replace':
+            delta.extend(_word_delta(i1, ''.join(old_lines[i1:i2]),
+                                     ''.join(new_lines[j1:j2])))
+        elif j1 != j2:
+            delta.append(''.join(new_lines[j1:j2]))
+    # Adjacent strings are joined so they are not quoted one by one.
+    merged: list = []
+    for op in delta:
+        if isinstance(op, str) and merged and isinstance(merged[-1], str):
+            merged[-1] += op
+        else:
+            merged.append(op)
+    return merged
+
+
+def apply_delta(old: str, delta: list) -> str:
+    """Rebuilds the new text from the old text and a delta"""
+    old_lines = old.splitlines(keepends=True)
+    starts = [0]
+    for line in old_lines:
+        starts.append(starts[-1] + len(line))
+    parts = []
+    for op in delta:
+        if isinstance(op, str):
+            parts.append(op)
+        elif len(op) == 2:
+            parts.append(''.join(old_lines[op[0]:op[1]]))
+        else:
+            line, start, end = op
+            parts.append(old[starts[line] + start:starts[line] + end])
+    return ''.join(parts)
+
+
+def compress(text: str) -> bytes:
+    return zlib.compress(text.encode(), COMPRESSION_LEVEL)
+
+
+def decompress(data: Any) -> str:
+    return zlib.decompress(bytes(data)).decode()
+
+
+def _build_revision(entry: Any, number: int, title: str, content: str,
+                    previous: str | None) -> EntryRevision:
+    snapshot = compress(content)
+    revision = EntryRevision(entry=entry, number=number, title=title,
+                             is_snapshot=True, data=snapshot)
+    interval = settings.REVISION_SNAPSHOT_INTERVAL
+    if previous is not None and (number - 1) % interval != 0:
+        delta = compress(json.dumps(make_delta(previous, content),
+                                    separators=(',', ':')))
+        if len(delta) < len(snapshot):
+            revision.is_snapshot = False
+            revision.data = delta
+    return revision
+
+
+def record_revision(entry: Any, old_title: str, old_content: str) -> None:
+    """Records the current version of an edited entry.
+
+    old_title and old_content are the version the edit replaced; they start
+    the history of entries that do not have one yet. When the latest
+    revision differs from them, the entry was changed without a revision
+    being recorded, by a concurrent edit or outside the API, and they are
+    recorded first so every delta applies to the revision before it.
+    """
+    if entry.title == old_title and entry.content == old_content:
+        return
+
+    with transaction.atomic():
+        # Serializes concurrent edits of the entry so numbers stay unique
+        # and the latest revision read below stays the latest.
+        Entry.objects.select_for_update().filter(pk=entry.pk).exists()
+        last = EntryRevision.objects.filter(entry=entry) \
+            .aggregate(last=Max('number'))['last']
+        revisions = []
+        if last is None:
+            last = 1
+            revisions.append(_build_revision(entry, last, old_title,
+                                             old_content, None))
+        else:
+            latest = rebuild_revision(entry, last)
+            previous = latest['content'] if latest else None
+            if latest is None or (latest['title'], previous) != \
+                    (old_title, old_content):
+                last += 1
+                revisions.append(_build_revision(entry, last, old_title,
+                                                 old_content, previous))
+        revisions.append(_build_revision(entry, last + 1, entry.title,
+                                         entry.content, old_content))
+        EntryRevision.objects.bulk_create(revisions)
+
+
+def rebuild_revision(entry: Any, number: int) -> dict | None:
+    """Returns the title and content of a revision of the entry"""
+    snapshot = EntryRevision.objects.filter(
+        entry=entry, number__lte=number, is_snapshot=True
+    ).order_by('-number').values_list('number', flat=True).first()
+    if snapshot is None:
+        return None
+
+    revisions = list(EntryRevision.objects.filter(
+        entry=entry, number__gte=snapshot, number__lte=number
+    ).order_by('number'))
+    if not revisions or revisions[-1].number != number:
+        return None
+
+    content = decompress(revisions[0].data)
+    for revision in revisions[1:]:
+        content = apply_delta(content, json.loads(decompress(revision.data)))
+    return {
+        'number': number,
+        'title': revisions[-1].title,
+        'content': content,
+        'created_at': revisions[-1].created_at,
+    }
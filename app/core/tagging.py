@@ -0,0 +1,141 @@
+"""
+Set-based tagging of many entries at once.
+
+Each operation is a handful of statements whatever the number of entries:
+links are inserted with INSERT ... SELECT and removed with a single DELETE,
+and the touched entries get their `updated_at` bumped in one UPDATE so that
+anything keyed on it sees the change. Their tag co-occurrences are counted
+again in the same transaction, see core.related. The selected entries are
+locked and their ids kept in a temporary table by a single INSERT ...
+SELECT ... FOR UPDATE, so every statement works on the same entries
+without the ids ever leaving the DB, even when the selection filters on
+the tags being changed. Tags are shared by all
+users, so merging or renaming only moves the links of the given entries and
+leaves other users' entries alone.
+"""
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from core.models import Entry, Tag
+from core.related import recounting
+
+Link = Entry.tags.through
+
+
+def get_or_create_tags(names: list) -> list:
+    """Returns the ids of the named tags, creating missing ones"""
+    names = sorted(set(names))
+    Tag.objects.bulk_create([Tag(name=name) for name in names],
+                            ignore_conflicts=True)
+    return list(Tag.objects.filter(name__in=names)
+                .values_list('id', flat=True))
+
+
+def tags_named(names: list) -> Any:
+    """Returns the tags matching any of the names, ignoring case"""
+    return Tag.objects.annotate(upper_name=Upper('name')) \
+        .filter(upper_name__in=[name.upper() for name in names])
+
+
+def _link(entry_ids_sql: str, params: tuple, tag_ids: list) -> int:
+    """Links every entry selected by entry_ids_sql to every tag"""
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(tag_ids))
+    sql = (
+        f'INSERT INTO {quote(Link._meta.db_table)} '
+        f'({quote("entry_id")}, {quote("tag_id")}) '
+        f'SELECT selected.entry_id, tag.{quote("id")} '
+        f'FROM ({entry_ids_sql}) selected '
+        f'CROSS JOIN {quote(Tag._meta.db_table)} tag '
+        f'WHERE tag.{quote("id")} IN ({placeholders}) '
+        f'ON CONFLICT DO NOTHING'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*params, *tag_ids))
+        return cursor.rowcount
+
+
+@contextmanager
+def selected_entries(entries: Any) -> Iterator[Any]:
+    """Locks the entries of a queryset and yields a queryset of their ids
+    that stays the same until the end of the block. Use inside a
+    transaction."""
+    quote = connection.ops.quote_name
+    table = quote('tagging_selected_entries')
+    locked = Entry.objects.select_for_update() \
+        .filter(id__in=entries.order_by().values('id')) \
+        .order_by('id').values('id')
+    sql, params = locked.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TEMPORARY TABLE {table} '
+                       f'({quote("id")} bigint PRIMARY KEY)')
+        cursor.execute(f'INSERT INTO {table} ({quote("id")}) {sql}', params)
+    yield Entry.objects.filter(
+        id__in=RawSQL(f'SELECT {quote("id")} FROM {table}', ()),
+    ).values('id')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {table}')
+
+
+def _touch(entry_ids: Any) -> int:
+    return Entry.objects.filter(id__in=entry_ids) \
+        .update(updated_at=timezone.now())
+
+
+def retag(entries: Any, add: list | None = None,
+          remove: list | None = None) -> dict:
+    """Adds and removes tags, by name, on every entry of a queryset"""
+    add, remove = add or [], remove or []
+
+    # Entries selected by a tag being removed are still retagged and
+    # touched: the selection is taken before any link changes.
+    with transaction.atomic(), selected_entries(entries) as selected:
+        added = removed = 0
+        with recounting(selected, lock=False):
+            if remove:
+                removed, _ = Link.objects.filter(
+                    entry_id__in=selected, tag__in=tags_named(remove),
+                ).delete()
+            if add:
+                sql, params = selected.query.sql_with_params()
+                sql = f'SELECT entry_ids.id AS entry_id FROM ({sql}) entry_ids'
+                added = _link(sql, params, get_or_create_tags(add))
+        touched = _touch(selected) if added or removed else 0
+    return {'entries': touched, 'added': added, 'removed': removed}
+
+
+def merge_tags(entries: Any, sources: list, target: str) -> dict:
+    """Moves the entries tagged with any of the source tags, named in any
+    case, to the target tag. Renaming is merging a single source.
+
+    Source tags no entry uses any more are deleted.
+    """
+    sources = [name for name in set(sources) if name != target]
+    if not sources:
+        return {'entries': 0, 'added': 0, 'removed': 0}
+
+    with transaction.atomic():
+        target_ids = get_or_create_tags([target])
+        source_ids = list(tags_named(sources).exclude(id__in=target_ids)
+                          .values_list('id', flat=True))
+        tagged = entries.filter(id__in=Link.objects.filter(
+            tag_id__in=source_ids,
+        ).values('entry_id'))
+        # Only the entries locked and recounted here are relinked: links of
+        # entries tagged since were never retracted.
+        with selected_entries(tagged) as selected, \
+                recounting(selected, lock=False):
+            source_links = Link.objects.filter(entry_id__in=selected,
+                                               tag_id__in=source_ids)
+            touched = _touch(selected)
+            sql, params = source_links.values_list('entry_id', flat=True) \
+                .distinct().query.sql_with_params()
+            added = _link(sql, params, target_ids)
+            removed, _ = source_links.delete()
+        Tag.objects.filter(id__in=source_ids, entries__isnull=True).delete()
+    return {'entries': touched, 'added': added, 'removed': removed}
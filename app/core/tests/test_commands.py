@@ -1,14 +1,32 @@
 """
 Tests for custom commands created specifically for this project
 """
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 from typing import Any
 from unittest.mock import patch
 
 from psycopg import OperationalError as PsycopgError
 
-from django.core.management import call_command
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.test import LiveServerTestCase, TestCase, override_settings
 from django.db.utils import OperationalError
+from django.utils import timezone
+
+from core import benchmark, loadgen, media_gc, query_plans
+from core.management.commands.benchmark_api import SCENARIOS
+from core.purge import schedule_account_deletion
+from core.models import (
+    AccountDeletion,
+    Entry,
+    Tag,
+    User,
+)
 
 
 @patch('core.management.commands.await_db.Command.check')
@@ -35,3 +53,444 @@ class TestCommand(TestCase):
         self.assertEqual(patched_check.call_count, 6)
         patched_sleep.assert_called()
         patched_check.assert_called_with(databases=['default'])
+
+    @patch('time.sleep')
+    @patch('random.uniform', side_effect=lambda low, high: high)
+    def test_command_backs_off_exponentially(self, patched_uniform: Any,
+                                             patched_sleep: Any,
+                                             patched_check: Any) -> None:
+        """Tests that retry delays double up to the maximum delay"""
+        patched_check.side_effect = [OperationalError] * 5 + [True]
+
+        call_command('await_db', initial_delay=1, max_delay=5,
+                     stderr=StringIO())
+
+        delays = [call.args[0] for call in patched_sleep.call_args_list]
+        self.assertEqual(delays, [1, 2, 4, 5, 5])
+
+    @patch('time.sleep')
+    @patch('time.monotonic')
+    def test_command_times_out(self, patched_monotonic: Any,
+                               patched_sleep: Any,
+                               patched_check: Any) -> None:
+        """Tests that the command gives up after the timeout"""
+        patched_check.side_effect = OperationalError
+        patched_monotonic.side_effect = [0, 1, 4, 11]
+
+        with self.assertRaises(CommandError):
+            call_command('await_db', timeout=10, stderr=StringIO())
+
+        self.assertEqual(patched_check.call_count, 3)
+
+
+class TestBenchmarkCommand(TestCase):
+    """Tests the in-process API benchmark"""
+
+    def test_percentile(self) -> None:
+        """Tests that percentiles interpolate between samples"""
+        samples = [1.0, 2.0, 3.0, 4.0]
+
+        self.assertEqual(benchmark.percentile(samples, 0), 1.0)
+        self.assertEqual(benchmark.percentile(samples, 50), 2.5)
+        self.assertEqual(benchmark.percentile(samples, 100), 4.0)
+
+    def test_benchmark_writes_results(self) -> None:
+        """Tests that every scenario is measured, saved and rolled back"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_api', users=2, entries=3, tags=4,
+                         iterations=2, warmup=0, output=output,
+                         stdout=StringIO())
+
+            with open(output) as results_file:
+                results = json.load(results_file)
+
+        self.assertEqual(set(results['results']),
+                         set(SCENARIOS))
+        for stats in results['results'].values():
+            self.assertEqual(stats['iterations'], 2)
+            self.assertEqual(stats['errors'], 0)
+            self.assertGreater(stats['queries_mean'], 0)
+        self.assertFalse(Entry.objects.exists())
+
+    def test_compare_results(self) -> None:
+        """Tests that runs are compared metric by metric"""
+        previous = {'entry_list': {'p50_ms': 10.0}}
+        current = {'entry_list': {'p50_ms': 5.0}, 'tag_list': {}}
+
+        rows = benchmark.compare(previous, current, metrics=('p50_ms',))
+
+        self.assertEqual(rows, [('entry_list', 'p50_ms', 10.0, 5.0, -50.0)])
+
+    def test_metrics_overhead_benchmark(self) -> None:
+        """Tests that the metrics overhead benchmark reports its result"""
+        out = StringIO()
+
+        call_command('benchmark_metrics', iterations=10, rounds=1,
+                     stdout=out)
+
+        self.assertIn('overhead:', out.getvalue())
+
+
+class TestCheckQueryPlansCommand(TestCase):
+    """Tests the query plan regression check"""
+
+    def test_hot_queries_use_indexes(self) -> None:
+        """Tests that no hot query reads a table in full"""
+        out = StringIO()
+
+        call_command('check_query_plans', entries=20, stdout=out)
+
+        self.assertIn('All 11 hot queries use indexes.', out.getvalue())
+        self.assertFalse(Entry.objects.exists())
+
+    @patch('core.query_plans.connection')
+    def test_subquery_scans_are_not_full_scans(
+            self, patched_connection: Any) -> None:
+        """Tests that SQLite scans of subquery rows are not reported"""
+        patched_connection.vendor = 'sqlite'
+        plan = '\n'.join([
+            'CO-ROUTINE newest_0',
+            '  SEARCH U0 USING COVERING INDEX entry_tags_tag_entry_idx',
+            '  SCAN core_tag',
+            'MATERIALIZE newest_1',
+            'SCAN newest_0',
+            'SCAN newest_1',
+        ])
+
+        self.assertEqual(query_plans.full_scans(plan), ['core_tag'])
+
+    def test_full_scan_fails(self) -> None:
+        """Tests that a query filtering on an unindexed column fails"""
+        queries = {'by_title': lambda user: Entry.objects.filter(
+            title='Entry 1'
+        )}
+
+        with patch.dict('core.query_plans.HOT_QUERIES', queries,
+                        clear=True), \
+                self.assertRaisesMessage(CommandError, 'by_title'):
+            call_command('check_query_plans', entries=5, stdout=StringIO())
+
+
+class TestLoadTestCommand(LiveServerTestCase):
+    """Tests the HTTP load generator against a live server. Sessions run
+    one at a time, as the live server threads may share one connection to
+    an in-memory SQLite test DB."""
+
+    def setUp(self) -> None:
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media.name,
+                                              THROTTLE_ENABLED=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_load_test_reports_stages(self) -> None:
+        """Tests that sessions run every action and stages are reported"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'load.json')
+            call_command('load_test', url=self.live_server_url,
+                         rates='4', duration=1, warmup=0, actions=15,
+                         think_time=0, max_sessions=1, slo_ms=60000,
+                         min_efficiency=0, output=output, stdout=StringIO())
+
+            with open(output) as results_file:
+                results = json.load(results_file)
+
+        stage = results['stages'][0]
+        self.assertGreater(stage['sessions'], 0)
+        self.assertEqual(stage['error_rate'], 0)
+        self.assertIn('register', stage['actions'])
+        self.assertIn('create', stage['actions'])
+        self.assertIsNone(results['saturated_at'])
+        self.assertTrue(Entry.objects.exists())
+
+    def test_saturation_is_reported(self) -> None:
+        """Tests that a stage missing its latency target stops the run"""
+        out = StringIO()
+
+        call_command('load_test', url=self.live_server_url,
+                     rates='2,4', duration=0.5, warmup=0, actions=1,
+                     think_time=0, max_sessions=1, slo_ms=0, stdout=out)
+
+        self.assertIn('Saturated at 2 sessions/s', out.getvalue())
+
+    def test_queued_sessions_count_in_latency(self) -> None:
+        """Tests that sessions waiting for a worker are timed from their
+        scheduled arrival"""
+        stage = loadgen.run_stage(self.live_server_url, rate=20,
+                                  duration=0.3, mix={'list': 1}, actions=1,
+                                  think_time=0, warmup=0, max_sessions=1,
+                                  timeout=10, seed=0)
+
+        self.assertGreater(stage['queue_p99_ms'], 0)
+        self.assertGreaterEqual(stage['actions']['register']['p99_ms'],
+                                stage['queue_p99_ms'])
+
+    def test_remote_targets_are_refused(self) -> None:
+        """Tests that only local instances can be load tested"""
+        with self.assertRaisesMessage(CommandError, 'localhost'):
+            call_command('load_test', url='http://example.com',
+                         stdout=StringIO())
+
+    def test_parse_mix(self) -> None:
+        """Tests that mixes are parsed and unknown actions rejected"""
+        self.assertEqual(loadgen.parse_mix('create=3, list'),
+                         {'create': 3.0, 'list': 1.0})
+        with self.assertRaises(ValueError):
+            loadgen.parse_mix('search=1')
+
+
+class TestGenerateDataCommand(TestCase):
+    """Tests the synthetic data generator"""
+
+    def generate(self, **options: Any) -> None:
+        """Runs the generator with a small dataset"""
+        params = {'users': 3, 'entries': 40, 'tags': 6, 'batch_size': 15,
+                  'stdout': StringIO()}
+        params.update(options)
+        call_command('generate_data', **params)
+
+    def test_generates_requested_volumes(self) -> None:
+        """Tests that users, tags, entries and tag links are generated"""
+        self.generate()
+
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Tag.objects.count(), 6)
+        self.assertEqual(Entry.objects.count(), 40)
+        self.assertTrue(Entry.tags.through.objects.exists())
+        self.assertTrue(User.objects.first().check_password('generated123#'))
+
+    def test_generation_is_deterministic(self) -> None:
+        """Tests that the same seed produces the same entries"""
+        def snapshot() -> list:
+            return [
+                (entry.content, entry.tags.count())
+                for entry in Entry.objects.order_by('id')
+            ]
+
+        self.generate(seed=7)
+        first = snapshot()
+        User.objects.all().delete()
+        Tag.objects.all().delete()
+        self.generate(seed=7)
+
+        self.assertEqual(snapshot(), first)
+
+    def test_runs_add_up(self) -> None:
+        """Tests that runs with the same prefix add to the data"""
+        self.generate()
+        self.generate()
+
+        self.assertEqual(User.objects.count(), 6)
+        self.assertEqual(Tag.objects.count(), 12)
+        self.assertEqual(Entry.objects.count(), 80)
+
+    def test_ids_remain_usable(self) -> None:
+        """Tests that regular inserts still work after generation"""
+        self.generate()
+        user = User.objects.first()
+
+        entry = Entry.objects.create(author=user, content='After')
+
+        self.assertEqual(entry.id, Entry.objects.order_by('id').last().id)
+
+
+class TestPurgeAccountsCommand(TestCase):
+    """Tests the background purge of deleted accounts"""
+
+    def setUp(self) -> None:
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(email='gone@example.com',
+                                             password='testing123#')
+        self.other = User.objects.create_user(email='kept@example.com',
+                                              password='testing123#')
+        self.tag = Tag.objects.create(name='kept')
+        self.files = []
+        for index in range(5):
+            name = default_storage.save(f'entries/{index}/images/a.png',
+                                        ContentFile(b'image'))
+            self.files.append(name)
+            entry = Entry.objects.create(title=f'Entry {index}',
+                                         content='Content', author=self.user,
+                                         image=name)
+            entry.tags.add(self.tag)
+        self.kept = Entry.objects.create(title='Kept', content='Content',
+                                         author=self.other)
+        self.kept.tags.add(self.tag)
+
+    def test_purges_account_in_batches(self) -> None:
+        """Tests that entries, tag links, files and the user are purged"""
+        deletion = schedule_account_deletion(self.user)
+        self.assertEqual(deletion.entries_total, 5)
+
+        call_command('purge_accounts', batch_size=2, stdout=StringIO())
+
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.Status.DONE)
+        self.assertEqual(deletion.entries_deleted, 5)
+        self.assertEqual(deletion.files_deleted, 5)
+        self.assertIsNotNone(deletion.finished_at)
+        self.assertIsNone(deletion.user)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(Entry.tags.through.objects.count(), 1)
+        for name in self.files:
+            self.assertFalse(default_storage.exists(name))
+        self.assertTrue(Entry.objects.filter(pk=self.kept.pk).exists())
+        self.assertTrue(Tag.objects.filter(pk=self.tag.pk).exists())
+
+    def test_failed_purge_is_recorded(self) -> None:
+        """Tests that a failing purge is marked failed with its error"""
+        deletion = schedule_account_deletion(self.user)
+        stderr = StringIO()
+
+        with patch('core.purge.delete_entry_batch',
+                   side_effect=RuntimeError('boom')):
+            call_command('purge_accounts', stdout=StringIO(), stderr=stderr)
+
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.Status.FAILED)
+        self.assertIn('boom', deletion.error)
+        self.assertIn('boom', stderr.getvalue())
+
+        output = StringIO()
+        call_command('purge_accounts', status=True, stdout=output)
+        self.assertIn('gone@example.com: failed 0/5', output.getvalue())
+
+    def age(self, deletion: AccountDeletion, seconds: int) -> None:
+        """Makes the last progress of a purge seconds old"""
+        AccountDeletion.objects.filter(pk=deletion.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=seconds)
+        )
+
+    @override_settings(PURGE_LEASE=600)
+    def test_abandoned_purge_is_taken_over(self) -> None:
+        """Tests that a running purge without recent progress is claimed
+        again, and one making progress is not"""
+        deletion = schedule_account_deletion(self.user)
+        AccountDeletion.objects.filter(pk=deletion.pk).update(
+            status=AccountDeletion.Status.RUNNING, attempts=1,
+        )
+
+        call_command('purge_accounts', stdout=StringIO())
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.Status.RUNNING)
+
+        self.age(deletion, 601)
+        call_command('purge_accounts', stdout=StringIO())
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.Status.DONE)
+        self.assertEqual(deletion.attempts, 2)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+
+    @override_settings(PURGE_RETRY_DELAY=60, PURGE_MAX_ATTEMPTS=2)
+    def test_failed_purge_is_retried(self) -> None:
+        """Tests that a failed purge is retried after a delay, up to the
+        maximum number of attempts"""
+        deletion = schedule_account_deletion(self.user)
+        with patch('core.purge.delete_entry_batch',
+                   side_effect=RuntimeError('boom')):
+            call_command('purge_accounts', stdout=StringIO(),
+                         stderr=StringIO())
+            self.age(deletion, 61)
+            call_command('purge_accounts', stdout=StringIO(),
+                         stderr=StringIO())
+
+        self.age(deletion, 61)
+        call_command('purge_accounts', stdout=StringIO())
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.Status.FAILED)
+        self.assertEqual(deletion.attempts, 2)
+
+        with override_settings(PURGE_MAX_ATTEMPTS=3):
+            call_command('purge_accounts', stdout=StringIO())
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, AccountDeletion.Status.DONE)
+        self.assertEqual(deletion.entries_deleted, 5)
+
+
+class TestCleanMediaCommand(TestCase):
+    """Tests the orphaned media garbage collector"""
+
+    def setUp(self) -> None:
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user(email='test@example.com',
+                                        password='testing123#')
+        self.kept = default_storage.save('entries/1/images/kept.png',
+                                         ContentFile(b'kept'))
+        Entry.objects.create(title='Entry', content='Content', author=user,
+                             image=self.kept)
+        self.orphan = default_storage.save('entries/1/images/old.png',
+                                           ContentFile(b'orphan'))
+        self.recent = default_storage.save('entries/2/images/new.png',
+                                           ContentFile(b'recent'))
+        old = os.path.getmtime(self.path(self.orphan)) - 2 * 86400
+        for name in (self.kept, self.orphan):
+            os.utime(self.path(name), (old, old))
+
+    def path(self, name: str) -> str:
+        """Returns the absolute path of a media file"""
+        return os.path.join(self.media.name, name)
+
+    def test_external_sort(self) -> None:
+        """Tests that sorting in small runs yields unique sorted lines"""
+        lines = ['d', 'b', 'a', 'c', 'b', 'e', 'a']
+
+        self.assertEqual(list(media_gc.external_sort(lines, run_size=2)),
+                         ['a', 'b', 'c', 'd', 'e'])
+
+    def test_reports_without_deleting(self) -> None:
+        """Tests that orphans are only reported by default"""
+        output = StringIO()
+
+        call_command('clean_media', stdout=output)
+
+        self.assertIn('1 orphaned files. Reclaimable: 6 bytes.',
+                      output.getvalue())
+        self.assertTrue(os.path.exists(self.path(self.orphan)))
+
+    def test_deletes_orphans_past_grace_period(self) -> None:
+        """Tests that only old unreferenced files are deleted"""
+        call_command('clean_media', delete=True, run_size=1,
+                     stdout=StringIO())
+
+        self.assertTrue(os.path.exists(self.path(self.kept)))
+        self.assertFalse(os.path.exists(self.path(self.orphan)))
+        self.assertTrue(os.path.exists(self.path(self.recent)))
+
+    def test_quarantines_orphans(self) -> None:
+        """Tests that orphans can be moved aside instead of deleted"""
+        with tempfile.TemporaryDirectory() as quarantine:
+            call_command('clean_media', quarantine=quarantine,
+                         stdout=StringIO())
+
+            self.assertFalse(os.path.exists(self.path(self.orphan)))
+            self.assertTrue(os.path.exists(
+                os.path.join(quarantine, self.orphan)
+            ))
+
+    def test_quarantine_outside_scanned_directory(self) -> None:
+        """Tests that a sibling of the scanned directory can hold the
+        quarantine, and that the scanned directory itself can not"""
+        with self.assertRaises(CommandError):
+            call_command('clean_media', quarantine=self.path('entries/old'),
+                         stdout=StringIO())
+        self.assertTrue(os.path.exists(self.path(self.orphan)))
+
+        call_command('clean_media', quarantine=self.path('entries-old'),
+                     stdout=StringIO())
+
+        self.assertFalse(os.path.exists(self.path(self.orphan)))
+        self.assertTrue(os.path.exists(
+            self.path(os.path.join('entries-old', self.orphan))
+        ))
@@ -4,11 +4,13 @@ Tests for the DB models created in the app.
 from datetime import date
 from parameterized import parameterized
 from typing import Any
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.db.utils import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+from core import fields
 from core.models import (
     Entry,
     Tag,
@@ -209,3 +211,92 @@ class TestDBModels(TestCase):
             entry.tags.add(tag)
 
         self.assertEqual(tag.entries.count(), len(entry_titles))
+
+
+@override_settings(CONTENT_COMPRESSION_ENABLED=True,
+                   CONTENT_COMPRESSION_MIN_SIZE=100)
+class TestCompressedContent(TestCase):
+    """Tests the transparent compression of entry content"""
+
+    def setUp(self) -> None:
+        self.user = create_user()
+        self.long_content = 'A long paragraph of journal text. ' * 50
+
+    def stored_content(self, entry: Any) -> str:
+        """Returns the content as it is stored in the DB"""
+        return Entry.objects.filter(pk=entry.pk) \
+            .values_list('content', flat=True).get().stored
+
+    def test_large_content_is_stored_compressed(self) -> None:
+        """Tests that content above the threshold is compressed"""
+        entry = create_entry(user=self.user, content=self.long_content)
+
+        stored = self.stored_content(entry)
+        self.assertTrue(stored.startswith(fields.MARKER))
+        self.assertLess(len(stored), len(self.long_content) / 4)
+        self.assertEqual(Entry.objects.get(pk=entry.pk).content,
+                         self.long_content)
+
+    def test_small_content_is_stored_plain(self) -> None:
+        """Tests that content below the threshold is left alone"""
+        entry = create_entry(user=self.user, content='Short')
+
+        self.assertEqual(Entry.objects.filter(pk=entry.pk)
+                         .values_list('content', flat=True).get(), 'Short')
+
+    def test_content_is_decompressed_lazily(self) -> None:
+        """Tests that content is only decompressed when accessed"""
+        entry = create_entry(user=self.user, content=self.long_content)
+        loaded = Entry.objects.get(pk=entry.pk)
+
+        self.assertIsInstance(loaded.__dict__['content'], fields.Compressed)
+        loaded.title = 'Renamed'
+        loaded.save()
+        self.assertIsInstance(loaded.__dict__['content'], fields.Compressed)
+        self.assertEqual(loaded.content, self.long_content)
+        self.assertEqual(loaded.__dict__['content'], self.long_content)
+
+    def test_plain_text_looking_compressed_round_trips(self) -> None:
+        """Tests that plain text starting with the marker stays readable"""
+        content = fields.MARKER + 'not really compressed'
+        entry = create_entry(user=self.user, content=content)
+
+        self.assertEqual(Entry.objects.get(pk=entry.pk).content, content)
+
+    def test_backfill_in_batches(self) -> None:
+        """Tests that existing rows are compressed and decompressed"""
+        with override_settings(CONTENT_COMPRESSION_ENABLED=False):
+            entries = [create_entry(user=self.user,
+                                    content=self.long_content)
+                       for _ in range(5)]
+        create_entry(user=self.user, content='Short')
+
+        self.assertEqual(fields.backfill(Entry, 'content', batch_size=2), 5)
+        for entry in entries:
+            self.assertTrue(
+                self.stored_content(entry).startswith(fields.MARKER)
+            )
+        self.assertEqual(fields.backfill(Entry, 'content', batch_size=2), 0)
+
+        self.assertEqual(
+            fields.backfill(Entry, 'content', batch_size=2, reverse=True), 5
+        )
+        self.assertEqual(Entry.objects.filter(
+            content=self.long_content
+        ).count(), 5)
+
+    def test_backfill_keeps_concurrent_edits(self) -> None:
+        """Tests that a row saved between the read and the write of its
+        batch keeps the saved content"""
+        with override_settings(CONTENT_COMPRESSION_ENABLED=False):
+            entry = create_entry(user=self.user, content=self.long_content)
+        compress = fields.compress
+
+        def edit_then_compress(value: str) -> str:
+            Entry.objects.filter(pk=entry.pk).update(content='Edited')
+            return compress(value)
+
+        with patch('core.fields.compress', side_effect=edit_then_compress):
+            self.assertEqual(fields.backfill(Entry, 'content'), 0)
+
+        self.assertEqual(Entry.objects.get(pk=entry.pk).content, 'Edited')
@@ -1,14 +1,37 @@
 """
 Definition of Serializers useful for the Journal API.
 """
+import os
+from collections import defaultdict
 from typing import Any
 
+from PIL import Image
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Substr
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
+from commons.fragments import get_fragments, set_fragments
+from commons.functions import WordCount
+from core.fields import (
+    MARKER,
+    Compressed,
+    CompressedTextField,
+    decompressed,
+)
 from core.models import (
     Entry,
+    EntryRevision,
     Tag,
+    upload_file_location,
 )
+from core.related import lock_entries, update_cooccurrences
+from core.revisions import record_revision
+from core.tagging import get_or_create_tags, tags_named
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -21,12 +44,26 @@ class TagSerializer(serializers.ModelSerializer):
             'id': {
                 'read_only': True,
             },
+            # Entries refer to existing tags by name; they are looked up
+            # or created, so the name need not be new.
+            'name': {
+                'validators': [],
+            },
         }
 
 
+class EntryTagListSerializer(serializers.ListSerializer):
+    """Serialize the tags of an entry in the order of their ids, as the
+    list endpoint does"""
+
+    def to_representation(self, data: Any) -> list:
+        tags = data.all() if hasattr(data, 'all') else data
+        return super().to_representation(sorted(tags, key=lambda tag: tag.id))
+
+
 class EntrySerializer(serializers.ModelSerializer):
     """Serialize & Deserialize journal entries"""
-    tags = TagSerializer(required=False, many=True)
+    tags = EntryTagListSerializer(child=TagSerializer(), required=False)
     image = serializers.ImageField(required=False)
 
     class Meta:
@@ -54,22 +91,55 @@ class EntrySerializer(serializers.ModelSerializer):
     def create(self, validated_data: Any) -> Any:
         tags_list = validated_data.pop('tags', [])
 
-        instance = Entry.objects.create(**validated_data)
-        self._add_tags_to_entry(tags_list, instance)
+        # Tags are linked in the same transaction, so the entry is never
+        # listed, and its fragment cached, without them.
+        with transaction.atomic():
+            instance = Entry.objects.create(**validated_data)
+            self._add_tags_to_entry(tags_list, instance)
+            if tags_list:
+                update_cooccurrences([instance.id])
 
         return instance
 
-    def update(self, instance: Any, validated_data: Any) -> Any:
-        tags_list = validated_data.pop('tags', None)
+    def _set_tags_of_entry(self, tags_list: list, instance: Any) -> bool:
+        """Links the entry to exactly the listed tags, only inserting and
+        deleting the links that differ. Returns whether any did. Use inside
+        a transaction."""
+        # Locked before the current tags are read, so concurrent edits see
+        # each other's links and count their tag pairs once.
+        lock_entries([instance.id])
+        names = {tag_info['name'] for tag_info in tags_list}
+        current = dict(instance.tags.values_list('name', 'id'))
+        removed = [current[name] for name in current.keys() - names]
+        added = sorted(names - current.keys())
 
-        if tags_list is not None:
-            instance.tags.clear()
-            self._add_tags_to_entry(tags_list, instance)
+        if not removed and not added:
+            return False
+        update_cooccurrences([instance.id], -1)
+        if removed:
+            instance.tags.remove(*removed)
+        if added:
+            instance.tags.add(*get_or_create_tags(added))
+        update_cooccurrences([instance.id], 1)
+        return True
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+    def update(self, instance: Any, validated_data: Any) -> Any:
+        """Writes only what changed: the modified columns and the differing
+        tag links. An update changing nothing writes nothing and leaves
+        updated_at alone."""
+        tags_list = validated_data.pop('tags', None)
+        old_title, old_content = instance.title, instance.content
+        changed = [attr for attr, value in validated_data.items()
+                   if getattr(instance, attr) != value]
 
-        instance.save()
+        with transaction.atomic():
+            tags_changed = tags_list is not None and \
+                self._set_tags_of_entry(tags_list, instance)
+            for attr in changed:
+                setattr(instance, attr, validated_data[attr])
+            if changed or tags_changed:
+                instance.save(update_fields=[*changed, 'updated_at'])
+            record_revision(instance, old_title, old_content)
         return instance
 
 
@@ -85,3 +155,338 @@ class EntryImageSerializer(serializers.ModelSerializer):
                 'required': True,
             },
         }
+
+
+class ImageUploadRequestSerializer(serializers.Serializer):
+    """Describe an image to upload directly to storage"""
+    content_type = serializers.ChoiceField(
+        choices=settings.DIRECT_UPLOAD_CONTENT_TYPES
+    )
+    size = serializers.IntegerField(min_value=1,
+                                    max_value=settings.DIRECT_UPLOAD_MAX_SIZE)
+
+
+class ImageUploadSerializer(serializers.Serializer):
+    """Describe where and how to upload an image"""
+    key = serializers.CharField(read_only=True)
+    url = serializers.URLField(read_only=True)
+    method = serializers.CharField(read_only=True)
+    headers = serializers.DictField(child=serializers.CharField(),
+                                    read_only=True)
+    expires_in = serializers.IntegerField(read_only=True)
+
+
+class ImageConfirmSerializer(serializers.Serializer):
+    """Attach an image uploaded directly to storage to an entry"""
+    key = serializers.CharField(max_length=300)
+
+    def validate_key(self, key: str) -> str:
+        directory = os.path.dirname(upload_file_location(self.instance, ''))
+        if os.path.dirname(key) != directory or '..' in key:
+            raise serializers.ValidationError(
+                'This key was not issued for this entry.'
+            )
+        storage = Entry._meta.get_field('image').storage
+        try:
+            size = storage.size(key)
+        except FileNotFoundError:
+            raise serializers.ValidationError(
+                'Nothing was uploaded with this key.'
+            )
+        # The bytes were never seen by an ImageField, so they are checked
+        # here before being served as the entry's image.
+        if size > settings.DIRECT_UPLOAD_MAX_SIZE or \
+                not self.is_image(storage, key):
+            storage.delete(key)
+            raise serializers.ValidationError(
+                'Upload a valid image. The file you uploaded was either not '
+                'an image or a corrupted image.'
+            )
+        return key
+
+    @staticmethod
+    def is_image(storage: Any, key: str) -> bool:
+        """Whether the stored file is an image of an accepted type"""
+        try:
+            with storage.open(key) as file, Image.open(file) as image:
+                image.verify()
+                return Image.MIME.get(image.format) in \
+                    settings.DIRECT_UPLOAD_CONTENT_TYPES
+        except Exception:
+            return False
+
+    def update(self, instance: Any, validated_data: Any) -> Any:
+        instance.image.name = validated_data['key']
+        instance.save(update_fields=['image', 'updated_at'])
+        return instance
+
+
+class EntryRevisionSerializer(serializers.ModelSerializer):
+    """Serialize the revisions of an entry without their content"""
+
+    class Meta:
+        model = EntryRevision
+        fields = ['number', 'title', 'is_snapshot', 'created_at']
+        read_only_fields = fields
+
+
+class EntryRevisionContentSerializer(serializers.Serializer):
+    """Serialize a rebuilt revision of an entry"""
+    number = serializers.IntegerField(read_only=True)
+    title = serializers.CharField(read_only=True)
+    content = serializers.CharField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+
+
+class EntrySummarySerializer(serializers.ModelSerializer):
+    """Describe the entries returned by the list endpoint"""
+    tags = TagSerializer(many=True, read_only=True)
+    excerpt = serializers.CharField(read_only=True)
+    word_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Entry
+        fields = ['id', 'title', 'excerpt', 'word_count', 'tags', 'image',
+                  'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class RelatedEntrySerializer(EntrySummarySerializer):
+    """Describe the entries returned by the related entries endpoint"""
+    score = serializers.FloatField(
+        read_only=True,
+        help_text='Summed weight of the tags it shares with the entry, or '
+                  'that often go with those of the entry',
+    )
+
+    class Meta(EntrySummarySerializer.Meta):
+        fields = [*EntrySummarySerializer.Meta.fields, 'score']
+        read_only_fields = fields
+
+
+class EntrySelectionSerializer(serializers.Serializer):
+    """Choose the entries of a bulk operation by id or by filter"""
+    ids = serializers.ListField(child=serializers.IntegerField(),
+                                required=False, allow_empty=False)
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False, allow_empty=False,
+        help_text='Entries tagged with any of these tags, ignoring case',
+    )
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def filter(self, queryset: Any) -> Any:
+        """Narrows a queryset of entries down to the selection"""
+        data = self.validated_data
+        if 'ids' in data:
+            queryset = queryset.filter(id__in=data['ids'])
+        if 'tags' in data:
+            queryset = queryset.filter(
+                id__in=Entry.tags.through.objects.filter(
+                    tag__in=tags_named(data['tags'])
+                ).values('entry_id')
+            )
+        if 'created_after' in data:
+            queryset = queryset.filter(created_at__gt=data['created_after'])
+        if 'created_before' in data:
+            queryset = queryset.filter(created_at__lt=data['created_before'])
+        return queryset
+
+
+class BulkRetagSerializer(EntrySelectionSerializer):
+    """Add & remove tags on many entries at once"""
+    add = serializers.ListField(child=serializers.CharField(max_length=255),
+                                required=False, default=list)
+    remove = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False, default=list,
+        help_text='Tags to remove, ignoring case',
+    )
+
+    def validate(self, attrs: Any) -> Any:
+        if not set(attrs) & {'ids', 'tags', 'created_after',
+                             'created_before'}:
+            raise serializers.ValidationError(
+                'Select entries by ids or by a filter.'
+            )
+        if not attrs['add'] and not attrs['remove']:
+            raise serializers.ValidationError(
+                'Give tags to add or to remove.'
+            )
+        return attrs
+
+
+class MergeTagsSerializer(EntrySelectionSerializer):
+    """Merge tags into one, or rename a tag, on the selected entries (all
+    entries when none are selected)"""
+    sources = serializers.ListField(
+        child=serializers.CharField(max_length=255), allow_empty=False,
+        help_text='Tags to merge into the target, ignoring case',
+    )
+    target = serializers.CharField(max_length=255)
+
+
+class BulkResultSerializer(serializers.Serializer):
+    """Describe the outcome of a bulk tag operation"""
+    entries = serializers.IntegerField(read_only=True)
+    added = serializers.IntegerField(read_only=True)
+    removed = serializers.IntegerField(read_only=True)
+
+
+class SyncSerializer(serializers.Serializer):
+    """Describe a page of the delta sync feed"""
+    entries = serializers.ListField(child=serializers.DictField(),
+                                    read_only=True)
+    deleted = serializers.ListField(child=serializers.IntegerField(),
+                                    read_only=True)
+    next = serializers.CharField(read_only=True)
+    has_more = serializers.BooleanField(read_only=True)
+
+
+class EntryRowSerializer:
+    """Read-only fast path for listing entries.
+
+    Works on `values()` rows of entries and fetches the tags of every row in
+    a single query, so neither model instances nor per-row field serializers
+    are created. The excerpt and word count of each entry are computed in
+    the DB and its full content is neither selected nor rendered unless
+    include_content is set. Only use it for reads; writes go through
+    EntrySerializer.
+    """
+    value_fields = ['id', 'title', 'image', 'created_at', 'updated_at']
+    excerpt_length = 200
+    datetime_field = serializers.DateTimeField(read_only=True)
+
+    def __init__(self, rows: Any, context: dict | None = None) -> None:
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def get_rows(cls, queryset: Any, include_content: bool = False) -> Any:
+        """Returns the `values()` rows of the entries to serialize"""
+        fields = list(cls.value_fields)
+        if include_content:
+            fields.append('content')
+        # Compressed content can only be cut in Python, so those rows carry
+        # the (compressed) content in place of the excerpt.
+        excerpt = Case(
+            When(content__startswith=MARKER, then=F('content')),
+            default=Substr('content', 1, cls.excerpt_length),
+            output_field=CompressedTextField(),
+        )
+        return queryset.annotate(
+            excerpt=excerpt,
+            word_count=WordCount('content'),
+        ).values(*fields, 'excerpt', 'word_count')
+
+    def get_tag_mapping(self, entry_ids: list) -> dict:
+        """Returns a mapping of entry id -> serialized tags"""
+        mapping = defaultdict(list)
+        links = Entry.tags.through.objects.filter(
+            entry_id__in=entry_ids
+        ).order_by('entry_id', 'tag_id') \
+            .values_list('entry_id', 'tag_id', 'tag__name')
+        for entry_id, tag_id, tag_name in links:
+            mapping[entry_id].append({'id': tag_id, 'name': tag_name})
+        return mapping
+
+    def image_url(self, name: str | None) -> str | None:
+        """Mirrors ImageField.to_representation for a stored file name"""
+        if not name:
+            return None
+        if not api_settings.UPLOADED_FILES_USE_URL:
+            return name
+        url = Entry._meta.get_field('image').storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, row: dict, tags: list) -> dict:
+        """Renders one row"""
+        to_datetime = self.datetime_field.to_representation
+        excerpt, word_count = row['excerpt'], row['word_count']
+        if isinstance(excerpt, Compressed):
+            text = excerpt.decompress()
+            excerpt = text[:self.excerpt_length]
+            word_count = len(text.split())
+
+        item = {'id': row['id'], 'title': row['title']}
+        if 'content' in row:
+            item['content'] = decompressed(row['content'])
+        item.update({
+            'excerpt': excerpt,
+            'word_count': word_count,
+            'tags': tags,
+            'image': self.image_url(row['image']),
+            'created_at': to_datetime(row['created_at']),
+            'updated_at': to_datetime(row['updated_at']),
+        })
+        return item
+
+    @property
+    def data(self) -> list:
+        rows = list(self.rows)
+        tag_mapping = self.get_tag_mapping([row['id'] for row in rows])
+        return [self.to_representation(row, tag_mapping.get(row['id'], []))
+                for row in rows]
+
+
+class CachedEntryRowSerializer(EntryRowSerializer):
+    """Lists entries from cached fragments.
+
+    Works on the `(id, updated_at)` rows of the entries to list. Each entry
+    is rendered as by EntryRowSerializer, keeping its stored image name, and
+    cached under its id and updated_at, so only entries missing from the
+    cache or changed since are read from the DB and rendered. Image URLs
+    depend on the request and are built when assembling the list.
+    """
+    # Part of the fragment keys; bump it whenever what an entry renders to
+    # changes, so a shared cache does not serve fragments of the old form
+    # after a deploy.
+    representation_version = 1
+
+    def __init__(self, versions: Any, queryset: Any,
+                 include_content: bool = False,
+                 context: dict | None = None) -> None:
+        super().__init__(versions, context)
+        self.queryset = queryset
+        self.include_content = include_content
+        kind = 'entry-content' if include_content else 'entry'
+        self.kind = f'{kind}.v{self.representation_version}'
+
+    @classmethod
+    def get_versions(cls, queryset: Any) -> Any:
+        """Returns the rows keying the fragments of the entries"""
+        return queryset.values('id', 'updated_at')
+
+    def render(self, entry_ids: list) -> list:
+        """Reads and renders entries, returning (id, version, fragment)"""
+        rows = self.get_rows(
+            self.queryset.filter(id__in=entry_ids).order_by(),
+            self.include_content,
+        )
+        tag_mapping = self.get_tag_mapping(entry_ids)
+        fragments = []
+        for row in rows:
+            fragment = self.to_representation(
+                row, tag_mapping.get(row['id'], [])
+            )
+            fragment['image'] = row['image']
+            fragments.append((row['id'], row['updated_at'], fragment))
+        return fragments
+
+    @property
+    def data(self) -> list:
+        versions = {row['id']: row['updated_at'] for row in self.rows}
+        fragments = get_fragments(self.kind, versions)
+        missing = [pk for pk in versions if pk not in fragments]
+        if missing:
+            rendered = self.render(missing)
+            set_fragments(self.kind, rendered)
+            fragments.update({pk: fragment for pk, _, fragment in rendered})
+        # Entries deleted since their versions were read are left out.
+        return [{**fragments[pk], 'image': self.image_url(
+                    fragments[pk]['image'])}
+                for pk in versions if pk in fragments]
@@ -0,0 +1,183 @@
+"""
+Tests to simulate bulk tag requests to the journal API.
+"""
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Entry,
+    Tag,
+)
+
+User = get_user_model()
+BULK_TAGS_URL = reverse('journal:journal-bulk-tags')
+MERGE_TAGS_URL = reverse('journal:journal-merge-tags')
+
+
+def create_user(**params) -> Any:
+    """Creates users for testing purposes."""
+    payload = {
+        'email': 'test@example.com',
+        'password': 'testing123#',
+        'username': 'test_user',
+    }
+    payload.update(params)
+    return User.objects.create_user(**payload)
+
+
+def create_entry(user: Any, tags: tuple = (), **params) -> Any:
+    """Creates tagged entries for testing purposes."""
+    payload = {
+        'title': 'Test title',
+        'content': 'Test content',
+    }
+    payload.update(params)
+    entry = Entry.objects.create(author=user, **payload)
+    for name in tags:
+        entry.tags.add(Tag.objects.get_or_create(name=name)[0])
+    return entry
+
+
+def tag_names(entry: Any) -> set:
+    """Returns the names of the tags of an entry."""
+    return set(entry.tags.values_list('name', flat=True))
+
+
+class BulkTagAPITests(TestCase):
+    """Tests for bulk tagging, merging and renaming of tags."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(user=self.user)
+        self.entries = [create_entry(self.user, tags=('work',))
+                        for _ in range(3)]
+        self.other = create_entry(create_user(email='other@example.com'),
+                                  tags=('work',))
+
+    def test_add_and_remove_tags_by_ids(self) -> None:
+        """Tests retagging entries chosen by id in a few statements."""
+        ids = [entry.id for entry in self.entries[:2]]
+        payload = {'ids': ids + [self.other.id],
+                   'add': ['travel', 'summer'], 'remove': ['work']}
+
+        # Six of them keep the locked selection in a temporary table and
+        # its tag co-occurrences counted.
+        with self.assertNumQueries(13):
+            res = self.client.post(BULK_TAGS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'entries': 2, 'added': 4, 'removed': 2})
+        for entry in self.entries[:2]:
+            self.assertEqual(tag_names(entry), {'travel', 'summer'})
+        self.assertEqual(tag_names(self.entries[2]), {'work'})
+        self.assertEqual(tag_names(self.other), {'work'})
+
+    def test_add_tags_by_filter(self) -> None:
+        """Tests retagging entries chosen by a filter."""
+        create_entry(self.user, tags=('home',))
+
+        res = self.client.post(BULK_TAGS_URL, {
+            'tags': ['work'], 'add': ['work', 'busy'],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['added'], 3)
+        self.assertEqual(Tag.objects.get(name='busy').entries.count(), 3)
+
+    def test_select_by_tag_ignores_case(self) -> None:
+        """Tests that entries are selected by tag names in any case."""
+        res = self.client.post(BULK_TAGS_URL, {
+            'tags': ['WORK'], 'add': ['busy'],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['added'], 3)
+
+    def test_remove_the_selecting_tag(self) -> None:
+        """Tests that entries selected by the tag being removed are
+        retagged and marked as updated."""
+        before = self.entries[0].updated_at
+
+        res = self.client.post(BULK_TAGS_URL, {
+            'tags': ['work'], 'add': ['office'], 'remove': ['work'],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'entries': 3, 'added': 3, 'removed': 3})
+        self.entries[0].refresh_from_db()
+        self.assertGreater(self.entries[0].updated_at, before)
+        self.assertEqual(tag_names(self.entries[0]), {'office'})
+
+    def test_remove_ignores_case(self) -> None:
+        """Tests that tags are removed by names in any case."""
+        create_entry(self.user, tags=('Work',), title='Capitalized')
+
+        res = self.client.post(BULK_TAGS_URL, {
+            'tags': ['work'], 'remove': ['WORK'],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['removed'], 4)
+        self.assertFalse(Entry.objects.filter(
+            author=self.user, tags__isnull=False,
+        ).exists())
+
+    def test_bulk_tags_requires_selection(self) -> None:
+        """Tests that entries must be selected explicitly."""
+        res = self.client.post(BULK_TAGS_URL, {'add': ['busy']},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.filter(name='busy').exists())
+
+    def test_merge_tags(self) -> None:
+        """Tests merging tags into one on the user's entries only."""
+        create_entry(self.user, tags=('job', 'work'))
+        create_entry(self.user, tags=('job',))
+
+        res = self.client.post(MERGE_TAGS_URL, {
+            'sources': ['work', 'job'], 'target': 'career',
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'entries': 5, 'added': 5, 'removed': 6})
+        career = Tag.objects.get(name='career')
+        self.assertEqual(career.entries.count(), 5)
+        self.assertFalse(Tag.objects.filter(name='job').exists())
+        self.assertEqual(tag_names(self.other), {'work'})
+
+    def test_merge_sources_ignore_case(self) -> None:
+        """Tests that source tags are matched in any case, and that
+        renaming a tag to another case keeps the target."""
+        capitalized = create_entry(self.user, tags=('Work',))
+
+        res = self.client.post(MERGE_TAGS_URL, {
+            'sources': ['work'], 'target': 'Work',
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['removed'], 3)
+        for entry in [*self.entries, capitalized]:
+            self.assertEqual(tag_names(entry), {'Work'})
+        self.assertEqual(tag_names(self.other), {'work'})
+
+    def test_rename_tag_bumps_updated_at(self) -> None:
+        """Tests renaming a tag marks the retagged entries as updated."""
+        before = self.entries[0].updated_at
+
+        res = self.client.post(MERGE_TAGS_URL, {
+            'sources': ['work'], 'target': 'office',
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.entries[0].refresh_from_db()
+        self.assertGreater(self.entries[0].updated_at, before)
+        self.assertEqual(tag_names(self.entries[0]), {'office'})
+        self.assertTrue(Tag.objects.filter(name='work').exists())
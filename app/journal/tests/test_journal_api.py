@@ -3,12 +3,16 @@ Tests to simulate requests made to the journal API.
 """
 import os
 import tempfile
+from unittest.mock import patch
 from typing import (
     Any,
 )
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import caches
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -18,9 +22,13 @@ from PIL import Image
 
 from core.models import (
     Entry,
+    EntryRevision,
+    Tag,
 )
 from journal.serializers import (
+    CachedEntryRowSerializer,
     EntrySerializer,
+    EntryRowSerializer,
 )
 
 User = get_user_model()
@@ -32,6 +40,16 @@ def detail_url(entry_id: int) -> str:
     return reverse('journal:journal-detail', args=[entry_id])
 
 
+def revisions_url(entry_id: int) -> str:
+    """Returns the URL listing the revisions of an entry"""
+    return reverse('journal:journal-revisions', args=[entry_id])
+
+
+def revision_url(entry_id: int, number: int) -> str:
+    """Returns the URL of one revision of an entry"""
+    return reverse('journal:journal-revision', args=[entry_id, number])
+
+
 def image_upload_url(entry_id: int) -> str:
     """Returns the URL for image uploads"""
     return reverse('journal:journal-upload-image', args=[entry_id])
@@ -48,6 +66,19 @@ def create_user(**params) -> Any:
     return User.objects.create_user(**payload)
 
 
+def summarize(entries: Any, with_content: bool = False) -> list:
+    """Returns EntrySerializer output the way the list endpoint renders it"""
+    summaries = []
+    for entry in entries:
+        summary = dict(entry)
+        content = summary['content'] if with_content \
+            else summary.pop('content')
+        summary['excerpt'] = content[:200]
+        summary['word_count'] = len(content.split())
+        summaries.append(summary)
+    return summaries
+
+
 def create_entry(user: Any, **params) -> Any:
     """Creates entries for testing purposes."""
     payload = {
@@ -79,16 +110,18 @@ class PrivateJournalAPITests(TestCase):
         self.assertIsNotNone(entry)
 
     def test_list_entries_successfully(self) -> None:
-        """Tests we can list all entries belonging to current user."""
+        """Tests we can list all entries belonging to current user, newest
+        first."""
         titles = ('Test #1', 'Test #2', 'Test #3')
         for title in titles:
             create_entry(user=self.user, title=title)
         res = self.client.get(JOURNAL_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        entries = Entry.objects.filter(author=self.user)
+        entries = Entry.objects.filter(author=self.user) \
+            .order_by('-created_at', '-id')
         serializer = EntrySerializer(entries, many=True)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data, summarize(serializer.data))
 
     def test_retrieve_entry_successfully(self) -> None:
         """Tests that we can retrieve an entry."""
@@ -111,6 +144,62 @@ class PrivateJournalAPITests(TestCase):
         entry.refresh_from_db()
         self.assertEqual(entry.title, payload.get('title'))
 
+    def test_update_writes_only_changed_columns(self) -> None:
+        """Tests that a PATCH only writes the columns it changes."""
+        entry = create_entry(user=self.user, title='Update me')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(entry.id), {'title': 'New'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        updates = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "core_entry"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"title"', updates[0])
+        self.assertNotIn('"content"', updates[0])
+
+    def test_update_without_changes_writes_nothing(self) -> None:
+        """Tests that an update changing nothing leaves the entry alone."""
+        entry = create_entry(user=self.user, title='Same')
+        entry.tags.add(Tag.objects.create(name='Kept'))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(entry.id), {
+                'title': 'Same', 'content': entry.content,
+                'tags': [{'name': 'Kept'}],
+            }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [query['sql'] for query in queries.captured_queries
+                  if query['sql'].startswith(('INSERT', 'UPDATE',
+                                              'DELETE'))]
+        self.assertEqual(writes, [])
+        self.assertEqual(Entry.objects.get(id=entry.id).updated_at,
+                         entry.updated_at)
+
+    def test_update_tags_only_touches_differing_links(self) -> None:
+        """Tests that kept tags keep their links and the entry is marked
+        as updated."""
+        entry = create_entry(user=self.user)
+        kept, dropped = Tag.objects.create(name='Kept'), \
+            Tag.objects.create(name='Dropped')
+        entry.tags.add(kept, dropped)
+        kept_link = Entry.tags.through.objects.get(entry=entry, tag=kept)
+
+        res = self.client.patch(detail_url(entry.id), {
+            'tags': [{'name': 'Kept'}, {'name': 'Added'}],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(entry.tags.values_list('name', flat=True)), {'Kept', 'Added'}
+        )
+        self.assertTrue(Entry.tags.through.objects.filter(
+            id=kept_link.id, tag=kept
+        ).exists())
+        self.assertGreater(Entry.objects.get(id=entry.id).updated_at,
+                           entry.updated_at)
+
     def test_delete_entry_successfully(self) -> None:
         """Tests that we can delete an entry."""
         entry = create_entry(user=self.user, title='Delete me')
@@ -176,6 +265,149 @@ class PrivateJournalAPITests(TestCase):
             self.assertEqual(tag['name'], p_tag['name'])
 
 
+class EntryRowSerializerTests(TestCase):
+    """Tests for the read-only list fast path"""
+
+    def setUp(self) -> None:
+        self.user = create_user()
+        self.request = RequestFactory().get(JOURNAL_URL)
+        first, second = Tag.objects.create(name='Picnic'), \
+            Tag.objects.create(name='Sunday')
+        tagged = create_entry(user=self.user, title='Tagged')
+        tagged.tags.add(first, second)
+        create_entry(user=self.user, title='With image',
+                     image='entries/1/images/photo.jpg')
+        create_entry(user=self.user, title='Plain')
+
+    def test_output_matches_entry_serializer(self) -> None:
+        """Tests that the fast path renders like EntrySerializer"""
+        entries = Entry.objects.filter(author=self.user).order_by('id')
+        context = {'request': self.request}
+        expected = EntrySerializer(entries, many=True, context=context).data
+        rows = EntryRowSerializer.get_rows(entries, include_content=True)
+
+        self.assertEqual(EntryRowSerializer(rows, context=context).data,
+                         summarize(expected, with_content=True))
+
+    def test_output_matches_without_request(self) -> None:
+        """Tests that image URLs stay relative when there is no request"""
+        entries = Entry.objects.filter(author=self.user).order_by('id')
+        rows = EntryRowSerializer.get_rows(entries)
+
+        self.assertEqual(EntryRowSerializer(rows).data,
+                         summarize(EntrySerializer(entries, many=True).data))
+
+    def test_list_queries(self) -> None:
+        """Tests that listing costs one query for the versions of entries,
+        and one for uncached entries and one for their tags"""
+        caches['fragments'].clear()
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(3):
+            res = client.get(JOURNAL_URL)
+        with self.assertNumQueries(1):
+            cached = client.get(JOURNAL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(cached.data, res.data)
+
+    def test_list_defers_content(self) -> None:
+        """Tests that content is only selected when asked for"""
+        create_entry(user=self.user, title='Long',
+                     content='word ' * 100 + 'tail')
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(JOURNAL_URL)
+
+        for query in queries.captured_queries:
+            columns = query['sql'].split(' CASE ')[0]
+            self.assertNotIn('"core_entry"."content"', columns)
+        long_entry = res.data[0]
+        self.assertNotIn('content', long_entry)
+        self.assertEqual(len(long_entry['excerpt']), 200)
+        self.assertEqual(long_entry['word_count'], 101)
+
+        res = client.get(JOURNAL_URL, {'include': 'content'})
+        self.assertTrue(res.data[0]['content'].endswith('tail'))
+
+    @override_settings(CONTENT_COMPRESSION_ENABLED=True,
+                       CONTENT_COMPRESSION_MIN_SIZE=100)
+    def test_output_matches_with_compressed_content(self) -> None:
+        """Tests that compressed content is listed as plain text"""
+        create_entry(user=self.user, title='Long', content='Long text. ' * 50)
+        entries = Entry.objects.filter(author=self.user).order_by('id')
+        rows = EntryRowSerializer.get_rows(entries, include_content=True)
+
+        self.assertEqual(
+            EntryRowSerializer(rows).data,
+            summarize(EntrySerializer(entries, many=True).data,
+                      with_content=True),
+        )
+
+
+class FragmentCacheTests(TestCase):
+    """Tests for listing entries from cached fragments"""
+
+    def setUp(self) -> None:
+        caches['fragments'].clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.first = create_entry(user=self.user, title='First')
+        self.second = create_entry(user=self.user, title='Second',
+                                   image='entries/2/images/photo.jpg')
+        self.client.get(JOURNAL_URL)
+
+    def test_changed_entries_are_rendered_again(self) -> None:
+        """Tests that only an entry updated since it was cached is read"""
+        self.client.patch(detail_url(self.first.id), {'title': 'Changed'})
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(JOURNAL_URL)
+
+        self.assertEqual([entry['title'] for entry in res.data],
+                         ['Second', 'Changed'])
+        self.assertIn(f'IN ({self.first.id})',
+                      queries.captured_queries[-1]['sql'])
+
+    def test_tag_changes_invalidate_entries(self) -> None:
+        """Tests that bulk tagging shows up in the cached list"""
+        self.client.post(reverse('journal:journal-bulk-tags'), {
+            'ids': [self.second.id], 'add': ['Picnic'],
+        }, format='json')
+
+        res = self.client.get(JOURNAL_URL)
+
+        self.assertEqual([tag['name'] for tag in res.data[0]['tags']],
+                         ['Picnic'])
+        self.assertEqual(res.data[1]['tags'], [])
+
+    def test_new_representation_misses_old_fragments(self) -> None:
+        """Tests that fragments of another representation are not served"""
+        with patch.object(CachedEntryRowSerializer,
+                          'representation_version', 2):
+            # Both entries are read and rendered again, as on a cold cache.
+            with self.assertNumQueries(3):
+                res = self.client.get(JOURNAL_URL)
+
+        self.assertEqual(len(res.data), 2)
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'other.example.com'])
+    def test_image_urls_follow_the_request(self) -> None:
+        """Tests that cached entries get image URLs of the current host"""
+        res = self.client.get(JOURNAL_URL, HTTP_HOST='other.example.com')
+
+        self.assertEqual(
+            res.data[0]['image'],
+            'http://other.example.com/api/journal/media/'
+            'entries/2/images/photo.jpg',
+        )
+
+
 class ImageUploadTests(TestCase):
     """Tests Image upload API endpoint"""
 
@@ -211,3 +443,112 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, data=payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(REVISION_SNAPSHOT_INTERVAL=3)
+class EntryRevisionTests(TestCase):
+    """Tests for the revision history of entries."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(user=self.user)
+        self.paragraphs = [f'Paragraph {index} of a long entry.\n' * 5
+                           for index in range(40)]
+        self.entry = create_entry(self.user, title='Version 1',
+                                  content=''.join(self.paragraphs))
+
+    def edit(self, version: int) -> str:
+        """Rewrites one paragraph of the entry and returns the content."""
+        self.paragraphs[version % 40] = f'Rewritten in version {version}.\n'
+        content = ''.join(self.paragraphs)
+        res = self.client.patch(detail_url(self.entry.id), {
+            'title': f'Version {version}',
+            'content': content,
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data['content']
+
+    def test_unedited_entries_have_no_history(self):
+        """Tests that history starts with the first edit."""
+        self.client.patch(detail_url(self.entry.id), {'title': 'Version 1'})
+
+        self.assertFalse(EntryRevision.objects.exists())
+
+    def test_rebuild_every_version(self):
+        """Tests that every version can be rebuilt from the history."""
+        versions = {1: self.entry.content}
+        for version in range(2, 9):
+            versions[version] = self.edit(version)
+
+        res = self.client.get(revisions_url(self.entry.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['number'] for item in res.data],
+                         list(range(8, 0, -1)))
+        snapshots = [item['number'] for item in res.data
+                     if item['is_snapshot']]
+        self.assertEqual(sorted(snapshots), [1, 4, 7])
+
+        for version, content in versions.items():
+            res = self.client.get(revision_url(self.entry.id, version))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['title'], f'Version {version}')
+            self.assertEqual(res.data['content'], content)
+
+    def test_history_is_compact(self):
+        """Tests that the history is a fraction of the content it keeps."""
+        kept = len(self.entry.content.encode())
+        for version in range(2, 9):
+            kept += len(self.edit(version).encode())
+
+        stored = sum(len(revision.data)
+                     for revision in EntryRevision.objects.all())
+        self.assertLess(stored, kept / 10)
+
+    def test_word_edit_of_a_paragraph_is_compact(self):
+        """Tests that changing one word of a long single-line entry stores
+        a delta of a few bytes."""
+        words = [f'word{index}' for index in range(2000)]
+        self.entry.content = ' '.join(words)
+        self.entry.save()
+        words[1000] = 'changed'
+        content = ' '.join(words)
+
+        res = self.client.patch(detail_url(self.entry.id),
+                                {'content': content})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        revision = EntryRevision.objects.get(entry=self.entry, number=2)
+        self.assertFalse(revision.is_snapshot)
+        self.assertLess(len(revision.data), 64)
+        res = self.client.get(revision_url(self.entry.id, 2))
+        self.assertEqual(res.data['content'], content)
+
+    def test_unknown_revision_returns_404(self):
+        """Tests that missing revisions and other users' entries 404."""
+        self.edit(2)
+        other = create_entry(create_user(email='other@example.com'))
+
+        res = self.client.get(revision_url(self.entry.id, 5))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(revisions_url(other.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_changes_outside_the_api_are_kept(self):
+        """Tests that a version saved without a revision is recorded before
+        the next edit, so the history still rebuilds every version."""
+        self.edit(2)
+        Entry.objects.filter(id=self.entry.id).update(
+            title='Outside', content='Changed outside the API.\n',
+        )
+        content = self.edit(3)
+
+        res = self.client.get(revisions_url(self.entry.id))
+        self.assertEqual([item['title'] for item in res.data],
+                         ['Version 3', 'Outside', 'Version 2', 'Version 1'])
+        res = self.client.get(revision_url(self.entry.id, 3))
+        self.assertEqual(res.data['content'], 'Changed outside the API.\n')
+        res = self.client.get(revision_url(self.entry.id, 4))
+        self.assertEqual(res.data['content'], content)
+        self.assertEqual(Entry.objects.get(id=self.entry.id).content,
+                         content)
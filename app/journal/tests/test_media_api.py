@@ -0,0 +1,243 @@
+"""
+Tests to simulate requests for entry images.
+"""
+import io
+import shutil
+import tempfile
+from typing import Any
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from commons.tests.s3 import S3StandIn
+from core.models import Entry
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+IMAGE = bytes(range(256)) * 4
+
+
+def jpeg_bytes() -> bytes:
+    """Returns a small JPEG image."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def create_user(**params) -> Any:
+    """Creates users for testing purposes."""
+    payload = {
+        'email': 'test@example.com',
+        'password': 'testing123#',
+        'username': 'test_user',
+    }
+    payload.update(params)
+    return User.objects.create_user(**payload)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_OFFLOAD='')
+class EntryMediaAPITests(TestCase):
+    """Tests for the authorized media endpoint."""
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(user=self.user)
+        self.entry = Entry.objects.create(author=self.user, title='Photo',
+                                          content='Test content')
+        self.entry.image.save('photo.jpg', ContentFile(IMAGE))
+        self.url = reverse('journal:media', args=[self.entry.image.name])
+
+    def test_image_url_points_to_endpoint(self) -> None:
+        """Tests that entries link their image through the endpoint."""
+        res = self.client.get(reverse('journal:journal-detail',
+                                      args=[self.entry.id]))
+
+        self.assertTrue(res.data['image'].endswith(self.url))
+
+    def test_author_gets_image(self) -> None:
+        """Tests that the author receives the whole file, cacheable."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), IMAGE)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(IMAGE)))
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('private', res['Cache-Control'])
+
+    def test_other_users_get_not_found(self) -> None:
+        """Tests that images of other users' entries are not served."""
+        self.client.force_authenticate(
+            user=create_user(email='other@example.com')
+        )
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_authentication_required(self) -> None:
+        """Tests that anonymous requests are rejected."""
+        res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_range_request(self) -> None:
+        """Tests that a byte range is answered with partial content."""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), IMAGE[10:20])
+        self.assertEqual(res['Content-Range'], f'bytes 10-19/{len(IMAGE)}')
+
+        res = self.client.get(self.url, HTTP_RANGE='bytes=-16')
+        self.assertEqual(b''.join(res.streaming_content), IMAGE[-16:])
+
+    def test_unsatisfiable_range(self) -> None:
+        """Tests that ranges past the end of the file are rejected."""
+        res = self.client.get(self.url, HTTP_RANGE=f'bytes={len(IMAGE)}-')
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+        self.assertEqual(res['Content-Range'], f'bytes */{len(IMAGE)}')
+
+    def test_not_modified(self) -> None:
+        """Tests that revalidating with the ETag sends no body."""
+        etag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(MEDIA_OFFLOAD='x-accel-redirect',
+                       MEDIA_OFFLOAD_PREFIX='/protected-media/')
+    def test_offload_to_proxy(self) -> None:
+        """Tests that the transfer is handed to the proxy when enabled."""
+        res = self.client.get(self.url, HTTP_ACCEPT='image/*')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['X-Accel-Redirect'],
+                         f'/protected-media/{self.entry.image.name}')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+
+    def test_remote_storage_redirects(self) -> None:
+        """Tests that files in a bucket are fetched from it directly."""
+        with S3StandIn() as s3, override_settings(**s3.settings()):
+            res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+        self.assertTrue(res['Location'].startswith(
+            f'{s3.endpoint_url}/media/{self.entry.image.name}?'
+        ))
+        self.assertIn('X-Amz-Signature=', res['Location'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DirectUploadAPITests(TestCase):
+    """Tests for uploading images straight to storage."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(user=self.user)
+        self.entry = Entry.objects.create(author=self.user, title='Photo',
+                                          content='Test content')
+        self.image = jpeg_bytes()
+
+    def request_upload(self, entry_id: int, **params: Any) -> Any:
+        """Asks for an upload URL for a JPEG image."""
+        payload = {'content_type': 'image/jpeg', 'size': len(self.image)}
+        payload.update(params)
+        return self.client.post(reverse('journal:journal-request-image-upload',
+                                        args=[entry_id]), payload)
+
+    def confirm(self, entry_id: int, key: str) -> Any:
+        """Confirms an uploaded key."""
+        return self.client.post(reverse('journal:journal-confirm-image-upload',
+                                        args=[entry_id]), {'key': key})
+
+    def test_upload_and_confirm(self) -> None:
+        """Tests attaching an image uploaded to the issued URL."""
+        res = self.request_upload(self.entry.id)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        upload = res.data
+        self.assertEqual(upload['method'], 'PUT')
+        self.assertTrue(upload['key'].startswith(
+            f'entries/{self.entry.id}/images/'
+        ))
+
+        put = self.client.put(upload['url'], self.image,
+                              content_type=upload['headers']['Content-Type'])
+        self.assertEqual(put.status_code, status.HTTP_204_NO_CONTENT)
+        res = self.confirm(self.entry.id, upload['key'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.image.name, upload['key'])
+        self.assertTrue(res.data['image'].endswith(
+            reverse('journal:media', args=[upload['key']])
+        ))
+
+    def test_confirm_rejects_non_image(self) -> None:
+        """Tests that uploaded bytes which are not an image are rejected
+        and removed."""
+        self.image = b'<script>alert(1)</script>'.ljust(len(IMAGE))
+        upload = self.request_upload(self.entry.id).data
+        put = self.client.put(upload['url'], self.image,
+                              content_type=upload['headers']['Content-Type'])
+        self.assertEqual(put.status_code, status.HTTP_204_NO_CONTENT)
+
+        res = self.confirm(self.entry.id, upload['key'])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.entry.refresh_from_db()
+        self.assertFalse(self.entry.image)
+        self.assertFalse(Entry._meta.get_field('image').storage.exists(
+            upload['key']
+        ))
+
+    def test_confirm_requires_upload(self) -> None:
+        """Tests that keys nothing was uploaded to are rejected."""
+        key = self.request_upload(self.entry.id).data['key']
+
+        res = self.confirm(self.entry.id, key)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_confirm_key_of_other_entry(self) -> None:
+        """Tests that keys issued for other entries are rejected."""
+        other = Entry.objects.create(author=self.user, title='Other',
+                                     content='Test content')
+        key = self.request_upload(other.id).data['key']
+
+        res = self.confirm(self.entry.id, key)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_request_validates_image(self) -> None:
+        """Tests that only images of a bounded size can be uploaded."""
+        self.assertEqual(
+            self.request_upload(self.entry.id,
+                                content_type='text/html').status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(
+            self.request_upload(self.entry.id, size=10 ** 12).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
@@ -0,0 +1,198 @@
+"""
+Tests to simulate related entries requests to the journal API.
+"""
+from collections import Counter
+from typing import Any
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Entry,
+    Tag,
+    TagCooccurrence,
+)
+from core.related import update_cooccurrences
+
+User = get_user_model()
+JOURNAL_URL = reverse('journal:journal-list')
+
+
+def related_url(entry_id: int) -> str:
+    """Returns the URL of the entries related to an entry"""
+    return reverse('journal:journal-related', args=[entry_id])
+
+
+def detail_url(entry_id: int) -> str:
+    """Returns the detailed URL"""
+    return reverse('journal:journal-detail', args=[entry_id])
+
+
+def create_user(**params) -> Any:
+    """Creates users for testing purposes."""
+    payload = {
+        'email': 'test@example.com',
+        'password': 'testing123#',
+        'username': 'test_user',
+    }
+    payload.update(params)
+    return User.objects.create_user(**payload)
+
+
+def create_entry(user: Any, tags: tuple = (), **params) -> Any:
+    """Creates tagged entries, counting their tag pairs."""
+    payload = {
+        'title': 'Test title',
+        'content': 'Test content',
+    }
+    payload.update(params)
+    entry = Entry.objects.create(author=user, **payload)
+    for name in tags:
+        entry.tags.add(Tag.objects.get_or_create(name=name)[0])
+    update_cooccurrences([entry.id])
+    return entry
+
+
+def recount(user: Any) -> dict:
+    """Counts the tag pairs of a user's entries from scratch."""
+    counts: Counter = Counter()
+    for entry in Entry.objects.filter(author=user):
+        tag_ids = list(entry.tags.values_list('id', flat=True))
+        counts.update((tag, other) for tag in tag_ids for other in tag_ids)
+    return dict(counts)
+
+
+def stored(user: Any) -> dict:
+    """Returns the tag pairs counted for a user."""
+    return {
+        (tag, other): entries for tag, other, entries in
+        TagCooccurrence.objects.filter(author=user)
+        .values_list('tag_id', 'other_id', 'entries')
+    }
+
+
+class RelatedEntriesAPITests(TestCase):
+    """Tests for listing the entries related to an entry."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(user=self.user)
+
+    def related(self, entry: Any, **params: Any) -> list:
+        """Returns the titles of the entries related to an entry"""
+        res = self.client.get(related_url(entry.id), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in res.data]
+
+    def test_ranked_by_shared_tags(self) -> None:
+        """Tests that entries sharing more tags come first."""
+        entry = create_entry(self.user, ('hiking', 'alps'), title='Entry')
+        create_entry(self.user, ('hiking',), title='One')
+        create_entry(self.user, ('hiking', 'alps'), title='Both')
+        create_entry(self.user, ('cooking',), title='None')
+
+        self.assertEqual(self.related(entry), ['Both', 'One'])
+
+    def test_rare_tags_weigh_more(self) -> None:
+        """Tests that sharing a rare tag beats sharing a common one."""
+        entry = create_entry(self.user, ('work', 'tax'), title='Entry')
+        create_entry(self.user, ('tax',), title='Rare')
+        create_entry(self.user, ('work',), title='Common')
+        for _ in range(5):
+            create_entry(self.user, ('work', 'meeting'), title='Work')
+
+        titles = self.related(entry)
+
+        self.assertEqual(titles[0], 'Rare')
+        self.assertEqual(set(titles[1:]), {'Common', 'Work'})
+
+    def test_cooccurring_tags_count(self) -> None:
+        """Tests that entries with tags going with the entry's tags come
+        after entries sharing them."""
+        entry = create_entry(self.user, ('hiking',), title='Entry')
+        create_entry(self.user, ('hiking', 'alps'), title='Shared')
+        create_entry(self.user, ('alps',), title='Related')
+        create_entry(self.user, ('cooking',), title='Unrelated')
+
+        res = self.client.get(related_url(entry.id))
+
+        self.assertEqual([item['title'] for item in res.data],
+                         ['Shared', 'Related'])
+        self.assertGreater(res.data[0]['score'], res.data[1]['score'])
+
+    def test_only_own_entries(self) -> None:
+        """Tests that other users' entries are neither listed nor ranked."""
+        other = create_user(email='other@example.com')
+        entry = create_entry(self.user, ('hiking',), title='Entry')
+        foreign = create_entry(other, ('hiking',), title='Foreign')
+
+        self.assertEqual(self.related(entry), [])
+        res = self.client.get(related_url(foreign.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_counts_follow_tag_changes(self) -> None:
+        """Tests that the tag pairs stay counted through every change."""
+        res = self.client.post(JOURNAL_URL, {
+            'content': 'Day one', 'tags': [{'name': 'a'}, {'name': 'b'}],
+        }, format='json')
+        first = res.data['id']
+        self.client.post(JOURNAL_URL, {
+            'content': 'Day two', 'tags': [{'name': 'b'}, {'name': 'c'}],
+        }, format='json')
+        self.assertEqual(stored(self.user), recount(self.user))
+
+        self.client.patch(detail_url(first), {
+            'tags': [{'name': 'c'}, {'name': 'd'}],
+        }, format='json')
+        self.assertEqual(stored(self.user), recount(self.user))
+
+        self.client.post(reverse('journal:journal-bulk-tags'), {
+            'tags': ['c'], 'add': ['e'], 'remove': ['c'],
+        }, format='json')
+        self.assertEqual(stored(self.user), recount(self.user))
+
+        self.client.post(reverse('journal:journal-merge-tags'), {
+            'sources': ['b', 'd'], 'target': 'e',
+        }, format='json')
+        self.assertEqual(stored(self.user), recount(self.user))
+
+        self.client.delete(detail_url(first))
+        self.assertEqual(stored(self.user), recount(self.user))
+        self.assertNotIn(0, stored(self.user).values())
+
+    def test_limit(self) -> None:
+        """Tests that no more entries than asked for are listed."""
+        entry = create_entry(self.user, ('hiking',))
+        for _ in range(3):
+            create_entry(self.user, ('hiking',))
+
+        self.assertEqual(len(self.related(entry, limit=2)), 2)
+
+    @patch('core.related.RELATED_CANDIDATES', 2)
+    def test_newest_candidates_per_tag(self) -> None:
+        """Tests that only the newest entries linked to each tag are
+        ranked."""
+        entry = create_entry(self.user, ('hiking', 'alps'), title='Entry')
+        create_entry(self.user, ('hiking', 'alps'), title='Old')
+        create_entry(self.user, ('hiking',), title='Hike 1')
+        create_entry(self.user, ('hiking',), title='Hike 2')
+        create_entry(self.user, ('alps',), title='Alps')
+
+        titles = self.related(entry)
+
+        self.assertEqual(set(titles), {'Hike 1', 'Hike 2', 'Alps', 'Old'})
+        create_entry(self.user, ('alps',), title='Alps 2')
+        self.assertNotIn('Old', self.related(entry))
+
+    def test_untagged_entry(self) -> None:
+        """Tests that an entry without tags has no related entries."""
+        entry = create_entry(self.user, title='Entry')
+        create_entry(self.user, ('hiking',))
+
+        self.assertEqual(self.related(entry), [])
@@ -0,0 +1,122 @@
+"""
+Tests to simulate delta sync requests to the journal API.
+"""
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Entry
+
+User = get_user_model()
+CHANGES_URL = reverse('journal:journal-changes')
+
+
+def detail_url(entry_id: int) -> str:
+    """Returns the detailed URL"""
+    return reverse('journal:journal-detail', args=[entry_id])
+
+
+def create_user(**params) -> Any:
+    """Creates users for testing purposes."""
+    payload = {
+        'email': 'test@example.com',
+        'password': 'testing123#',
+        'username': 'test_user',
+    }
+    payload.update(params)
+    return User.objects.create_user(**payload)
+
+
+def create_entry(user: Any, **params) -> Any:
+    """Creates entries for testing purposes."""
+    payload = {
+        'title': 'Test title',
+        'content': 'Test content',
+    }
+    payload.update(params)
+    return Entry.objects.create(author=user, **payload)
+
+
+@override_settings(SYNC_COMMIT_WINDOW=0)
+class SyncAPITests(TestCase):
+    """Tests for the changes-since feed."""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(user=self.user)
+        self.entries = [create_entry(self.user, title=f'Entry {index}')
+                        for index in range(5)]
+        create_entry(create_user(email='other@example.com'))
+
+    def sync(self, since: str | None = None, **params: Any) -> Any:
+        """Requests the changes since a token."""
+        if since is not None:
+            params['since'] = since
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_full_sync_then_nothing_changed(self) -> None:
+        """Tests that a resync without changes transfers no rows."""
+        first = self.sync()
+
+        self.assertEqual([entry['id'] for entry in first['entries']],
+                         [entry.id for entry in self.entries])
+        self.assertIn('content', first['entries'][0])
+        self.assertFalse(first['has_more'])
+
+        with self.assertNumQueries(2):
+            second = self.sync(first['next'])
+        self.assertEqual(second['entries'], [])
+        self.assertEqual(second['deleted'], [])
+
+    def test_only_changes_are_returned(self) -> None:
+        """Tests that updates and deletions since the token are returned."""
+        token = self.sync()['next']
+        self.client.patch(detail_url(self.entries[1].id), {'title': 'New'})
+        self.client.delete(detail_url(self.entries[3].id))
+        created = create_entry(self.user, title='Created')
+
+        changes = self.sync(token)
+
+        self.assertEqual([entry['id'] for entry in changes['entries']],
+                         [self.entries[1].id, created.id])
+        self.assertEqual(changes['entries'][0]['title'], 'New')
+        self.assertEqual(changes['deleted'], [self.entries[3].id])
+        self.assertEqual(self.sync(changes['next'])['deleted'], [])
+
+    def test_paging_delivers_every_row_once(self) -> None:
+        """Tests that paging walks rows sharing one updated_at."""
+        Entry.objects.filter(author=self.user).update(
+            updated_at=self.entries[0].updated_at
+        )
+        seen: list = []
+        token = None
+        while True:
+            page = self.sync(token, limit=2)
+            seen.extend(entry['id'] for entry in page['entries'])
+            token = page['next']
+            if not page['has_more']:
+                break
+
+        self.assertEqual(seen, [entry.id for entry in self.entries])
+
+    @override_settings(SYNC_COMMIT_WINDOW=60)
+    def test_recent_changes_are_sent_again(self) -> None:
+        """Tests that the cursor waits for the commit window to pass."""
+        first = self.sync()
+        second = self.sync(first['next'])
+
+        self.assertEqual(len(second['entries']), len(self.entries))
+
+    def test_invalid_token(self) -> None:
+        """Tests that tampered tokens are rejected."""
+        res = self.client.get(CHANGES_URL, {'since': 'forged'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -14,4 +14,5 @@ router.register('journal', views.ManageJournalViewSet, basename='journal')
 urlpatterns = [
   path('', include(router.urls)),
   path('tags/', views.TagListView.as_view(), name='tags'),
+  path('media/<path:name>', views.EntryMediaView.as_view(), name='media'),
 ]
@@ -1,25 +1,60 @@
 """
 Definition of API endpoints for the journal API
 """
+import mimetypes
 from typing import Any
 
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+
 from rest_framework import (
     viewsets,
     generics,
     status
 )
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from commons.media import MediaContentNegotiation, serve_file
+from commons.throttling import JournalUserThrottle
+from user.authentication import SignedTokenAuthentication
 from core.models import (
     Entry,
+    EntryTombstone,
     Tag,
+    upload_file_location,
 )
+from core.related import (
+    lock_entries,
+    related_entries,
+    update_cooccurrences,
+)
+from core.revisions import rebuild_revision
+from core.sync import InvalidSyncToken, changes_since
+from core.tagging import merge_tags, retag
 from journal.serializers import (
+    BulkResultSerializer,
+    BulkRetagSerializer,
+    CachedEntryRowSerializer,
     EntrySerializer,
     EntryImageSerializer,
+    EntryRevisionContentSerializer,
+    EntryRevisionSerializer,
+    EntryRowSerializer,
+    EntrySummarySerializer,
+    ImageConfirmSerializer,
+    ImageUploadRequestSerializer,
+    ImageUploadSerializer,
+    MergeTagsSerializer,
+    RelatedEntrySerializer,
+    SyncSerializer,
     TagSerializer,
 )
 
@@ -28,24 +63,100 @@ class ManageJournalViewSet(viewsets.ModelViewSet):
     """Creates, reads, update & delete journal entries"""
     serializer_class = EntrySerializer
     queryset = Entry.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [JournalUserThrottle]
 
     def get_queryset(self) -> Any:
-        return self.queryset.filter(author=self.request.user) or []
+        return self.queryset.filter(author=self.request.user) \
+            .order_by('-created_at', '-id')
 
     def get_serializer_class(self) -> Any:
         serializer_class = self.serializer_class
 
-        if self.action == 'upload_image':
+        if self.action == 'list':
+            serializer_class = EntrySummarySerializer
+        elif self.action == 'upload_image':
             serializer_class = EntryImageSerializer
+        elif self.action == 'request_image_upload':
+            serializer_class = ImageUploadRequestSerializer
+        elif self.action == 'confirm_image_upload':
+            serializer_class = ImageConfirmSerializer
+        elif self.action == 'revisions':
+            serializer_class = EntryRevisionSerializer
+        elif self.action == 'revision':
+            serializer_class = EntryRevisionContentSerializer
+        elif self.action == 'related':
+            serializer_class = RelatedEntrySerializer
+        elif self.action == 'bulk_tags':
+            serializer_class = BulkRetagSerializer
+        elif self.action == 'merge_tags':
+            serializer_class = MergeTagsSerializer
 
         return serializer_class
 
+    def list(self, request, *args, **kwargs):
+        """Lists entries from cached fragments, rendering only the entries
+        changed since they were cached. Their full content is only included
+        when asked for with `?include=content`."""
+        queryset = self.filter_queryset(self.get_queryset())
+        include = request.query_params.get('include', '').split(',')
+        versions = CachedEntryRowSerializer.get_versions(queryset)
+        page = self.paginate_queryset(versions)
+        serializer = CachedEntryRowSerializer(
+            page if page is not None else versions, queryset,
+            include_content='content' in include,
+            context=self.get_serializer_context(),
+        )
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
     def perform_create(self, serializer) -> Any | None:
         serializer.save(author=self.request.user)
         return None
 
+    def perform_destroy(self, instance) -> None:
+        with transaction.atomic():
+            EntryTombstone.objects.create(author_id=instance.author_id,
+                                          entry_id=instance.id)
+            lock_entries([instance.id])
+            update_cooccurrences([instance.id], -1)
+            instance.delete()
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('since', str, description='Sync token returned '
+                             'by the previous sync; omit for a full sync'),
+            OpenApiParameter('limit', int),
+        ],
+        responses=SyncSerializer,
+    )
+    @action(methods=['GET'], detail=False)
+    def changes(self, request):
+        """Returns the entries changed and deleted since a sync token"""
+        try:
+            limit = min(int(request.query_params.get(
+                'limit', settings.SYNC_PAGE_SIZE
+            )), settings.SYNC_MAX_PAGE_SIZE)
+        except ValueError:
+            limit = settings.SYNC_PAGE_SIZE
+        try:
+            changes = changes_since(
+                request.user, request.query_params.get('since'),
+                max(limit, 1),
+                EntryRowSerializer.get_rows(Entry.objects.all(),
+                                            include_content=True),
+            )
+        except InvalidSyncToken as error:
+            raise ValidationError({'since': str(error)})
+
+        changes['entries'] = EntryRowSerializer(
+            changes['entries'], context=self.get_serializer_context()
+        ).data
+        return Response(changes)
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         entry = self.get_object()
@@ -56,8 +167,140 @@ class ManageJournalViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(responses={201: ImageUploadSerializer})
+    @action(methods=['POST'], detail=True, url_path='image-upload')
+    def request_image_upload(self, request, pk=None):
+        """Issues a URL to upload an image straight to storage. Confirm the
+        key once the upload is done."""
+        entry = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        content_type = serializer.validated_data['content_type']
+        key = upload_file_location(
+            entry, 'image' + (mimetypes.guess_extension(content_type) or '')
+        )
+        expires = settings.DIRECT_UPLOAD_EXPIRES
+        upload = Entry._meta.get_field('image').storage.presign_upload(
+            key, content_type, serializer.validated_data['size'], expires
+        )
+        upload['url'] = request.build_absolute_uri(upload['url'])
+        return Response(
+            ImageUploadSerializer({'key': key, 'expires_in': expires,
+                                   **upload}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    @extend_schema(responses=EntryImageSerializer)
+    @action(methods=['POST'], detail=True, url_path='confirm-image')
+    def confirm_image_upload(self, request, pk=None):
+        """Attaches an image uploaded straight to storage to the entry"""
+        entry = self.get_object()
+        serializer = self.get_serializer(entry, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(EntryImageSerializer(
+            entry, context=self.get_serializer_context()
+        ).data)
+
+    @action(methods=['GET'], detail=True)
+    def revisions(self, request, pk=None):
+        """Lists the revisions of an entry, newest first"""
+        entry = self.get_object()
+        revisions = entry.revisions.order_by('-number').defer('data')
+        page = self.paginate_queryset(revisions)
+        serializer = self.get_serializer(
+            page if page is not None else revisions, many=True
+        )
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    @extend_schema(operation_id='journal_journal_revision_retrieve')
+    @action(methods=['GET'], detail=True,
+            url_path=r'revisions/(?P<number>\d+)')
+    def revision(self, request, pk=None, number=None):
+        """Returns the title and content of one revision of an entry"""
+        entry = self.get_object()
+        rebuilt = rebuild_revision(entry, int(number))
+        if rebuilt is None:
+            raise Http404
+        return Response(self.get_serializer(rebuilt).data)
+
+    @extend_schema(
+        parameters=[OpenApiParameter('limit', int)],
+        responses=RelatedEntrySerializer(many=True),
+    )
+    @action(methods=['GET'], detail=True)
+    def related(self, request, pk=None):
+        """Lists the author's other entries most related to this one by
+        the tags they share, best first"""
+        entry = self.get_object()
+        try:
+            limit = min(int(request.query_params.get(
+                'limit', settings.RELATED_ENTRIES_LIMIT
+            )), settings.RELATED_ENTRIES_MAX_LIMIT)
+        except ValueError:
+            limit = settings.RELATED_ENTRIES_LIMIT
+        scores = dict(related_entries(entry, max(limit, 1)))
+        rank = {entry_id: index for index, entry_id in enumerate(scores)}
+
+        queryset = self.get_queryset()
+        versions = sorted(
+            CachedEntryRowSerializer.get_versions(
+                queryset.filter(id__in=scores)
+            ),
+            key=lambda row: rank[row['id']],
+        )
+        data = CachedEntryRowSerializer(
+            versions, queryset, context=self.get_serializer_context(),
+        ).data
+        return Response([{**item, 'score': scores[item['id']]}
+                         for item in data])
+
+    @extend_schema(responses=BulkResultSerializer)
+    @action(methods=['POST'], detail=False, url_path='bulk-tags')
+    def bulk_tags(self, request):
+        """Adds and removes tags on every selected entry"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entries = serializer.filter(self.get_queryset())
+        result = retag(entries, add=serializer.validated_data['add'],
+                       remove=serializer.validated_data['remove'])
+        return Response(BulkResultSerializer(result).data)
+
+    @extend_schema(responses=BulkResultSerializer)
+    @action(methods=['POST'], detail=False, url_path='merge-tags')
+    def merge_tags(self, request):
+        """Replaces the source tags with the target tag on the selected
+        entries"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entries = serializer.filter(self.get_queryset())
+        result = merge_tags(entries, serializer.validated_data['sources'],
+                            serializer.validated_data['target'])
+        return Response(BulkResultSerializer(result).data)
+
 
 class TagListView(generics.ListAPIView):
     """List all tags that are available in the API"""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    throttle_classes = [JournalUserThrottle]
+
+
+class EntryMediaView(APIView):
+    """Serves the images of entries to their authors"""
+    authentication_classes = [SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [JournalUserThrottle]
+    content_negotiation_class = MediaContentNegotiation
+
+    @extend_schema(responses={(200, 'application/octet-stream'):
+                              OpenApiTypes.BINARY})
+    def get(self, request, name):
+        """Returns an image file, or the byte range asked for"""
+        if not Entry.objects.filter(author=request.user, image=name).exists():
+            raise Http404
+        return serve_file(request, name,
+                          Entry._meta.get_field('image').storage)
@@ -0,0 +1,60 @@
+"""
+Authentication classes for the API.
+"""
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    get_authorization_header,
+)
+
+from user.tokens import InvalidToken, verify_access_token
+
+User = get_user_model()
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticates signed access tokens sent as `Authorization: Bearer
+    <token>` without querying the DB.
+
+    `request.user` is an unsaved-looking User carrying only its primary key,
+    which is all the journal API needs. Views that need the full user must
+    load it themselves.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request: Any) -> Any:
+        auth = get_authorization_header(request).split()
+
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            msg = _('Invalid token header.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        try:
+            claims = verify_access_token(auth[1].decode())
+        except (InvalidToken, UnicodeError):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        user = User(pk=claims['uid'])
+        user._state.adding = False
+        user._state.db = 'default'
+        return (user, claims)
+
+    def authenticate_header(self, request: Any) -> str:
+        return self.keyword
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    """Documents SignedTokenAuthentication in the OpenAPI schema"""
+    target_class = SignedTokenAuthentication
+    name = 'signedTokenAuth'
+
+    def get_security_definition(self, auto_schema: Any) -> dict:
+        return {'type': 'http', 'scheme': 'bearer'}
@@ -0,0 +1,28 @@
+"""
+System checks of the user app.
+"""
+from typing import Any
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+    'commons.cache.ExpiringLocMemCache',
+)
+
+
+@register(Tags.security, deploy=True)
+def check_revocation_cache(app_configs: Any, **kwargs: Any) -> list:
+    """Warns when token revocations can not reach every worker process"""
+    alias = getattr(settings, 'TOKEN_CACHE', 'default')
+    if settings.CACHES[alias]['BACKEND'] not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        'The token cache is local to each process, so logging out or '
+        'deactivating an account only revokes access tokens in the '
+        'process that handled it.',
+        hint='Set REDIS_URL to a Redis shared by every worker process.',
+        id='user.W001',
+    )]
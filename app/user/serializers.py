@@ -58,3 +58,8 @@ class UserSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data: Any) -> Any:
         return User.objects.create_user(**validated_data)
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Deserializes the refresh token sent to the refresh & logout APIs."""
+    refresh = serializers.CharField(trim_whitespace=False)
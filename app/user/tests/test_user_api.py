@@ -1,19 +1,35 @@
 """
 Tests for the user authentication API endpoints
 """
+import time
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import caches
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
+from core.models import AccountDeletion, Entry
 from user import serializers
+from user.checks import check_revocation_cache
+from user.tokens import (
+    InvalidToken,
+    issue_access_token,
+    revoke_user_tokens,
+    verify_access_token,
+)
 
 User = get_user_model()
 CREATE_URL = reverse('user:create')
 LOGIN_URL = reverse('user:login')
 ME_URL = reverse('user:me')
+REFRESH_URL = reverse('user:token-refresh')
+LOGOUT_URL = reverse('user:logout')
+JOURNAL_URL = reverse('journal:journal-list')
 
 
 def create_user(**params):
@@ -93,7 +109,7 @@ class PublicUserAPITests(TestCase):
         res = self.client.post(LOGIN_URL, data=payload)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn('token', res.data)
+        self.assertIn('access', res.data)
 
     def test_fail_login_user_without_email(self) -> None:
         """Tests that the user fails to login without providing an email.
@@ -143,3 +159,177 @@ class PrivateUserAPITests(TestCase):
         res = self.client.delete(ME_URL)
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_delete_user_deactivates_and_schedules_purge(self):
+        """Tests that deletion deactivates the user and queues a purge."""
+        Token.objects.create(user=self.user)
+
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        deletion = AccountDeletion.objects.get(user=self.user)
+        self.assertEqual(deletion.status, AccountDeletion.Status.PENDING)
+        self.assertEqual(deletion.email, self.user.email)
+
+
+class SignedTokenAPITests(TestCase):
+    """Tests for signed access tokens and the refresh token flow."""
+
+    def setUp(self) -> None:
+        caches['tokens'].clear()
+        self.client = APIClient()
+        self.credentials = {
+            'email': 'test@example.com',
+            'password': 'testing123#',
+        }
+        self.user = create_user(**self.credentials)
+
+    def login(self) -> dict:
+        """Logs in and returns the issued tokens."""
+        return self.client.post(LOGIN_URL, data=self.credentials).data
+
+    def authorize(self, access: str) -> None:
+        """Sends the access token with every following request."""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_login_issues_token_pair(self):
+        """Tests that login returns an access and a refresh token."""
+        tokens = self.login()
+
+        self.assertIn('access', tokens)
+        self.assertIn('refresh', tokens)
+        self.assertNotIn('token', tokens)
+        self.assertGreater(tokens['expires_in'], 0)
+
+    def test_access_token_needs_no_auth_query(self):
+        """Tests that the journal list authenticates without the DB."""
+        Entry.objects.create(author=self.user, content='Entry content')
+        self.authorize(self.login()['access'])
+
+        # The entry, not yet cached, and its tags are read; the user is not.
+        with self.assertNumQueries(3):
+            res = self.client.get(JOURNAL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_user_with_access_token(self):
+        """Tests that the full user is loaded for the user API."""
+        self.authorize(self.login()['access'])
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_tampered_token_rejected(self):
+        """Tests that a token with a bad signature is rejected."""
+        self.authorize(self.login()['access'] + 'x')
+        res = self.client.get(JOURNAL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_rejected(self):
+        """Tests that access tokens stop working once they expire."""
+        access = self.login()['access']
+        self.authorize(access)
+
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            res = self.client.get(JOURNAL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_rotates_tokens(self):
+        """Tests that a refresh token can only be exchanged once."""
+        refresh = self.login()['refresh']
+
+        res = self.client.post(REFRESH_URL, data={'refresh': refresh})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data['refresh'], refresh)
+        new_refresh = res.data['refresh']
+
+        res = self.client.post(REFRESH_URL, data={'refresh': refresh})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = self.client.post(REFRESH_URL, data={'refresh': new_refresh})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_tokens(self):
+        """Tests that logging out revokes both tokens."""
+        tokens = self.login()
+        self.authorize(tokens['access'])
+
+        res = self.client.post(LOGOUT_URL, data={'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.client.get(JOURNAL_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        res = self.client.post(REFRESH_URL,
+                               data={'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_legacy_token_rejected(self):
+        """Tests that non-expiring DRF tokens are no longer accepted."""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        self.assertEqual(self.client.get(JOURNAL_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_issued_after_revocation_accepted(self):
+        """Tests that a token issued right after every token was revoked,
+        within the same second, still works."""
+        second = int(time.time())
+        with patch('time.time', return_value=second + 0.1):
+            revoked = issue_access_token(self.user)
+        with patch('time.time', return_value=second + 0.25):
+            revoke_user_tokens(self.user)
+        with patch('time.time', return_value=second + 0.5):
+            access = issue_access_token(self.user)
+
+        with self.assertRaises(InvalidToken):
+            verify_access_token(revoked)
+        self.assertEqual(verify_access_token(access)['uid'], self.user.pk)
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'tokens': {
+            'BACKEND': 'commons.cache.ExpiringLocMemCache',
+            'LOCATION': 'pressure',
+            'OPTIONS': {'MAX_ENTRIES': 30},
+        },
+    })
+    def test_revocation_survives_cache_pressure(self):
+        """Tests that a revocation is kept in the local token cache however
+        many other keys are set after it."""
+        access = issue_access_token(self.user)
+        revoke_user_tokens(self.user)
+
+        for index in range(100):
+            caches['tokens'].set(f'other:{index}', index, 60)
+
+        with self.assertRaises(InvalidToken):
+            verify_access_token(access)
+
+    def test_deploy_check_requires_shared_cache(self):
+        """Tests that a per-process revocation cache is reported."""
+        local = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }, 'tokens': {
+            'BACKEND': 'commons.cache.ExpiringLocMemCache',
+        }}
+        with override_settings(CACHES=local, TOKEN_CACHE='tokens'):
+            self.assertEqual([warning.id for warning in
+                              check_revocation_cache(None)], ['user.W001'])
+        redis = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }, 'tokens': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://localhost:6379',
+        }}
+        with override_settings(CACHES=redis, TOKEN_CACHE='tokens'):
+            self.assertEqual(check_revocation_cache(None), [])
@@ -0,0 +1,141 @@
+"""
+Signed short-lived access tokens and DB-backed refresh tokens.
+
+Access tokens are verified with the SECRET_KEY alone, so authenticating a
+request needs no DB query. They are revoked through the TOKEN_CACHE cache,
+which must be shared by every worker process (see user.checks): a single
+token by its id, or every token of a user issued before a point in time.
+Issue times are kept to the microsecond, so a token issued right after a
+revocation is not taken for one issued before it.
+"""
+import hashlib
+import secrets
+import time
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import RefreshToken
+
+ACCESS_TOKEN_SALT = 'user.tokens.access'
+
+
+class InvalidToken(Exception):
+    """Raised when a token is malformed, expired or revoked"""
+
+
+def _cache() -> Any:
+    return caches[getattr(settings, 'TOKEN_CACHE', 'default')]
+
+
+def _revoked_token_key(jti: str) -> str:
+    return f'tokens:revoked:{jti}'
+
+
+def _revoked_user_key(user_id: Any) -> str:
+    return f'tokens:revoked-user:{user_id}'
+
+
+def issue_access_token(user: Any) -> str:
+    """Returns a signed access token for the user"""
+    payload = {
+        'uid': user.pk,
+        'jti': secrets.token_urlsafe(12),
+        'iat': time.time(),
+    }
+    return signing.dumps(payload, salt=ACCESS_TOKEN_SALT, compress=True)
+
+
+def verify_access_token(token: str) -> dict:
+    """Returns the claims of a valid access token"""
+    try:
+        claims = signing.loads(token, salt=ACCESS_TOKEN_SALT,
+                               max_age=settings.ACCESS_TOKEN_LIFETIME)
+    except signing.BadSignature as error:
+        raise InvalidToken(str(error)) from error
+
+    revoked = _cache().get_many([_revoked_token_key(claims['jti']),
+                                 _revoked_user_key(claims['uid'])])
+    if _revoked_token_key(claims['jti']) in revoked:
+        raise InvalidToken('Token has been revoked.')
+    revoked_before = revoked.get(_revoked_user_key(claims['uid']))
+    if revoked_before is not None and claims['iat'] <= revoked_before:
+        raise InvalidToken('Token has been revoked.')
+    return claims
+
+
+def revoke_access_token(claims: dict) -> None:
+    """Rejects one access token until it would have expired anyway"""
+    remaining = claims['iat'] + settings.ACCESS_TOKEN_LIFETIME - time.time()
+    if remaining > 0:
+        _cache().set(_revoked_token_key(claims['jti']), True,
+                     int(remaining) + 1)
+
+
+def revoke_user_tokens(user: Any) -> None:
+    """Rejects every token issued to the user so far"""
+    _cache().set(_revoked_user_key(user.pk), time.time(),
+                 settings.ACCESS_TOKEN_LIFETIME + 1)
+    RefreshToken.objects.filter(user=user, revoked_at__isnull=True) \
+        .update(revoked_at=timezone.now())
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_refresh_token(user: Any) -> str:
+    """Stores and returns a new refresh token for the user"""
+    token = secrets.token_urlsafe(32)
+    RefreshToken.objects.create(
+        user=user,
+        token_hash=_hash(token),
+        expires_at=timezone.now() + timedelta(
+            seconds=settings.REFRESH_TOKEN_LIFETIME
+        ),
+    )
+    return token
+
+
+def issue_token_pair(user: Any) -> dict:
+    """Returns a new access token and refresh token for the user"""
+    return {
+        'access': issue_access_token(user),
+        'refresh': issue_refresh_token(user),
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+    }
+
+
+def rotate_refresh_token(token: str) -> dict:
+    """Exchanges a refresh token for a new token pair.
+
+    Presenting a refresh token that was already used or revoked is treated
+    as theft, and every token of its user is revoked.
+    """
+    with transaction.atomic():
+        refresh = RefreshToken.objects.select_for_update(of=('self',)) \
+            .select_related('user').filter(token_hash=_hash(token)).first()
+        if refresh is None:
+            raise InvalidToken('Unknown refresh token.')
+        if refresh.revoked_at is None:
+            if refresh.expires_at <= timezone.now() or \
+                    not refresh.user.is_active:
+                raise InvalidToken('Refresh token has expired.')
+            refresh.revoked_at = timezone.now()
+            refresh.save(update_fields=['revoked_at', 'updated_at'])
+            return issue_token_pair(refresh.user)
+
+    revoke_user_tokens(refresh.user)
+    raise InvalidToken('Refresh token has been revoked.')
+
+
+def revoke_refresh_token(token: str, user: Any) -> None:
+    """Revokes one refresh token of the user"""
+    RefreshToken.objects.filter(
+        user=user, token_hash=_hash(token), revoked_at__isnull=True
+    ).update(revoked_at=timezone.now())
@@ -11,5 +11,8 @@ app_name = 'user'
 urlpatterns = [
   path('create/', views.CreateUserView.as_view(), name='create'),
   path('login/', views.UserLoginView.as_view(), name='login'),
+  path('token/refresh/', views.RefreshTokenView.as_view(),
+       name='token-refresh'),
+  path('logout/', views.LogoutView.as_view(), name='logout'),
   path('me/', views.ManageUserView.as_view(), name='me')
 ]
@@ -4,13 +4,23 @@ Definitions of the API endpoint view logic for the user API.
 from typing import Any
 
 from django.contrib.auth import get_user_model
+from django.shortcuts import get_object_or_404
 
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
-from user import serializers
+from commons.throttling import (
+    LoginAccountThrottle,
+    LoginIPThrottle,
+    RegisterAccountThrottle,
+    RegisterIPThrottle,
+)
+from core.purge import schedule_account_deletion
+from user import serializers, tokens
+from user.authentication import SignedTokenAuthentication
 
 User = get_user_model()
 
@@ -19,21 +29,73 @@ class CreateUserView(generics.CreateAPIView):
     """Handles creation of new users"""
     queryset = User.objects.all()
     serializer_class = serializers.UserSerializer
+    authentication_classes: list = []
+    throttle_classes = [RegisterIPThrottle, RegisterAccountThrottle]
 
 
 class UserLoginView(ObtainAuthToken):
     """Handles login of existing users"""
     serializer_class = serializers.AuthSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    authentication_classes: list = []
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        return Response(tokens.issue_token_pair(user))
+
+
+class RefreshTokenView(APIView):
+    """Exchanges a refresh token for a new access & refresh token pair"""
+    authentication_classes: list = []
+    permission_classes: list = []
+    throttle_classes = [LoginIPThrottle]
+    serializer_class = serializers.RefreshTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            pair = tokens.rotate_refresh_token(
+                serializer.validated_data['refresh']
+            )
+        except tokens.InvalidToken as error:
+            return Response({'detail': str(error)},
+                            status=status.HTTP_401_UNAUTHORIZED)
+        return Response(pair)
+
+
+class LogoutView(APIView):
+    """Revokes the current access token and the given refresh token"""
+    authentication_classes = [SignedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = serializers.RefreshTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        tokens.revoke_access_token(request.auth)
+        serializer = self.serializer_class(data=request.data)
+        if serializer.is_valid():
+            tokens.revoke_refresh_token(
+                serializer.validated_data['refresh'], request.user
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     """Handles retrieval, updation and deletion of currently authenticated
     user."""
     queryset = User.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [SignedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = serializers.UserSerializer
 
     def get_object(self) -> Any:
-        return self.request.user
+        # Signed tokens only carry the primary key of the user.
+        return get_object_or_404(self.queryset, pk=self.request.user.pk)
+
+    def perform_destroy(self, instance: Any) -> None:
+        """Deactivates the account right away and leaves purging its data to
+        the `purge_accounts` command."""
+        schedule_account_deletion(instance)